@@ -7,6 +7,7 @@ print("-" * 60)
 packages = [
     'numpy',
     'pandas', 
+    'pyarrow',
     'sklearn',
     'xgboost',
     'lightgbm',
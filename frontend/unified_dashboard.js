@@ -11,9 +11,9 @@ let weatherDataManager;
 
 // Initialize on page load
 document.addEventListener('DOMContentLoaded', async () => {
-    // Initialize weather data manager
+    // Initialize weather data manager (region data is loaded per location)
     weatherDataManager = window.weatherDataManager;
-    await weatherDataManager.loadData();
+    weatherDataManager.apiBaseUrl = API_BASE_URL;
     
     initializeMap();
     setupEventListeners();
@@ -277,6 +277,7 @@ function updateWeatherLayer() {
 }
 
 async function updateAllData() {
+    await weatherDataManager.loadData(currentCoords.lat, currentCoords.lon);
     await Promise.all([
         updateCurrentWeather(),
         updateModelPrediction(),
@@ -1,38 +1,36 @@
 class WeatherDataManager {
-    constructor() {
+    constructor(apiBaseUrl = 'http://127.0.0.1:8081') {
+        this.apiBaseUrl = apiBaseUrl;
         this.continentData = {};
         this.hemisphereData = {};
-        this.locationMapping = null;
+        this.region = null;
+        this.regionCoords = null;
         this.loaded = false;
     }
 
-    async loadData() {
+    async loadData(lat, lon) {
+        // The backend matches the point to its region; only that region's
+        // patterns are downloaded (and the browser revalidates them by ETag)
+        if (this.regionCoords && this.regionCoords.lat === lat && this.regionCoords.lon === lon) {
+            return;
+        }
         try {
-            // Load location mapping
-            const mappingResponse = await fetch('./data/location_mapping.json');
-            this.locationMapping = await mappingResponse.json();
-
-            // Load hemisphere data
-            const northernResponse = await fetch('./data/hemispheres/northern_hemisphere.json');
-            const southernResponse = await fetch('./data/hemispheres/southern_hemisphere.json');
-            
-            this.hemisphereData.northern = await northernResponse.json();
-            this.hemisphereData.southern = await southernResponse.json();
-
-            // Load continent data
-            const continents = ['asia', 'europe', 'north_america', 'south_america', 'africa', 'australia', 'antarctica'];
-            
-            for (const continent of continents) {
-                try {
-                    const response = await fetch(`./data/continents/${continent}.json`);
-                    this.continentData[continent] = await response.json();
-                } catch (error) {
-                    console.warn(`Failed to load ${continent} data:`, error);
-                }
+            const regionResponse = await fetch(`${this.apiBaseUrl}/region?lat=${lat}&lon=${lon}`);
+            if (!regionResponse.ok) throw new Error(`HTTP ${regionResponse.status}`);
+            const region = await regionResponse.json();
+
+            const key = region.region.patterns;
+            const target = region.region.continent === key ? this.continentData : this.hemisphereData;
+            if (!target[key]) {
+                const patternsResponse = await fetch(`${this.apiBaseUrl}${region.patterns_url}`);
+                if (!patternsResponse.ok) throw new Error(`HTTP ${patternsResponse.status}`);
+                const patterns = await patternsResponse.json();
+                target[key] = { continent: patterns.name, six_month_patterns: patterns.six_month_patterns };
             }
 
+            this.region = region;
+            this.regionCoords = { lat, lon };
             this.loaded = true;
-            console.log('Weather data loaded successfully');
         } catch (error) {
             console.error('Failed to load weather data:', error);
             this.loaded = false;
@@ -40,29 +38,21 @@ class WeatherDataManager {
     }
 
     getRegionFromCoordinates(lat, lon) {
-        if (!this.loaded || !this.locationMapping) {
+        if (!this.loaded || !this.region) {
             return { continent: 'asia', hemisphere: 'northern' }; // Default fallback
         }
 
-        // Determine hemisphere
-        const hemisphere = lat >= 0 ? 'northern' : 'southern';
-
-        // Determine continent based on coordinates
-        for (const [continentName, region] of Object.entries(this.locationMapping.coordinate_regions)) {
-            const latInRange = lat >= region.lat_range[0] && lat <= region.lat_range[1];
-            const lonInRange = lon >= region.lon_range[0] && lon <= region.lon_range[1];
-            
-            if (latInRange && lonInRange) {
-                return {
-                    continent: continentName,
-                    hemisphere: region.hemisphere === 'Mixed' ? hemisphere : region.hemisphere.toLowerCase(),
-                    continentFile: region.continent_file
-                };
-            }
+        const region = this.region.region;
+        if (region.continent && this.continentData[region.continent]) {
+            return {
+                continent: region.continent,
+                hemisphere: region.hemisphere,
+                continentFile: region.continent_file
+            };
         }
 
         // Fallback to hemisphere-based data
-        return { continent: null, hemisphere: hemisphere };
+        return { continent: null, hemisphere: region.hemisphere };
     }
 
     getSixMonthForecast(lat, lon) {
@@ -241,27 +231,8 @@ class WeatherDataManager {
     }
 
     getNearestCity(lat, lon) {
-        let nearestCity = null;
-        let minDistance = Infinity;
-
-        // Search through all loaded continent data for nearest city
-        for (const [continentName, continentData] of Object.entries(this.continentData)) {
-            if (continentData.representative_cities) {
-                for (const city of continentData.representative_cities) {
-                    const distance = this.calculateDistance(lat, lon, city.lat, city.lon);
-                    if (distance < minDistance) {
-                        minDistance = distance;
-                        nearestCity = {
-                            ...city,
-                            continent: continentName,
-                            distance: distance
-                        };
-                    }
-                }
-            }
-        }
-
-        return nearestCity;
+        // Matched by the backend across every continent's representative cities
+        return this.loaded && this.region ? this.region.nearest_city : null;
     }
 
     calculateDistance(lat1, lon1, lat2, lon2) {
@@ -9,13 +9,13 @@ echo.
 pip install --upgrade pip
 
 echo Installing core packages...
-pip install numpy==1.24.3 pandas==2.0.3 scikit-learn==1.3.0
+pip install numpy==1.24.3 pandas==2.0.3 scikit-learn==1.3.0 pyarrow==13.0.0 threadpoolctl==3.2.0
 
 echo Installing gradient boosting libraries...
 pip install xgboost==2.0.0 lightgbm==4.1.0
 
 echo Installing utilities...
-pip install joblib==1.3.2 pyyaml==6.0.1 tqdm==4.66.1 requests==2.31.0
+pip install joblib==1.3.2 pyyaml==6.0.1 tqdm==4.66.1 requests==2.31.0 httpx==0.25.0
 
 echo Installing visualization libraries...
 pip install matplotlib==3.7.2 seaborn==0.12.2 plotly==5.16.1
@@ -67,6 +67,8 @@ def main():
     parser.add_argument('--name', type=str, help='Location name')
     parser.add_argument('--multi', action='store_true', 
                        help='Collect data for multiple locations')
+    parser.add_argument('--incremental', action='store_true',
+                       help='Only fetch and engineer days newer than the stored data')
     
     args = parser.parse_args()
     
@@ -86,6 +88,9 @@ def main():
         elif args.lat and args.lon and args.name:
             cmd += f" --lat {args.lat} --lon {args.lon} --name {args.name}"
         
+        if args.incremental:
+            cmd += " --incremental"
+        
         if not run_command(cmd, "Data Collection from NASA API"):
             print("\n⚠️  Data collection failed. You can:")
             print("   1. Check your NASA API key in config.yaml")
@@ -97,7 +102,11 @@ def main():
     
     # Step 2: Feature Engineering
     if not args.skip_features:
-        if not run_command("python src/feature_engineering.py", "Feature Engineering"):
+        cmd = "python src/feature_engineering.py"
+        if args.incremental:
+            cmd += " --incremental"
+        
+        if not run_command(cmd, "Feature Engineering"):
             print("\n✗ Feature engineering failed")
             sys.exit(1)
     else:
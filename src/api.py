@@ -7,20 +7,48 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import Dict, List, Optional
+from contextlib import asynccontextmanager
+import asyncio
+import threading
+import httpx
 import pandas as pd
 import numpy as np
 import yaml
-import os
-import joblib
-import json
-import requests
 from datetime import datetime, timedelta
 
+from climatology import Climatology, default_path as climatology_path
+from feature_vector import FeatureVectorBuilder, WeatherWindow
+from history_cache import GridHistoryCache
+from metrics import REGISTRY, instrument, json_response, stage, upstream
+from micro_batch import MicroBatcher
+from model_store import ModelStore, publish_version, watch_versions
+from power_cache import PowerCache
+from singleflight import AsyncSingleFlight
+
+@asynccontextmanager
+async def lifespan(app):
+    """Open the pooled upstream HTTP client and watch for new model versions"""
+    NASADataFetcher.open()
+    watcher = None
+    watch_interval = config['api'].get('model_reload', {}).get('watch_interval', 0)
+    if watch_interval > 0:
+        watcher = asyncio.create_task(watch_versions(
+            config['api']['model_path'], watch_interval,
+            lambda: model_loader.store.version if model_loader is not None else None,
+            reload_models
+        ))
+    yield
+    if watcher is not None:
+        watcher.cancel()
+    await NASADataFetcher.close()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Extreme Weather Prediction API - Enhanced",
     description="Predicts extreme weather using real-time NASA data",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # Enable CORS
@@ -32,10 +60,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request/stage latency histograms, Server-Timing headers and /metrics
+instrument(app)
+
 # Load configuration
 with open("config.yaml", 'r') as f:
     config = yaml.safe_load(f)
 
+# Shared on-disk cache of NASA POWER responses
+power_cache = PowerCache.from_config(config)
+
+# Daily history per POWER grid cell, shared by nearby requests
+history_cache = GridHistoryCache.from_config(config)
+
 
 class PredictionRequest(BaseModel):
     """Request model for predictions"""
@@ -54,26 +91,108 @@ class PredictionResponse(BaseModel):
     data_source: str
 
 
+class BatchPredictionRequest(BaseModel):
+    """Request model for batch predictions"""
+    points: List[PredictionRequest] = Field(..., min_length=1, description="Locations and dates to score")
+
+
+class BatchPredictionResult(BaseModel):
+    """One point of a batch prediction (error is set when it could not be scored)"""
+    location: Dict[str, float]
+    date: str
+    predictions: Optional[Dict[str, float]] = None
+    risk_level: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BatchPredictionResponse(BaseModel):
+    """Response model for batch predictions, in request order"""
+    results: List[BatchPredictionResult]
+    locations_fetched: int
+    timestamp: str
+    data_source: str
+
+
 class NASADataFetcher:
-    """Fetches real-time NASA POWER data"""
+    """
+    Fetches real-time NASA POWER data without blocking the event loop
+    
+    Requests share one httpx.AsyncClient, so concurrent predictions reuse
+    keep-alive connections from a bounded pool. Each upstream call has
+    connect/read timeouts plus an overall deadline; when the deadline passes
+    or the calling task is cancelled, the in-flight request is abandoned
+    and its connection returned to the pool. Concurrent requests for the
+    same data share one fetch.
+    """
     
-    @staticmethod
-    def fetch_historical_data(latitude, longitude, end_date_str, days_back=60):
+    client: Optional[httpx.AsyncClient] = None
+    in_flight = AsyncSingleFlight()
+    
+    @classmethod
+    def open(cls, transport=None):
         """
-        Fetch historical NASA data for feature engineering
+        Create the shared client (on startup)
         
         Args:
-            latitude: Location latitude
-            longitude: Location longitude  
-            end_date_str: End date (prediction date)
-            days_back: Number of days to fetch for lag/rolling features
+            transport: Optional httpx transport (e.g. httpx.MockTransport)
+        """
+        upstream = config['api'].get('upstream', {})
+        cls.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                upstream.get('read_timeout', 30),
+                connect=upstream.get('connect_timeout', 5)
+            ),
+            limits=httpx.Limits(
+                max_connections=upstream.get('max_connections', 100),
+                max_keepalive_connections=upstream.get('max_keepalive_connections', 20)
+            ),
+            transport=transport
+        )
+    
+    @classmethod
+    async def close(cls):
+        """Close the shared client and its connections (on shutdown)"""
+        if cls.client is not None:
+            await cls.client.aclose()
+            cls.client = None
+    
+    @classmethod
+    async def get_json(cls, url, params):
+        """GET a JSON document within the configured overall deadline"""
+        if cls.client is None:
+            cls.open()
+        
+        deadline = config['api'].get('upstream', {}).get('total_timeout', 45)
+        with upstream('nasa_power', 'daily_point'):
+            response = await asyncio.wait_for(cls.client.get(url, params=params), timeout=deadline)
+            response.raise_for_status()
+            return response.json()
+    
+    @classmethod
+    async def fetch_power_json(cls, url, params):
+        """NASA POWER response for params, from the cache or upstream"""
+        # Cache lookups touch the disk, so they run off the event loop too
+        data = await asyncio.to_thread(power_cache.get, params)
+        if data is not None:
+            return data
+        
+        data = await cls.get_json(url, params)
+        if 'properties' in data and 'parameter' in data['properties']:
+            await asyncio.to_thread(power_cache.put, params, data)
+        return data
+    
+    @classmethod
+    async def fetch_power_frame(cls, latitude, longitude, start_date, end_date):
+        """
+        Fetch daily NASA POWER data for a point and date range
+        
+        Args:
+            latitude, longitude: Point to fetch (a grid cell center)
+            start_date, end_date: First and last day
             
         Returns:
-            DataFrame with weather data
+            DataFrame with 'date' and weather columns
         """
-        end_date = pd.to_datetime(end_date_str)
-        start_date = end_date - timedelta(days=days_back)
-        
         url = config['data']['power_api_url']
         params = {
             'parameters': ','.join(config['data']['parameters']),
@@ -85,267 +204,125 @@ class NASADataFetcher:
             'format': 'JSON'
         }
         
-        try:
-            response = requests.get(url, params=params, timeout=30)
-            response.raise_for_status()
-            data = response.json()
-            
-            if 'properties' in data and 'parameter' in data['properties']:
-                params_data = data['properties']['parameter']
-                df = pd.DataFrame(params_data)
-                df.index = pd.to_datetime(df.index, format='%Y%m%d')
-                df.reset_index(inplace=True)
-                df.rename(columns={'index': 'date'}, inplace=True)
-                df['latitude'] = latitude
-                df['longitude'] = longitude
-                df['location_name'] = 'temp_location'
-                
-                return df
-            else:
-                raise ValueError("Unexpected API response format")
-                
-        except Exception as e:
-            raise HTTPException(status_code=503, 
-                detail=f"Failed to fetch NASA data: {str(e)}")
-
-
-class EnhancedFeatureBuilder:
-    """Builds complete features including lag and rolling statistics"""
-    
-    @staticmethod
-    def create_temporal_features(date_str):
-        """Create temporal features from date"""
-        date = pd.to_datetime(date_str)
-        
-        features = {
-            'day_of_year': date.dayofyear,
-            'month': date.month,
-            'day_of_week': date.dayofweek,
-            'is_weekend': int(date.dayofweek >= 5),
-            'year': date.year,
-            'season': (date.month % 12 + 3) // 3,
-        }
-        
-        # Cyclical encoding
-        features['day_of_year_sin'] = np.sin(2 * np.pi * features['day_of_year'] / 365.25)
-        features['day_of_year_cos'] = np.cos(2 * np.pi * features['day_of_year'] / 365.25)
-        features['month_sin'] = np.sin(2 * np.pi * features['month'] / 12)
-        features['month_cos'] = np.cos(2 * np.pi * features['month'] / 12)
-        
-        return features
-    
-    @staticmethod
-    def create_lag_features(df, target_date):
-        """Create lag features for the target date"""
-        lag_days = config['features']['lag_days']
-        weather_columns = ['T2M', 'T2M_MAX', 'T2M_MIN', 'PRECTOTCORR', 
-                          'WS2M', 'RH2M', 'PS', 'CLOUD_AMT']
-        
-        df = df.sort_values('date')
-        target_row = df[df['date'] == target_date].iloc[-1]
-        features = {}
-        
-        for col in weather_columns:
-            if col in df.columns:
-                for lag in lag_days:
-                    lag_date = pd.to_datetime(target_date) - timedelta(days=lag)
-                    lag_row = df[df['date'] == lag_date]
-                    if len(lag_row) > 0:
-                        features[f'{col}_lag_{lag}'] = float(lag_row[col].values[0])
-                    else:
-                        features[f'{col}_lag_{lag}'] = 0
-        
-        return features
-    
-    @staticmethod
-    def create_rolling_features(df, target_date):
-        """Create rolling window statistics"""
-        rolling_windows = config['features']['rolling_window_days']
-        weather_columns = ['T2M', 'T2M_MAX', 'T2M_MIN', 'PRECTOTCORR',
-                          'WS2M', 'RH2M', 'PS', 'CLOUD_AMT']
-        
-        df = df.sort_values('date')
-        features = {}
-        
-        for col in weather_columns:
-            if col in df.columns:
-                for window in rolling_windows:
-                    window_end = pd.to_datetime(target_date)
-                    window_start = window_end - timedelta(days=window)
-                    window_data = df[(df['date'] >= window_start) & (df['date'] < window_end)][col]
-                    
-                    if len(window_data) > 0:
-                        features[f'{col}_rolling_mean_{window}'] = float(window_data.mean())
-                        features[f'{col}_rolling_std_{window}'] = float(window_data.std()) if len(window_data) > 1 else 0
-                        features[f'{col}_rolling_max_{window}'] = float(window_data.max())
-                        features[f'{col}_rolling_min_{window}'] = float(window_data.min())
-                    else:
-                        features[f'{col}_rolling_mean_{window}'] = 0
-                        features[f'{col}_rolling_std_{window}'] = 0
-                        features[f'{col}_rolling_max_{window}'] = 0
-                        features[f'{col}_rolling_min_{window}'] = 0
+        data = await cls.in_flight.do(
+            PowerCache.make_key(params), lambda: cls.fetch_power_json(url, params)
+        )
         
-        return features
+        if 'properties' in data and 'parameter' in data['properties']:
+            params_data = data['properties']['parameter']
+            df = pd.DataFrame(params_data)
+            df.index = pd.to_datetime(df.index, format='%Y%m%d')
+            df.reset_index(inplace=True)
+            df.rename(columns={'index': 'date'}, inplace=True)
+            return df
+        else:
+            raise ValueError("Unexpected API response format")
     
-    @staticmethod
-    def create_trend_features(df, target_date):
-        """Create trend features"""
-        weather_columns = ['T2M', 'T2M_MAX', 'T2M_MIN', 'PRECTOTCORR',
-                          'WS2M', 'RH2M', 'PS', 'CLOUD_AMT']
-        
-        df = df.sort_values('date')
-        features = {}
+    @classmethod
+    async def fetch_historical_data(cls, latitude, longitude, end_date_str, days_back=60):
+        """
+        Fetch historical NASA data for feature engineering
         
-        target_date_dt = pd.to_datetime(target_date)
-        target_row = df[df['date'] == target_date_dt]
+        The point is snapped to its POWER grid cell, and the days come from
+        the cell's shared history, so only days no request in the cell has
+        fetched yet go upstream.
         
-        if len(target_row) == 0:
-            return features
+        Args:
+            latitude: Location latitude
+            longitude: Location longitude  
+            end_date_str: End date (prediction date)
+            days_back: Number of days to fetch for lag/rolling features
             
-        target_row = target_row.iloc[0]
-        
-        for col in weather_columns:
-            if col in df.columns:
-                # 1-day change
-                prev_1d = df[df['date'] == target_date_dt - timedelta(days=1)]
-                if len(prev_1d) > 0:
-                    features[f'{col}_change_1d'] = float(target_row[col] - prev_1d[col].values[0])
-                    if prev_1d[col].values[0] != 0:
-                        features[f'{col}_pct_change_1d'] = float((target_row[col] - prev_1d[col].values[0]) / prev_1d[col].values[0])
-                    else:
-                        features[f'{col}_pct_change_1d'] = 0
-                else:
-                    features[f'{col}_change_1d'] = 0
-                    features[f'{col}_pct_change_1d'] = 0
-                
-                # 7-day change
-                prev_7d = df[df['date'] == target_date_dt - timedelta(days=7)]
-                if len(prev_7d) > 0:
-                    features[f'{col}_change_7d'] = float(target_row[col] - prev_7d[col].values[0])
-                else:
-                    features[f'{col}_change_7d'] = 0
-        
-        return features
-    
-    @staticmethod
-    def create_interaction_features(df, target_date):
-        """Create interaction features"""
-        target_row = df[df['date'] == pd.to_datetime(target_date)]
-        if len(target_row) == 0:
-            return {}
-        
-        target_row = target_row.iloc[0]
-        features = {}
-        
-        # Temp * Humidity
-        if 'T2M' in target_row and 'RH2M' in target_row:
-            features['temp_humidity_interaction'] = float(target_row['T2M'] * target_row['RH2M'])
-        
-        # Wind * Precipitation
-        if 'WS2M' in target_row and 'PRECTOTCORR' in target_row:
-            features['wind_precip_interaction'] = float(target_row['WS2M'] * target_row['PRECTOTCORR'])
-        
-        # Temperature range
-        if 'T2M_MAX' in target_row and 'T2M_MIN' in target_row:
-            features['temp_range'] = float(target_row['T2M_MAX'] - target_row['T2M_MIN'])
-        
-        # Heat index
-        if 'T2M' in target_row and 'RH2M' in target_row:
-            T = target_row['T2M']
-            RH = target_row['RH2M']
-            features['heat_index'] = float(T + (0.5 * (T + 61.0 + ((T-68.0)*1.2) + (RH*0.094))))
-        
-        return features
-    
-    @staticmethod
-    def build_complete_features(request: PredictionRequest):
-        """
-        Build complete feature set by fetching NASA data
+        Returns:
+            DataFrame with weather data
         """
-        # Fetch historical NASA data
-        df = NASADataFetcher.fetch_historical_data(
-            request.latitude, 
-            request.longitude,
-            request.date,
-            days_back=60
-        )
-        
-        # Build all features
-        all_features = {}
-        
-        # 1. Temporal features
-        temporal = EnhancedFeatureBuilder.create_temporal_features(request.date)
-        all_features.update(temporal)
-        
-        # 2. Current day weather values
-        target_row = df[df['date'] == pd.to_datetime(request.date)]
-        if len(target_row) > 0:
-            target_row = target_row.iloc[0]
-            for col in ['T2M', 'T2M_MAX', 'T2M_MIN', 'PRECTOTCORR', 'WS2M', 'RH2M', 'PS', 'CLOUD_AMT']:
-                if col in target_row:
-                    all_features[col] = float(target_row[col])
-        
-        # 3. Lag features
-        lag_features = EnhancedFeatureBuilder.create_lag_features(df, pd.to_datetime(request.date))
-        all_features.update(lag_features)
-        
-        # 4. Rolling features
-        rolling_features = EnhancedFeatureBuilder.create_rolling_features(df, pd.to_datetime(request.date))
-        all_features.update(rolling_features)
-        
-        # 5. Trend features
-        trend_features = EnhancedFeatureBuilder.create_trend_features(df, pd.to_datetime(request.date))
-        all_features.update(trend_features)
+        end_date = pd.to_datetime(end_date_str).normalize()
+        start_date = end_date - timedelta(days=days_back)
         
-        # 6. Interaction features
-        interaction_features = EnhancedFeatureBuilder.create_interaction_features(df, pd.to_datetime(request.date))
-        all_features.update(interaction_features)
+        try:
+            df = await history_cache.get(
+                latitude, longitude, start_date, end_date, cls.fetch_power_frame
+            )
+            df['latitude'] = latitude
+            df['longitude'] = longitude
+            df['location_name'] = 'temp_location'
+            
+            return df
         
-        return all_features
+        except (asyncio.TimeoutError, httpx.TimeoutException):
+            raise HTTPException(status_code=504,
+                detail="Failed to fetch NASA data: NASA POWER did not respond in time")
+        except Exception as e:
+            raise HTTPException(status_code=503, 
+                detail=f"Failed to fetch NASA data: {str(e)}")
 
 
 class ModelLoader:
     """Loads and manages trained models"""
     
-    def __init__(self):
+    def __init__(self, version=None):
+        """
+        Args:
+            version: Model registry version to load (default: the current one)
+        """
+        self.version = version
+        self.store = None
+        self.batcher = None
         self.models = {}
         self.scalers = {}
         self.feature_names = []
+        self.feature_builder = None
+        self.climatology = None
         self.metadata = {}
         self.model_dir = config['api']['model_path']
         
         self.load_models()
     
     def load_models(self):
-        """Load all trained models"""
-        metadata_path = os.path.join(self.model_dir, "metadata.json")
-        
-        if not os.path.exists(metadata_path):
-            raise FileNotFoundError("Model metadata not found. Train models first.")
+        """Open the model store (models load on first use unless preloaded)"""
+        self.store = ModelStore.from_config(config, self.model_dir, self.version)
+        self.metadata = self.store.metadata
+        self.feature_names = self.store.feature_names
+        self.models = self.store.models
+        self.scalers = self.store.scalers
+        
+        # Day-of-year climatology for historical comparison features (optional)
+        self.climatology = Climatology.load(climatology_path(config))
+        if self.climatology is None:
+            print("Warning: Climatology not found, historical comparison features will be 0. "
+                  "Run feature_engineering.py to build it.")
+        
+        self.feature_builder = FeatureVectorBuilder(
+            self.feature_names,
+            config['features']['lag_days'],
+            config['features']['rolling_window_days'],
+            climatology=self.climatology
+        )
         
-        with open(metadata_path, 'r') as f:
-            self.metadata = json.load(f)
+        # Concurrent /predict requests share batched model calls
+        if config['api'].get('inference_batching', {}).get('enabled', True):
+            self.batcher = MicroBatcher.from_config(config, self.predict_batch)
         
-        # Load feature names
-        feature_path = os.path.join(self.model_dir, "feature_names.pkl")
-        self.feature_names = joblib.load(feature_path)
+        print(f"✓ {self.store.report()}")
+    
+    def predict_batch(self, X):
+        """
+        Probabilities for every target on a feature matrix
         
-        # Load each target's model
-        for target in self.metadata['targets']:
-            best_model_name = self.metadata['model_performance'][target]['best_model']
-            
-            # Load model
-            model_path = os.path.join(self.model_dir, f"{target}_{best_model_name}.pkl")
-            self.models[target] = joblib.load(model_path)
+        Args:
+            X: 2D array (rows x feature_names)
             
-            # Load scaler if exists
-            scaler_path = os.path.join(self.model_dir, f"{target}_{best_model_name}_scaler.pkl")
-            if os.path.exists(scaler_path):
-                self.scalers[target] = joblib.load(scaler_path)
-            else:
-                self.scalers[target] = None
-        
-        print(f"✓ Loaded models for {len(self.models)} targets")
+        Returns:
+            Dict of target -> 1D array of probabilities
+        """
+        return self.store.predict_batch(X)
+    
+    def climatology_location(self, latitude, longitude):
+        """Climatology row of the nearest known location, or None"""
+        if self.climatology is None:
+            return None
+        max_distance_km = config.get('climatology', {}).get('max_distance_km')
+        return self.climatology.nearest(latitude, longitude, max_distance_km)
 
 
 # Initialize model loader
@@ -356,6 +333,46 @@ except Exception as e:
     print("Models need to be trained first. Run train_models.py")
     model_loader = None
 
+# Serialises reloads; requests keep the loader they started with
+reload_lock = threading.Lock()
+
+
+def reload_models(version=None, publish=False):
+    """
+    Load a model version, warm it up and swap it in (blocking)
+    
+    The new loader is fully loaded and has served a few predictions before
+    the module-level reference is replaced, so requests never wait on a
+    cold model. Requests that already hold the previous loader finish on it.
+    
+    Args:
+        version: Registry version to load (default: the current one)
+        publish: Also make the loaded version the current one
+        
+    Returns:
+        (previous version, loaded version)
+    """
+    global model_loader
+    with reload_lock:
+        loader = ModelLoader(version)
+        loader.store.warm_up(config['api'].get('model_reload', {}).get('warm_up_rows', 8))
+        if publish:
+            publish_version(config['api']['model_path'], loader.store.version)
+        previous = model_loader
+        model_loader = loader
+    print(f"✓ Serving model version {loader.store.version}")
+    return (previous.store.version if previous is not None else None), loader.store.version
+
+
+# Cache and batching counters, read from the current loader on every scrape
+REGISTRY.add_stats('power_cache', power_cache.stats)
+REGISTRY.add_stats('history_cache', history_cache.stats)
+REGISTRY.add_stats('upstream_coalescing', NASADataFetcher.in_flight.stats)
+REGISTRY.add_stats('inference_batching', lambda: model_loader.batcher.stats()
+                   if model_loader is not None and model_loader.batcher is not None else None)
+REGISTRY.add_stats('model_store', lambda: model_loader.store.stats()
+                   if model_loader is not None else None)
+
 
 def assess_risk_level(predictions: Dict[str, float]) -> str:
     """Assess overall risk level based on predictions"""
@@ -382,8 +399,11 @@ async def root():
         "features": ["Real-time NASA data fetching", "Automatic feature engineering"],
         "endpoints": {
             "predict": "/predict",
+            "predict_batch": "/predict/batch",
             "health": "/health",
-            "model_info": "/model/info"
+            "model_info": "/model/info",
+            "model_reload": "/model/reload",
+            "metrics": "/metrics"
         }
     }
 
@@ -394,6 +414,12 @@ async def health_check():
     return {
         "status": "healthy",
         "models_loaded": model_loader is not None,
+        "model_store": model_loader.store.stats() if model_loader is not None else None,
+        "power_cache": power_cache.stats(),
+        "upstream_coalescing": NASADataFetcher.in_flight.stats(),
+        "history_cache": history_cache.stats(),
+        "inference_batching": model_loader.batcher.stats()
+            if model_loader is not None and model_loader.batcher is not None else None,
         "timestamp": datetime.now().isoformat()
     }
 
@@ -401,14 +427,43 @@ async def health_check():
 @app.get("/model/info")
 async def model_info():
     """Get model information"""
-    if model_loader is None:
+    loader = model_loader
+    if loader is None:
         raise HTTPException(status_code=503, detail="Models not loaded")
     
     return {
-        "targets": model_loader.metadata['targets'],
-        "feature_count": model_loader.metadata['feature_count'],
-        "trained_date": model_loader.metadata['trained_date'],
-        "performance": model_loader.metadata['model_performance']
+        "version": loader.store.version,
+        "targets": loader.metadata['targets'],
+        "feature_count": loader.metadata['feature_count'],
+        "trained_date": loader.metadata['trained_date'],
+        "performance": loader.metadata['model_performance']
+    }
+
+
+@app.post("/model/reload")
+async def reload_model(version: Optional[str] = None):
+    """
+    Load a model version in the background and swap it in without downtime
+    
+    Args:
+        version: Registry version to serve; it becomes the current version
+            (default: reload whatever CURRENT points at)
+        
+    Returns:
+        Previous and newly served versions
+    """
+    try:
+        previous, loaded = await asyncio.to_thread(reload_models, version, version is not None)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Model reload failed: {str(e)}")
+    
+    return {
+        "status": "reloaded",
+        "previous_version": previous,
+        "version": loaded,
+        "timestamp": datetime.now().isoformat()
     }
 
 
@@ -423,44 +478,36 @@ async def predict(request: PredictionRequest):
     Returns:
         PredictionResponse with probabilities for each extreme condition
     """
-    if model_loader is None:
+    loader = model_loader
+    if loader is None:
         raise HTTPException(status_code=503, detail="Models not loaded")
     
     try:
         # Fetch real NASA data and build complete features
         print(f"Fetching NASA data for ({request.latitude}, {request.longitude}) on {request.date}...")
-        features = EnhancedFeatureBuilder.build_complete_features(request)
-        
-        # Convert to DataFrame
-        feature_df = pd.DataFrame([features])
-        
-        # Fill any missing features with median or 0
-        missing_features = {}
-        for feature_name in model_loader.feature_names:
-            if feature_name not in feature_df.columns:
-                missing_features[feature_name] = 0
-        
-        if missing_features:
-            missing_df = pd.DataFrame([missing_features])
-            feature_df = pd.concat([feature_df, missing_df], axis=1)
-        
-        # Reorder columns to match training
-        feature_df = feature_df[model_loader.feature_names]
-        X = feature_df.values
-        
-        # Make predictions for each target
-        predictions = {}
-        
-        for target, model in model_loader.models.items():
-            # Apply scaling if needed
-            if model_loader.scalers[target] is not None:
-                X_scaled = model_loader.scalers[target].transform(X)
+        with stage('fetch'):
+            df = await NASADataFetcher.fetch_historical_data(
+                request.latitude,
+                request.longitude,
+                request.date,
+                days_back=60
+            )
+        
+        # One feature row in training column order (features not computed here are 0)
+        with stage('features'):
+            window = WeatherWindow.from_frame(df)
+            location = loader.climatology_location(request.latitude, request.longitude)
+            X = loader.feature_builder.build(window, request.date, location).reshape(1, -1)
+        
+        # Make predictions for each target, batched with concurrent requests
+        with stage('inference'):
+            if loader.batcher is not None:
+                probabilities = await loader.batcher.submit(X)
             else:
-                X_scaled = X
-            
-            # Predict probability
-            prob = float(model.predict_proba(X_scaled)[0, 1])
-            predictions[target] = round(prob, 4)
+                probabilities = await asyncio.to_thread(loader.predict_batch, X)
+        predictions = {
+            target: round(float(values[0]), 4) for target, values in probabilities.items()
+        }
         
         # Assess risk level
         risk_level = assess_risk_level(predictions)
@@ -478,12 +525,133 @@ async def predict(request: PredictionRequest):
             data_source="NASA POWER API (Real-time)"
         )
         
-        return response
+        return json_response(response)
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
 
 
+@app.post("/predict/batch", response_model=BatchPredictionResponse)
+async def predict_batch(request: BatchPredictionRequest):
+    """
+    Score many (location, date) points in one request
+    
+    Points in the same POWER grid cell share one NASA fetch covering all
+    of their dates. Each location's feature rows are built together, and every
+    target model scores the whole feature matrix with a single
+    predict_proba call.
+    
+    Args:
+        request: BatchPredictionRequest with the points to score
+        
+    Returns:
+        BatchPredictionResponse with one result per point, in request order
+    """
+    loader = model_loader
+    if loader is None:
+        raise HTTPException(status_code=503, detail="Models not loaded")
+    
+    max_points = config['api'].get('batch_max_points', 5000)
+    if len(request.points) > max_points:
+        raise HTTPException(status_code=413, detail=f"At most {max_points} points per batch")
+    
+    # Group points by POWER grid cell
+    errors = {}
+    groups = {}
+    for i, point in enumerate(request.points):
+        try:
+            pd.Timestamp(point.date)
+        except ValueError:
+            errors[i] = f"Invalid date: {point.date}"
+            continue
+        groups.setdefault(history_cache.cell(point.latitude, point.longitude), []).append(i)
+    
+    semaphore = asyncio.Semaphore(config['api'].get('batch_fetch_concurrency', 4))
+    
+    async def fetch(latitude, longitude, indices):
+        dates = pd.to_datetime([request.points[i].date for i in indices])
+        days_back = (dates.max() - dates.min()).days + 60
+        async with semaphore:
+            return await NASADataFetcher.fetch_historical_data(
+                latitude, longitude, str(dates.max().date()), days_back
+            )
+    
+    with stage('fetch'):
+        fetched = await asyncio.gather(
+            *(fetch(latitude, longitude, indices) for (latitude, longitude), indices in groups.items()),
+            return_exceptions=True
+        )
+    
+    def build_features():
+        """Feature rows of every point with data (row order) and their matrix"""
+        rows, blocks = [], []
+        for indices, df in zip(groups.values(), fetched):
+            if isinstance(df, Exception):
+                detail = df.detail if isinstance(df, HTTPException) else str(df)
+                errors.update({i: detail for i in indices})
+                continue
+            
+            try:
+                window = WeatherWindow.from_frame(df)
+                dates = [request.points[i].date for i in indices]
+                available = window.has_days(window.offsets(dates))
+            except Exception as e:
+                errors.update({i: f"Invalid data: {e}" for i in indices})
+                continue
+            
+            for i, ok in zip(indices, available):
+                if not ok:
+                    errors[i] = f"No NASA data for {request.points[i].date}"
+            
+            # Points of a cell may still match different climatology locations
+            by_location = {}
+            for i, ok in zip(indices, available):
+                if ok:
+                    point = request.points[i]
+                    location = loader.climatology_location(point.latitude, point.longitude)
+                    by_location.setdefault(location, []).append(i)
+            for location, scored in by_location.items():
+                blocks.append(loader.feature_builder.build_batch(
+                    window, [request.points[i].date for i in scored], location
+                ))
+                rows.extend(scored)
+        return rows, np.vstack(blocks) if blocks else None
+    
+    # Building and scoring thousands of rows runs in worker threads, so the
+    # event loop keeps serving /predict and the micro-batcher meanwhile
+    with stage('features'):
+        rows, X = await asyncio.to_thread(build_features)
+    
+    # One predict_proba per target over every point
+    with stage('inference'):
+        probabilities = await asyncio.to_thread(loader.predict_batch, X) if X is not None else {}
+    row_of = {i: j for j, i in enumerate(rows)}
+    
+    results = []
+    for i, point in enumerate(request.points):
+        result = BatchPredictionResult(
+            location={"latitude": point.latitude, "longitude": point.longitude},
+            date=point.date
+        )
+        if i in row_of:
+            result.predictions = {
+                target: round(float(values[row_of[i]]), 4) for target, values in probabilities.items()
+            }
+            result.risk_level = assess_risk_level(result.predictions)
+        else:
+            result.error = errors.get(i, "Not scored")
+        results.append(result)
+    
+    return json_response(BatchPredictionResponse(
+        results=results,
+        locations_fetched=len(groups),
+        timestamp=datetime.now().isoformat(),
+        data_source="NASA POWER API (Real-time)"
+    ))
+
+
 if __name__ == "__main__":
     import uvicorn
     
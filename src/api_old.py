@@ -10,11 +10,10 @@ from typing import Dict, List
 import pandas as pd
 import numpy as np
 import yaml
-import os
-import joblib
-import json
 from datetime import datetime, timedelta
 
+from model_store import ModelStore
+
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -62,6 +61,7 @@ class ModelLoader:
     """Loads and manages trained models"""
     
     def __init__(self):
+        self.store = None
         self.models = {}
         self.scalers = {}
         self.feature_names = []
@@ -71,35 +71,14 @@ class ModelLoader:
         self.load_models()
     
     def load_models(self):
-        """Load all trained models"""
-        metadata_path = os.path.join(self.model_dir, "metadata.json")
-        
-        if not os.path.exists(metadata_path):
-            raise FileNotFoundError("Model metadata not found. Train models first.")
-        
-        with open(metadata_path, 'r') as f:
-            self.metadata = json.load(f)
-        
-        # Load feature names
-        feature_path = os.path.join(self.model_dir, "feature_names.pkl")
-        self.feature_names = joblib.load(feature_path)
-        
-        # Load each target's model
-        for target in self.metadata['targets']:
-            best_model_name = self.metadata['model_performance'][target]['best_model']
-            
-            # Load model
-            model_path = os.path.join(self.model_dir, f"{target}_{best_model_name}.pkl")
-            self.models[target] = joblib.load(model_path)
-            
-            # Load scaler if exists
-            scaler_path = os.path.join(self.model_dir, f"{target}_{best_model_name}_scaler.pkl")
-            if os.path.exists(scaler_path):
-                self.scalers[target] = joblib.load(scaler_path)
-            else:
-                self.scalers[target] = None
+        """Open the model store (models load on first use unless preloaded)"""
+        self.store = ModelStore.from_config(config, self.model_dir)
+        self.metadata = self.store.metadata
+        self.feature_names = self.store.feature_names
+        self.models = self.store.models
+        self.scalers = self.store.scalers
         
-        print(f"✓ Loaded models for {len(self.models)} targets")
+        print(f"✓ {self.store.report()}")
 
 
 # Initialize model loader
@@ -194,6 +173,7 @@ async def health_check():
     return {
         "status": "healthy",
         "models_loaded": model_loader is not None,
+        "model_store": model_loader.store.stats() if model_loader is not None else None,
         "timestamp": datetime.now().isoformat()
     }
 
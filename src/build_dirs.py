@@ -0,0 +1,84 @@
+"""
+Build Directories Module
+Versioned artifact directories switched by a pointer file
+"""
+
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+
+# Layout under an artifact directory: builds/<build>/ holds one saved copy,
+# and the CURRENT file names the build readers open
+BUILDS_DIR = 'builds'
+CURRENT_FILE = 'CURRENT'
+
+# Builds kept when a new one is published: the new one and the one before
+# it, which processes that have not reloaded yet may still have open
+KEEP_BUILDS = 2
+
+
+def create_build(root):
+    """
+    Create an empty directory for a new build
+
+    Nothing reads it until publish_build() points CURRENT at it, so it can
+    be written in place.
+
+    Returns:
+        (build, path)
+    """
+    builds_dir = os.path.join(root, BUILDS_DIR)
+    os.makedirs(builds_dir, exist_ok=True)
+    path = tempfile.mkdtemp(dir=builds_dir, prefix=datetime.now().strftime('%Y%m%d-%H%M%S-%f-'))
+    return os.path.basename(path), path
+
+
+def publish_build(root, build):
+    """
+    Point CURRENT at a build and remove old ones
+
+    CURRENT is replaced atomically and no directory in use is renamed or
+    deleted first, so this works while other processes (including on
+    Windows) have the previous build's files memory-mapped.
+    """
+    fd, staging = tempfile.mkstemp(dir=root, prefix='.current-')
+    with os.fdopen(fd, 'w') as f:
+        f.write(build + '\n')
+    os.replace(staging, os.path.join(root, CURRENT_FILE))
+    prune_builds(root)
+
+
+def resolve_build(root):
+    """
+    Directory of the build CURRENT points at
+
+    Returns:
+        (build, path); build is None when root has no CURRENT file (files
+        saved directly in root, or root is itself a build directory)
+    """
+    current_path = os.path.join(root, CURRENT_FILE)
+    if not os.path.exists(current_path):
+        return None, root
+    with open(current_path) as f:
+        build = f.read().strip()
+    return build, os.path.join(root, BUILDS_DIR, build)
+
+
+def prune_builds(root, keep=KEEP_BUILDS):
+    """
+    Remove all but the newest builds and the current one
+
+    Best-effort: a build whose files are still mapped by a process on
+    Windows can't be deleted and is retried on the next publish.
+    """
+    builds_dir = os.path.join(root, BUILDS_DIR)
+    if not os.path.isdir(builds_dir):
+        return
+    current, _ = resolve_build(root)
+    builds = sorted(name for name in os.listdir(builds_dir)
+                    if os.path.isdir(os.path.join(builds_dir, name)))
+    for name in builds[:-keep]:
+        if name != current:
+            shutil.rmtree(os.path.join(builds_dir, name), ignore_errors=True)
@@ -0,0 +1,349 @@
+"""
+Climatology Module
+Per-location day-of-year climatology tables for historical comparison features
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from build_dirs import create_build, publish_build, resolve_build
+
+
+# Day of year runs from 1 to 366; row 0 is unused
+DAYS = 367
+
+# Rows compared per chunk in compare(), bounds the (rows x values) scratch array
+CHUNK_ROWS = 65536
+
+ARRAYS = ('means', 'counts', 'values')
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def default_path(config):
+    """Directory of the climatology artifact for a loaded config.yaml"""
+    climatology_config = config.get('climatology', {})
+    return climatology_config.get(
+        'path', os.path.join(config['data']['processed_data_path'], 'climatology')
+    )
+
+
+class Climatology:
+    """
+    Historical values of each location's weather columns by day of year
+
+    For every (location, day of year, column) the tables hold the mean and
+    count of the historical values and the values themselves, sorted and
+    NaN-padded to a common length. They are saved as .npy files and opened
+    memory-mapped, so training workers and API processes share one copy and
+    a lookup only touches the cells it needs.
+
+    Each save is a new build directory (see build_dirs), so rebuilding never
+    touches the files a running process has mapped; build_id names the build
+    the tables came from.
+    """
+
+    def __init__(self, columns, locations, coordinates, means, counts, values, path=None,
+                 build_id=None):
+        """
+        Args:
+            columns: Weather columns, in table order
+            locations: Location names, in table order
+            coordinates: (n_locations, 2) latitude/longitude (NaN if unknown)
+            means: (n_locations, 367, n_columns) day-of-year means
+            counts: (n_locations, 367, n_columns) number of historical values
+            values: (n_locations, 367, n_columns, max_values) sorted values
+            path: Directory the tables were loaded from or saved to
+            build_id: Build the tables were loaded from or saved as
+        """
+        self.columns = list(columns)
+        self.locations = list(locations)
+        self.coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+        self.means = means
+        self.counts = counts
+        self.values = values
+        self.path = path
+        self.build_id = build_id
+        self._location_index = {name: i for i, name in enumerate(self.locations)}
+
+    @classmethod
+    def build(cls, df, columns):
+        """
+        Build the tables from labeled data in one vectorized pass
+
+        Args:
+            df: DataFrame with 'location_name', 'date' and weather columns
+                (and optionally 'latitude'/'longitude')
+            columns: Weather columns to include (missing ones are skipped)
+
+        Returns:
+            Climatology
+        """
+        columns = [col for col in columns if col in df.columns]
+        codes, locations = pd.factorize(df['location_name'], sort=True)
+        day_of_year = pd.to_datetime(df['date']).dt.dayofyear.to_numpy()
+        cells = codes * DAYS + day_of_year
+        n_cells = len(locations) * DAYS
+
+        sums = np.zeros((n_cells, len(columns)))
+        counts = np.zeros((n_cells, len(columns)), dtype=np.int32)
+        ordered = []
+        for i, col in enumerate(columns):
+            values = df[col].to_numpy(dtype=np.float64)
+            valid = ~np.isnan(values)
+            cell, values = cells[valid], values[valid]
+            sums[:, i] = np.bincount(cell, weights=values, minlength=n_cells)
+            counts[:, i] = np.bincount(cell, minlength=n_cells)
+            order = np.lexsort((values, cell))
+            ordered.append((cell[order], values[order]))
+
+        # Sorted values of each cell, at their rank within the cell
+        width = max(int(counts.max()), 1) if counts.size else 1
+        values = np.full((n_cells, len(columns), width), np.nan)
+        for i, (cell, cell_values) in enumerate(ordered):
+            first = np.cumsum(counts[:, i]) - counts[:, i]
+            values[cell, i, np.arange(len(cell)) - first[cell]] = cell_values
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts
+
+        coordinates = np.full((len(locations), 2), np.nan)
+        if 'latitude' in df.columns and 'longitude' in df.columns:
+            first_rows = df.groupby(codes)[['latitude', 'longitude']].first()
+            coordinates[first_rows.index] = first_rows.to_numpy(dtype=np.float64)
+
+        shape = (len(locations), DAYS, len(columns))
+        return cls(columns, list(locations), coordinates, means.reshape(shape),
+                   counts.reshape(shape), values.reshape(shape + (width,)))
+
+    @classmethod
+    def from_states(cls, states, coordinates=None):
+        """
+        Build the tables from online feature states (see online_features)
+
+        Args:
+            states: Dict of location_name -> LocationFeatureState
+            coordinates: Dict of location_name -> (latitude, longitude)
+
+        Returns:
+            Climatology
+        """
+        coordinates = coordinates or {}
+        locations = sorted(states)
+        columns = []
+        for location in locations:
+            columns += [col for col in states[location].columns if col not in columns]
+
+        shape = (len(locations), DAYS, len(columns))
+        counts = np.zeros(shape, dtype=np.int32)
+        sums = np.zeros(shape)
+        for i, location in enumerate(locations):
+            state = states[location]
+            for j, col in enumerate(state.columns):
+                counts[i, :, columns.index(col)] = state.doy_count[:, j]
+                sums[i, :, columns.index(col)] = state.doy_sum[:, j]
+
+        width = max(int(counts.max()), 1) if counts.size else 1
+        values = np.full(shape + (width,), np.nan)
+        for i, location in enumerate(locations):
+            state = states[location]
+            for j, col in enumerate(state.columns):
+                k = columns.index(col)
+                for day in np.flatnonzero(counts[i, :, k]):
+                    values[i, day, k, :counts[i, day, k]] = state.doy_values[day][j]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts
+
+        points = np.array([coordinates.get(location, (np.nan, np.nan)) for location in locations],
+                          dtype=np.float64)
+        return cls(columns, locations, points, means, counts, values)
+
+    def save(self, path):
+        """
+        Write the tables as a new build of an artifact directory
+
+        The files go to a fresh build directory and CURRENT is switched to it
+        once they are complete, so readers never see a half-written set of
+        files and processes serving the previous build keep their maps.
+        """
+        os.makedirs(path, exist_ok=True)
+        build_id, build_path = create_build(path)
+
+        for name in ARRAYS:
+            np.save(os.path.join(build_path, f'{name}.npy'), np.ascontiguousarray(getattr(self, name)))
+        with open(os.path.join(build_path, 'index.json'), 'w') as f:
+            json.dump({
+                'columns': self.columns,
+                'locations': [
+                    {'name': name,
+                     'latitude': None if np.isnan(lat) else lat,
+                     'longitude': None if np.isnan(lon) else lon}
+                    for name, (lat, lon) in zip(self.locations, self.coordinates.tolist())
+                ],
+            }, f, indent=2)
+
+        publish_build(path, build_id)
+
+        # Tables saved before builds existed sit directly in path
+        for name in [f'{name}.npy' for name in ARRAYS] + ['index.json']:
+            try:
+                os.remove(os.path.join(path, name))
+            except OSError:
+                pass
+
+        self.path = build_path
+        self.build_id = build_id
+
+    @classmethod
+    def load(cls, path):
+        """
+        Open saved tables memory-mapped
+
+        Args:
+            path: Artifact directory (its current build is opened) or a
+                build directory
+
+        Returns:
+            Climatology, or None if nothing has been saved at path
+        """
+        build_id, path = resolve_build(path)
+        index_path = os.path.join(path, 'index.json')
+        if not os.path.exists(index_path):
+            return None
+
+        with open(index_path) as f:
+            index = json.load(f)
+
+        # Plain ndarray views of the maps index faster than np.memmap
+        arrays = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r').view(np.ndarray)
+            for name in ARRAYS
+        }
+        locations = index['locations']
+        coordinates = [
+            (np.nan if loc['latitude'] is None else loc['latitude'],
+             np.nan if loc['longitude'] is None else loc['longitude'])
+            for loc in locations
+        ]
+        return cls(index['columns'], [loc['name'] for loc in locations], coordinates,
+                   path=path, build_id=build_id or os.path.basename(os.path.normpath(path)), **arrays)
+
+    def location_indices(self, names):
+        """Table row of each location name (-1 for unknown locations)"""
+        return np.array([self._location_index.get(name, -1) for name in names], dtype=np.int64)
+
+    def nearest(self, latitude, longitude, max_distance_km=None):
+        """
+        Closest location to a point
+
+        Args:
+            latitude, longitude: Point in degrees
+            max_distance_km: Ignore locations farther away than this
+
+        Returns:
+            Table row of the location, or None
+        """
+        known = ~np.isnan(self.coordinates).any(axis=1)
+        if not known.any():
+            return None
+
+        lat1, lon1 = np.radians(latitude), np.radians(longitude)
+        lat2, lon2 = np.radians(self.coordinates[:, 0]), np.radians(self.coordinates[:, 1])
+        a = (np.sin((lat2 - lat1) / 2) ** 2
+             + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+        distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+        distance[~known] = np.inf
+
+        best = int(np.argmin(distance))
+        if max_distance_km is not None and distance[best] > max_distance_km:
+            return None
+        return best
+
+    def compare(self, df, columns=None):
+        """
+        Historical comparison features for rows that are part of the history
+
+        Matches the former ``groupby(['location_name', 'day_of_year'])``
+        mean and ``rank(pct=True)``: a row's percentile is its average rank
+        among the values of its location and day of year.
+
+        Args:
+            df: DataFrame with 'location_name', 'date' (or 'day_of_year') and
+                weather columns
+            columns: Columns to compare (default: all table columns in df)
+
+        Returns:
+            DataFrame indexed like df with '<col>_vs_historical' and
+            '<col>_historical_percentile' columns (NaN for unknown locations
+            and missing values)
+        """
+        columns = [col for col in (columns or self.columns) if col in self.columns and col in df.columns]
+        location = self.location_indices(df['location_name'].to_numpy())
+        if 'day_of_year' in df.columns:
+            day_of_year = df['day_of_year'].to_numpy(dtype=np.int64)
+        else:
+            day_of_year = pd.to_datetime(df['date']).dt.dayofyear.to_numpy()
+        known = np.flatnonzero(location >= 0)
+
+        features = {}
+        for col in columns:
+            k = self.columns.index(col)
+            values = df[col].to_numpy(dtype=np.float64)
+            vs_historical = np.full(len(df), np.nan)
+            percentile = np.full(len(df), np.nan)
+
+            for begin in range(0, len(known), CHUNK_ROWS):
+                rows = known[begin:begin + CHUNK_ROWS]
+                loc, day, x = location[rows], day_of_year[rows], values[rows]
+                history = self.values[loc, day, k]
+                less = (history < x[:, None]).sum(axis=1)
+                equal = (history == x[:, None]).sum(axis=1)
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    percentile[rows] = (less + (equal + 1) / 2) / self.counts[loc, day, k]
+                vs_historical[rows] = x - self.means[loc, day, k]
+
+            percentile[np.isnan(values)] = np.nan
+            features[f'{col}_vs_historical'] = vs_historical
+            features[f'{col}_historical_percentile'] = percentile
+
+        return pd.DataFrame(features, index=df.index)
+
+    def lookup(self, location, day_of_year, values):
+        """
+        Compare new days' values with one location's history
+
+        Each day is treated as appended to the history, the way it would be
+        when its features are engineered for training.
+
+        Args:
+            location: Table row (see nearest())
+            day_of_year: Day of year of the values (or an array, one per row
+                of values)
+            values: Values in self.columns order, 1D for one day or 2D with
+                one row per day
+
+        Returns:
+            (vs_historical, percentile) arrays shaped like values (NaN for
+            missing values)
+        """
+        values = np.asarray(values, dtype=np.float64)
+        counts = np.asarray(self.counts[location, day_of_year], dtype=np.float64)
+        history = np.asarray(self.values[location, day_of_year])
+        means = np.asarray(self.means[location, day_of_year])
+
+        # Each row of history is sorted with NaN padding at the end, which
+        # never compares less or equal, so counting comparisons gives the
+        # searchsorted bounds of all columns at once
+        less = (history < values[..., None]).sum(axis=-1)
+        equal = (history == values[..., None]).sum(axis=-1)
+
+        # Rank of each value among its history plus the value itself
+        total = np.where(counts > 0, means * counts, 0.0) + values
+        vs_historical = values - total / (counts + 1)
+        percentile = (less + (equal + 2) / 2) / (counts + 1)
+        percentile[np.isnan(values)] = np.nan
+        return vs_historical, percentile
@@ -0,0 +1,402 @@
+"""
+Compiled Models Module
+Flat-array tree ensembles for low-latency scoring of the trained models
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+import yaml
+
+from model_store import ModelStore, resolve_version, save_artifact
+
+
+# Feature rows kept with an exported model to check it against the original
+CHECK_ROWS = 256
+
+# Batch sizes up to which a compiled model outscores the original's own
+# predict_proba (None: any size); above them ModelStore uses the original
+MAX_ROWS = {
+    'random_forest': 128,
+    'xgboost': 4,
+    'lightgbm': 4,
+    'logistic_regression': None,
+}
+
+# LightGBM treats |x| <= this as zero for missing_type 'Zero'
+LIGHTGBM_ZERO = 1e-35
+
+
+def compiled_path(model_path):
+    """File of the compiled export of a saved model"""
+    root, ext = os.path.splitext(model_path)
+    return f"{root}_compiled{ext}"
+
+
+class CompiledTrees:
+    """
+    Tree ensemble as flat node arrays, scored for all trees at once
+
+    Every tree's nodes are concatenated into one set of arrays; leaves point
+    to themselves, so a batch is scored by stepping every (row, tree) pair
+    one level down per iteration, max_depth times, with a handful of flat
+    numpy gathers per step instead of a Python call per tree. The arrays are
+    saved with save_artifact, so ModelStore memory-maps them.
+
+    Behaves like the original classifier's predict_proba for binary targets.
+    Native boosting libraries overtake it on larger batches, so max_rows
+    records the batch size it is used up to.
+    """
+
+    def __init__(self, kind, feature, threshold, left, right, value, default_left, roots,
+                 max_depth, aggregate, base_margin=0.0, scale=1.0, strict=False,
+                 input_dtype='float64', nan_as_zero=None, zero_missing=None, check_rows=None):
+        """
+        Args:
+            kind: Model family the arrays came from ('random_forest', ...)
+            feature, threshold, left, right: Split of each node (leaves
+                point to themselves)
+            value: Leaf output of each node
+            default_left: Direction of missing values at each node
+            roots: Root node of each tree
+            max_depth: Levels to step through
+            aggregate: 'mean' (probability averaging) or 'logistic'
+                (sum of margins through a sigmoid)
+            base_margin: Margin added to the sum ('logistic' only)
+            scale: Sigmoid scale ('logistic' only)
+            strict: Go left on x < threshold instead of x <= threshold
+            input_dtype: Precision the original model reads features in
+            nan_as_zero: Nodes that score NaN as 0 (LightGBM missing_type None)
+            zero_missing: Nodes that treat 0 as missing (LightGBM missing_type Zero)
+            check_rows: Feature rows for checking against the original model
+        """
+        self.kind = kind
+        self.feature = np.maximum(np.asarray(feature, dtype=np.intp), 0)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        # children[2 * node + goes_right]
+        self.children = np.stack([left, right], axis=1).astype(np.intp).ravel()
+        self.value = np.asarray(value, dtype=np.float64)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.max_depth = int(max_depth)
+        self.aggregate = aggregate
+        self.base_margin = float(base_margin)
+        self.scale = float(scale)
+        self.strict = strict
+        self.input_dtype = input_dtype
+        self.nan_as_zero = None if nan_as_zero is None or not np.any(nan_as_zero) else np.asarray(nan_as_zero, dtype=bool)
+        self.zero_missing = None if zero_missing is None or not np.any(zero_missing) else np.asarray(zero_missing, dtype=bool)
+        self.check_rows = check_rows
+
+    @classmethod
+    def from_nodes(cls, kind, trees, **kwargs):
+        """
+        Flatten per-tree node arrays
+
+        Args:
+            kind: Model family
+            trees: List of dicts of per-node arrays with tree-local child
+                indices (-1 for leaves): feature, threshold, left, right,
+                value, default_left and optionally nan_as_zero / zero_missing
+            **kwargs: Other constructor arguments
+
+        Returns:
+            CompiledTrees
+        """
+        columns = {name: [] for name in ('feature', 'threshold', 'left', 'right', 'value',
+                                         'default_left', 'nan_as_zero', 'zero_missing')}
+        roots, max_depth, offset = [], 0, 0
+        for tree in trees:
+            n = len(tree['feature'])
+            leaf = np.asarray(tree['left']) < 0
+            own = np.arange(n) + offset
+            columns['feature'].append(np.where(leaf, -1, tree['feature']))
+            columns['threshold'].append(np.where(leaf, 0.0, tree['threshold']))
+            columns['left'].append(np.where(leaf, own, np.asarray(tree['left']) + offset))
+            columns['right'].append(np.where(leaf, own, np.asarray(tree['right']) + offset))
+            columns['value'].append(tree['value'])
+            columns['default_left'].append(tree['default_left'])
+            columns['nan_as_zero'].append(tree.get('nan_as_zero', np.zeros(n, dtype=bool)))
+            columns['zero_missing'].append(tree.get('zero_missing', np.zeros(n, dtype=bool)))
+            roots.append(offset)
+            max_depth = max(max_depth, _depth(tree['left'], tree['right']))
+            offset += n
+
+        arrays = {name: np.concatenate(parts) for name, parts in columns.items()}
+        return cls(kind, roots=roots, max_depth=max_depth, **arrays, **kwargs)
+
+    def leaves(self, X):
+        """Leaf node of every (row, tree) pair"""
+        X = np.asarray(X, dtype=self.input_dtype)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        values = X.astype(np.float64).ravel()
+        offsets = (np.arange(len(X)) * X.shape[1])[:, None]
+        nodes = np.repeat(self.roots[None, :], len(X), axis=0)
+        check_missing = self.zero_missing is not None or np.isnan(values).any()
+
+        for _ in range(self.max_depth):
+            x = values.take(offsets + self.feature.take(nodes))
+            threshold = self.threshold.take(nodes)
+            go_right = x >= threshold if self.strict else x > threshold
+            if check_missing:
+                missing = np.isnan(x)
+                if self.zero_missing is not None:
+                    missing |= self.zero_missing.take(nodes) & (np.abs(x) <= LIGHTGBM_ZERO)
+                if self.nan_as_zero is not None:
+                    as_zero = missing & self.nan_as_zero.take(nodes)
+                    zero_right = 0.0 >= threshold if self.strict else 0.0 > threshold
+                    go_right = np.where(as_zero, zero_right, go_right)
+                    missing &= ~as_zero
+                go_right = np.where(missing, ~self.default_left.take(nodes), go_right)
+            nodes = self.children.take(2 * nodes + go_right)
+        return nodes
+
+    def predict_positive(self, X):
+        """Probability of the positive class for each row"""
+        values = self.value[self.leaves(X)]
+        if self.aggregate == 'mean':
+            return values.mean(axis=1)
+        margin = values.sum(axis=1) + self.base_margin
+        return 1.0 / (1.0 + np.exp(-self.scale * margin))
+
+    def predict_proba(self, X):
+        """(rows, 2) class probabilities, like the original classifier"""
+        positive = self.predict_positive(X)
+        return np.stack([1.0 - positive, positive], axis=1)
+
+
+class CompiledLinear:
+    """Logistic regression as a coefficient vector"""
+
+    kind = 'logistic_regression'
+
+    def __init__(self, coef, intercept, check_rows=None):
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.check_rows = check_rows
+
+    def predict_positive(self, X):
+        """Probability of the positive class for each row"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        return 1.0 / (1.0 + np.exp(-(X @ self.coef + self.intercept)))
+
+    def predict_proba(self, X):
+        """(rows, 2) class probabilities, like the original classifier"""
+        positive = self.predict_positive(X)
+        return np.stack([1.0 - positive, positive], axis=1)
+
+
+def _depth(left, right):
+    """Levels below the root of a tree given tree-local child indices"""
+    depth, level, nodes = 0, [0], (np.asarray(left), np.asarray(right))
+    while True:
+        children = [child for node in level for child in (nodes[0][node], nodes[1][node]) if child >= 0]
+        if not children:
+            return depth
+        depth += 1
+        level = children
+
+
+def _compile_random_forest(model):
+    if len(model.classes_) != 2:
+        raise ValueError("Only binary classifiers can be compiled")
+    trees = []
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        counts = tree.value[:, 0, :]
+        trees.append({
+            'feature': tree.feature,
+            'threshold': tree.threshold,
+            'left': tree.children_left,
+            'right': tree.children_right,
+            'value': counts[:, 1] / counts.sum(axis=1),
+            'default_left': getattr(tree, 'missing_go_to_left', np.zeros(tree.node_count, dtype=bool)).astype(bool),
+        })
+    # scikit-learn compares float32 features with float64 thresholds
+    return CompiledTrees.from_nodes('random_forest', trees, aggregate='mean', input_dtype='float32')
+
+
+def _compile_xgboost(model):
+    booster = model.get_booster()
+    learner = json.loads(booster.save_raw(raw_format='json'))['learner']
+    objective = learner['objective']['name']
+    if objective != 'binary:logistic' or learner['gradient_booster']['name'] != 'gbtree':
+        raise ValueError(f"Unsupported XGBoost model: {objective} / {learner['gradient_booster']['name']}")
+
+    trees = learner['gradient_booster']['model']['trees']
+    best_iteration = booster.attr('best_iteration')
+    if best_iteration is not None:
+        trees = trees[:int(best_iteration) + 1]
+
+    nodes = []
+    for tree in trees:
+        conditions = np.asarray(tree['split_conditions'], dtype=np.float32).astype(np.float64)
+        nodes.append({
+            'feature': np.asarray(tree['split_indices'], dtype=np.int32),
+            'threshold': conditions,
+            'left': np.asarray(tree['left_children'], dtype=np.int32),
+            'right': np.asarray(tree['right_children'], dtype=np.int32),
+            # Leaves keep their output in split_conditions
+            'value': conditions,
+            'default_left': np.asarray(tree['default_left'], dtype=bool),
+        })
+
+    base_score = float(learner['learner_model_param']['base_score'])
+    return CompiledTrees.from_nodes(
+        'xgboost', nodes, aggregate='logistic', base_margin=np.log(base_score / (1 - base_score)),
+        strict=True, input_dtype='float32'
+    )
+
+
+def _compile_lightgbm(model):
+    dump = model.booster_.dump_model()
+    objective = dump.get('objective', '')
+    if not objective.startswith('binary'):
+        raise ValueError(f"Unsupported LightGBM objective: {objective}")
+    scale = 1.0
+    for part in objective.split():
+        if part.startswith('sigmoid:'):
+            scale = float(part.split(':')[1])
+
+    trees = []
+    for info in dump['tree_info']:
+        columns = {name: [] for name in ('feature', 'threshold', 'left', 'right', 'value',
+                                         'default_left', 'nan_as_zero', 'zero_missing')}
+
+        def add(node):
+            index = len(columns['feature'])
+            for values in columns.values():
+                values.append(None)
+            if 'leaf_value' in node:
+                entries = (0, 0.0, -1, -1, node['leaf_value'], False, False, False)
+            else:
+                if node.get('decision_type', '<=') != '<=':
+                    raise ValueError("Categorical LightGBM splits can't be compiled")
+                missing_type = node.get('missing_type', 'None')
+                left, right = add(node['left_child']), add(node['right_child'])
+                entries = (node['split_feature'], node['threshold'], left, right, 0.0,
+                           node.get('default_left', False), missing_type == 'None', missing_type == 'Zero')
+            for name, entry in zip(columns, entries):
+                columns[name][index] = entry
+            return index
+
+        add(info['tree_structure'])
+        trees.append({name: np.asarray(values) for name, values in columns.items()})
+
+    return CompiledTrees.from_nodes('lightgbm', trees, aggregate='logistic', scale=scale)
+
+
+def _compile_logistic_regression(model):
+    if model.coef_.shape[0] != 1:
+        raise ValueError("Only binary classifiers can be compiled")
+    return CompiledLinear(model.coef_[0], model.intercept_[0])
+
+
+def compile_model(model, check_rows=None):
+    """
+    Compiled equivalent of a trained model
+
+    Args:
+        model: Fitted RandomForestClassifier, XGBClassifier, LGBMClassifier
+            or LogisticRegression
+        check_rows: Feature rows (as the model sees them, i.e. scaled) kept
+            for checking the export against the original model
+
+    Returns:
+        CompiledTrees or CompiledLinear. Raises ValueError for models that
+        can't be compiled.
+    """
+    name = type(model).__name__
+    compilers = {
+        'RandomForestClassifier': _compile_random_forest,
+        'XGBClassifier': _compile_xgboost,
+        'LGBMClassifier': _compile_lightgbm,
+        'LogisticRegression': _compile_logistic_regression,
+    }
+    if name not in compilers:
+        raise ValueError(f"Can't compile {name}")
+    compiled = compilers[name](model)
+    compiled.max_rows = MAX_ROWS[compiled.kind]
+    if check_rows is not None:
+        compiled.check_rows = np.ascontiguousarray(check_rows, dtype=np.float64)
+    return compiled
+
+
+def max_difference(compiled, model, X=None):
+    """
+    Largest probability difference between a compiled model and the original
+
+    Args:
+        compiled: CompiledTrees or CompiledLinear
+        model: Original fitted model
+        X: Rows to compare on (default: the rows kept with the export)
+    """
+    X = compiled.check_rows if X is None else X
+    if X is None or len(X) == 0:
+        raise ValueError("No rows to check the compiled model on")
+    return float(np.max(np.abs(compiled.predict_positive(X) - model.predict_proba(X)[:, 1])))
+
+
+def export_model(model, model_path, scaler=None, rows=None):
+    """
+    Compile a saved model and write it next to it
+
+    Args:
+        model: Fitted model saved at model_path
+        model_path: Path of the saved model
+        scaler: The model's scaler, applied to rows first (if any)
+        rows: Raw feature rows to keep for checks
+
+    Returns:
+        (path, max probability difference on rows, or None without rows)
+    """
+    check_rows = None
+    if rows is not None and len(rows):
+        check_rows = scaler.transform(rows) if scaler is not None else rows
+    compiled = compile_model(model, check_rows)
+    difference = max_difference(compiled, model) if check_rows is not None else None
+    path = compiled_path(model_path)
+    save_artifact(compiled, path)
+    return path, difference
+
+
+def main():
+    """Export compiled models for the current (or a given) model version"""
+    from storage import WeatherStore
+
+    parser = argparse.ArgumentParser(description='Export compiled models for fast serving')
+    parser.add_argument('--version', type=str, help='Model version (default: the current one)')
+    args = parser.parse_args()
+
+    with open('config.yaml', 'r') as f:
+        config = yaml.safe_load(f)
+
+    _, model_dir = resolve_version(config['api']['model_path'], args.version)
+    model_store = ModelStore(model_dir, mmap_mode=None)
+
+    rows = None
+    store = WeatherStore(config)
+    if store.exists('features'):
+        features = store.read('features', columns=model_store.feature_names)
+        rows = features.sample(min(CHECK_ROWS, len(features)), random_state=0).to_numpy(dtype=np.float64)
+
+    for target, (model_path, _) in model_store.paths.items():
+        artifacts = model_store.load(target)
+        try:
+            path, difference = export_model(artifacts['model'], model_path, artifacts['scaler'], rows)
+        except ValueError as e:
+            print(f"  {target}: not compiled - {e}")
+            continue
+        checked = f" (max probability difference {difference:.2e})" if difference is not None else ""
+        print(f"✓ Saved compiled {target} model: {path}{checked}")
+
+
+if __name__ == "__main__":
+    # Run from the imported module, so exports pickle as compiled_models classes
+    from compiled_models import main
+    main()
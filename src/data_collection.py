@@ -10,9 +10,46 @@ from datetime import datetime, timedelta
 import yaml
 import argparse
 import os
+import json
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 
+from power_cache import PowerCache
+from storage import WeatherStore
+
+
+class TokenBucket:
+    """Thread-safe token bucket rate limiter"""
+    
+    def __init__(self, rate, capacity=None):
+        """
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum burst size (defaults to one second of tokens)
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a token is available, then consume it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
 
 class NASADataCollector:
     """Collects weather data from NASA POWER API"""
@@ -27,11 +64,30 @@ class NASADataCollector:
         self.start_date = self.config['data']['start_date']
         self.end_date = self.config['data']['end_date']
         
+        # Concurrency and rate limiting for multi-location collection
+        collection_config = self.config['data'].get('collection', {})
+        self.max_workers = collection_config.get('max_workers', 1)
+        self.rate_limiter = TokenBucket(
+            collection_config.get('requests_per_second', 1),
+            collection_config.get('burst')
+        )
+        
+        # Partitioned Parquet store for raw and labeled data
+        self.store = WeatherStore(self.config)
+        
+        # Shared on-disk cache of POWER responses
+        self.cache = PowerCache.from_config(self.config)
+        
+        # Per-request latencies (seconds) for the end-of-run report
+        self.request_latencies = []
+        self.latency_lock = threading.Lock()
+        
         # Create directories if they don't exist
         os.makedirs(self.config['data']['raw_data_path'], exist_ok=True)
         os.makedirs(self.config['data']['processed_data_path'], exist_ok=True)
     
-    def fetch_location_data(self, latitude, longitude, location_name):
+    def fetch_location_data(self, latitude, longitude, location_name,
+                            start_date=None, end_date=None, append=False):
         """
         Fetch weather data for a specific location
         
@@ -39,6 +95,9 @@ class NASADataCollector:
             latitude: Latitude of location
             longitude: Longitude of location
             location_name: Name identifier for the location
+            start_date: First day to fetch (YYYY-MM-DD, defaults to config)
+            end_date: Last day to fetch (YYYY-MM-DD, defaults to config)
+            append: Append to the stored raw data instead of replacing it
             
         Returns:
             DataFrame with weather data
@@ -53,22 +112,35 @@ class NASADataCollector:
             'community': 'AG',  # Agricultural community data
             'longitude': longitude,
             'latitude': latitude,
-            'start': self.start_date.replace('-', ''),
-            'end': self.end_date.replace('-', ''),
+            'start': (start_date or self.start_date).replace('-', ''),
+            'end': (end_date or self.end_date).replace('-', ''),
             'format': 'JSON'
         }
         
         try:
-            print("Requesting data from NASA POWER API...")
-            response = requests.get(url, params=params, timeout=60)
-            response.raise_for_status()
+            data = self.cache.get(params)
+            from_cache = data is not None
             
-            data = response.json()
+            if from_cache:
+                print("✓ Using cached NASA POWER response")
+            else:
+                print("Requesting data from NASA POWER API...")
+                self.rate_limiter.acquire()
+                started = time.perf_counter()
+                response = requests.get(url, params=params, timeout=60)
+                with self.latency_lock:
+                    self.request_latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+                
+                data = response.json()
             
             # Extract parameters from response
             if 'properties' in data and 'parameter' in data['properties']:
                 params_data = data['properties']['parameter']
                 
+                if not from_cache:
+                    self.cache.put(params, data)
+                
                 # Convert to DataFrame
                 df = pd.DataFrame(params_data)
                 
@@ -77,18 +149,21 @@ class NASADataCollector:
                 df.reset_index(inplace=True)
                 df.rename(columns={'index': 'date'}, inplace=True)
                 
+                # POWER publishes recent days with a fill value until they are
+                # processed; leave trailing incomplete days for the next refresh
+                fill_value = data.get('header', {}).get('fill_value', -999)
+                incomplete = (df.drop(columns='date') == fill_value).any(axis=1)
+                complete_rows = np.flatnonzero(~incomplete.values)
+                df = df.iloc[:complete_rows[-1] + 1] if len(complete_rows) else df.iloc[:0]
+                
                 # Add location information
                 df['latitude'] = latitude
                 df['longitude'] = longitude
                 df['location_name'] = location_name
                 
-                # Save raw data
-                raw_path = os.path.join(
-                    self.config['data']['raw_data_path'],
-                    f"{location_name}_raw.csv"
-                )
-                df.to_csv(raw_path, index=False)
-                print(f"✓ Saved raw data to {raw_path}")
+                # Save raw data (only this location's partitions are touched)
+                self.store.write('raw', df, mode='append' if append else 'replace_locations')
+                print(f"✓ Saved raw data to {self.store.dataset_path('raw')}")
                 print(f"✓ Collected {len(df)} days of data")
                 
                 return df
@@ -100,45 +175,147 @@ class NASADataCollector:
             print(f"Error fetching data: {e}")
             return None
     
-    def fetch_multiple_locations(self, locations):
+    def update_location_data(self, latitude, longitude, location_name, end_date=None, last_date=None):
+        """
+        Fetch only the days after the last stored date for a location
+        
+        Args:
+            latitude: Latitude of location
+            longitude: Longitude of location
+            location_name: Name identifier for the location
+            end_date: Last day to fetch (YYYY-MM-DD, defaults to config)
+            last_date: Last stored date, if already known
+            
+        Returns:
+            DataFrame with the newly stored days, or None if already up to date
+        """
+        end_date = end_date or self.end_date
+        if last_date is None:
+            last_date = self.store.last_dates('raw').get(location_name)
+        
+        if last_date is None:
+            print(f"\nNo stored data for {location_name}, fetching full history")
+            return self.fetch_location_data(latitude, longitude, location_name, end_date=end_date)
+        
+        start = last_date + timedelta(days=1)
+        if start > pd.to_datetime(end_date):
+            print(f"\n✓ {location_name} is up to date (last stored day {last_date.date()})")
+            return None
+        
+        return self.fetch_location_data(
+            latitude, longitude, location_name,
+            start_date=start.strftime('%Y-%m-%d'),
+            end_date=end_date,
+            append=True
+        )
+    
+    def _collect_concurrently(self, fetch, locations, max_workers):
+        """Run fetch(lat, lon, name) for every location on a thread pool, preserving order"""
+        results = [None] * len(locations)
+        
+        with ThreadPoolExecutor(max_workers=max(1, max_workers or self.max_workers)) as executor:
+            futures = {
+                executor.submit(fetch, lat, lon, name): i
+                for i, (lat, lon, name) in enumerate(locations)
+            }
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Fetching locations"):
+                results[futures[future]] = future.result()
+        
+        return [df for df in results if df is not None and len(df) > 0]
+    
+    def fetch_multiple_locations(self, locations, max_workers=None):
         """
         Fetch data for multiple locations
         
+        Requests run on a thread pool of ``max_workers`` threads (1 = sequential)
+        and are paced by the token-bucket rate limiter instead of a fixed sleep.
+        
         Args:
             locations: List of tuples (lat, lon, name)
+            max_workers: Concurrent requests (defaults to data.collection.max_workers)
             
         Returns:
             Combined DataFrame
         """
-        all_data = []
+        self.request_latencies = []
+        started = time.perf_counter()
         
-        for lat, lon, name in tqdm(locations, desc="Fetching locations"):
-            df = self.fetch_location_data(lat, lon, name)
-            if df is not None:
-                all_data.append(df)
-            time.sleep(1)  # Be respectful to the API
+        # Keep the combined frame in the same order as the input locations
+        all_data = self._collect_concurrently(self.fetch_location_data, locations, max_workers)
         
         if all_data:
             combined_df = pd.concat(all_data, ignore_index=True)
+            print(f"\n✓ Stored {len(all_data)} locations in {self.store.dataset_path('raw')}")
             
-            # Save combined data
-            combined_path = os.path.join(
-                self.config['data']['raw_data_path'],
-                "all_locations_raw.csv"
-            )
-            combined_df.to_csv(combined_path, index=False)
-            print(f"\n✓ Saved combined data to {combined_path}")
+            self.report_throughput(len(combined_df), time.perf_counter() - started)
             
             return combined_df
         
         return None
     
-    def create_extreme_labels(self, df):
+    def update_multiple_locations(self, locations, end_date=None, max_workers=None):
+        """
+        Incrementally refresh multiple locations
+        
+        Args:
+            locations: List of tuples (lat, lon, name)
+            end_date: Last day to fetch (YYYY-MM-DD, defaults to config)
+            max_workers: Concurrent requests (defaults to data.collection.max_workers)
+            
+        Returns:
+            DataFrame with only the newly stored days, or None if nothing changed
+        """
+        self.request_latencies = []
+        started = time.perf_counter()
+        
+        last_dates = self.store.last_dates('raw')
+        update = lambda lat, lon, name: self.update_location_data(
+            lat, lon, name, end_date, last_dates.get(name)
+        )
+        new_data = self._collect_concurrently(update, locations, max_workers)
+        
+        if not new_data:
+            return None
+        
+        new_df = pd.concat(new_data, ignore_index=True)
+        
+        self.report_throughput(len(new_df), time.perf_counter() - started)
+        
+        return new_df
+    
+    def report_throughput(self, total_rows, elapsed):
+        """Print rows/second and request latency percentiles for a run"""
+        print("\nCollection throughput:")
+        print(f"  Rows: {total_rows} in {elapsed:.1f}s ({total_rows / max(elapsed, 1e-9):.0f} rows/s)")
+        
+        if self.request_latencies:
+            p50, p95 = np.percentile(self.request_latencies, [50, 95])
+            print(f"  Requests: {len(self.request_latencies)} "
+                  f"(latency p50 {p50:.2f}s, p95 {p95:.2f}s)")
+        
+        cache_stats = self.cache.stats()
+        print(f"  Cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+              f"({cache_stats['hit_rate']:.0%} hit rate)")
+    
+    def _percentile_cutoff(self, df, label, metric, cutoffs):
+        """Percentile threshold for a label, reusing a stored cut-off when given"""
+        if cutoffs and label in cutoffs:
+            value = cutoffs[label]
+        else:
+            percentile = self.config['thresholds'][label]['percentile']
+            value = df[metric].quantile(percentile / 100)
+        
+        self.label_cutoffs[label] = float(value)
+        return value
+    
+    def create_extreme_labels(self, df, cutoffs=None):
         """
         Create binary labels for extreme weather conditions
         
         Args:
             df: DataFrame with weather data
+            cutoffs: Stored percentile cut-offs per label (see save_label_cutoffs).
+                When omitted the percentiles are computed from df.
             
         Returns:
             DataFrame with added labels
@@ -146,31 +323,32 @@ class NASADataCollector:
         print("\nCreating extreme weather labels...")
         
         thresholds = self.config['thresholds']
+        self.label_cutoffs = {}
         
         # Very Hot
         if 'T2M_MAX' in df.columns:
-            hot_percentile = df['T2M_MAX'].quantile(thresholds['very_hot']['percentile'] / 100)
+            hot_percentile = self._percentile_cutoff(df, 'very_hot', 'T2M_MAX', cutoffs)
             hot_absolute = thresholds['very_hot']['absolute']
             df['very_hot'] = ((df['T2M_MAX'] >= hot_percentile) | 
                              (df['T2M_MAX'] >= hot_absolute)).astype(int)
         
         # Very Cold
         if 'T2M_MIN' in df.columns:
-            cold_percentile = df['T2M_MIN'].quantile(thresholds['very_cold']['percentile'] / 100)
+            cold_percentile = self._percentile_cutoff(df, 'very_cold', 'T2M_MIN', cutoffs)
             cold_absolute = thresholds['very_cold']['absolute']
             df['very_cold'] = ((df['T2M_MIN'] <= cold_percentile) | 
                               (df['T2M_MIN'] <= cold_absolute)).astype(int)
         
         # Very Windy
         if 'WS2M' in df.columns:
-            wind_percentile = df['WS2M'].quantile(thresholds['very_windy']['percentile'] / 100)
+            wind_percentile = self._percentile_cutoff(df, 'very_windy', 'WS2M', cutoffs)
             wind_absolute = thresholds['very_windy']['absolute']
             df['very_windy'] = ((df['WS2M'] >= wind_percentile) | 
                                (df['WS2M'] >= wind_absolute)).astype(int)
         
         # Very Wet
         if 'PRECTOTCORR' in df.columns:
-            wet_percentile = df['PRECTOTCORR'].quantile(thresholds['very_wet']['percentile'] / 100)
+            wet_percentile = self._percentile_cutoff(df, 'very_wet', 'PRECTOTCORR', cutoffs)
             wet_absolute = thresholds['very_wet']['absolute']
             df['very_wet'] = ((df['PRECTOTCORR'] >= wet_percentile) | 
                              (df['PRECTOTCORR'] >= wet_absolute)).astype(int)
@@ -182,7 +360,7 @@ class NASADataCollector:
             RH = df['RH2M']
             df['heat_index'] = T + (0.5 * (T + 61.0 + ((T-68.0)*1.2) + (RH*0.094)))
             
-            hi_percentile = df['heat_index'].quantile(thresholds['very_uncomfortable']['percentile'] / 100)
+            hi_percentile = self._percentile_cutoff(df, 'very_uncomfortable', 'heat_index', cutoffs)
             hi_absolute = thresholds['very_uncomfortable']['absolute']
             df['very_uncomfortable'] = ((df['heat_index'] >= hi_percentile) | 
                                        (df['heat_index'] >= hi_absolute)).astype(int)
@@ -197,6 +375,52 @@ class NASADataCollector:
                 print(f"  {col}: {count} days ({pct:.2f}%)")
         
         return df
+    
+    def label_cutoffs_path(self):
+        return os.path.join(self.config['data']['processed_data_path'], "label_cutoffs.json")
+    
+    def save_label_cutoffs(self):
+        """Persist the percentile cut-offs from the last labelling run"""
+        with open(self.label_cutoffs_path(), 'w') as f:
+            json.dump(self.label_cutoffs, f, indent=2)
+    
+    def load_label_cutoffs(self):
+        """Load stored percentile cut-offs (None if no full run has saved them)"""
+        path = self.label_cutoffs_path()
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
+    
+    def append_labeled_data(self, new_df):
+        """
+        Label only newly collected rows and append them to the labeled dataset
+        
+        New rows are labelled with the stored cut-offs so existing labels stay
+        valid; without stored cut-offs they are derived from the stored history.
+        
+        Args:
+            new_df: Newly collected raw rows
+            
+        Returns:
+            DataFrame with the labelled new rows
+        """
+        has_history = self.store.exists('labeled')
+        cutoffs = self.load_label_cutoffs()
+        
+        if cutoffs is None and has_history:
+            self.create_extreme_labels(self.store.read('labeled'))
+            cutoffs = self.label_cutoffs
+            self.save_label_cutoffs()
+        
+        labeled = self.create_extreme_labels(new_df, cutoffs)
+        
+        self.store.write('labeled', labeled, mode='append')
+        if not has_history:
+            self.save_label_cutoffs()
+        print(f"\n✓ Saved {len(labeled)} labeled rows to {self.store.dataset_path('labeled')}")
+        
+        return labeled
 
 
 def main():
@@ -206,10 +430,18 @@ def main():
     parser.add_argument('--lon', type=float, help='Longitude')
     parser.add_argument('--name', type=str, help='Location name')
     parser.add_argument('--multi', action='store_true', help='Use predefined multiple locations')
+    parser.add_argument('--workers', type=int, help='Concurrent requests for --multi (overrides config)')
+    parser.add_argument('--rate', type=float, help='Max requests per second (overrides config)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only fetch days after the last stored date for each location')
+    parser.add_argument('--end-date', type=str,
+                        help='Last day to fetch (YYYY-MM-DD); incremental runs default to yesterday')
     
     args = parser.parse_args()
     
     collector = NASADataCollector()
+    if args.rate:
+        collector.rate_limiter = TokenBucket(args.rate, collector.rate_limiter.capacity)
     
     if args.multi:
         # Predefined locations for diverse climate data (US + All 29 Indian States)
@@ -257,34 +489,47 @@ def main():
             (22.5726, 88.3639, "West_Bengal_Kolkata"),
             (28.6139, 77.2090, "Delhi_New_Delhi"),
         ]
-        df = collector.fetch_multiple_locations(locations)
     else:
         if args.lat and args.lon and args.name:
-            df = collector.fetch_location_data(args.lat, args.lon, args.name)
+            locations = [(args.lat, args.lon, args.name)]
         else:
             # Use default location from config
-            config = collector.config
-            default_loc = config['frontend']['default_location']
-            df = collector.fetch_location_data(
+            default_loc = collector.config['frontend']['default_location']
+            locations = [(
                 default_loc['latitude'],
                 default_loc['longitude'],
                 default_loc['name'].replace(',', '').replace(' ', '_')
-            )
+            )]
+    
+    if args.incremental:
+        # Fetch only the days after each location's last stored date
+        end_date = args.end_date or (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+        new_df = collector.update_multiple_locations(locations, end_date, max_workers=args.workers)
+        
+        if new_df is None:
+            print("\n✓ All locations are up to date")
+            return
+        
+        collector.append_labeled_data(new_df)
+        print(f"\n✓ Incremental collection complete! New records: {len(new_df)}")
+        return
+    
+    if args.multi:
+        df = collector.fetch_multiple_locations(locations, max_workers=args.workers)
+    else:
+        lat, lon, name = locations[0]
+        df = collector.fetch_location_data(lat, lon, name, end_date=args.end_date)
     
     if df is not None:
         # Create labels
         df = collector.create_extreme_labels(df)
+        collector.save_label_cutoffs()
         
         # Save with labels
-        output_path = os.path.join(
-            collector.config['data']['processed_data_path'],
-            f"labeled_data.csv"
-        )
-        df.to_csv(output_path, index=False)
-        print(f"\n✓ Saved labeled data to {output_path}")
+        collector.store.write('labeled', df)
+        print(f"\n✓ Saved labeled data to {collector.store.dataset_path('labeled')}")
         print(f"\n✓ Data collection complete! Total records: {len(df)}")
 
 
 if __name__ == "__main__":
     main()
-
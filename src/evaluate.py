@@ -17,6 +17,9 @@ from sklearn.metrics import (
 )
 from sklearn.calibration import calibration_curve
 
+from model_store import resolve_version
+from storage import WeatherStore
+
 
 class ModelEvaluator:
     """Evaluates and visualizes model performance"""
@@ -26,7 +29,8 @@ class ModelEvaluator:
         with open(config_path, 'r') as f:
             self.config = yaml.safe_load(f)
         
-        self.model_dir = self.config['api']['model_path']
+        # Files of the model version the APIs currently serve
+        _, self.model_dir = resolve_version(self.config['api']['model_path'])
         
         # Create evaluation output directory
         self.eval_dir = "evaluation_results"
@@ -250,17 +254,20 @@ def main():
     evaluator = ModelEvaluator()
     
     # Load test data
-    features_path = os.path.join(
-        evaluator.config['data']['processed_data_path'],
-        'features_engineered.csv'
-    )
+    store = WeatherStore(evaluator.config)
     
-    if not os.path.exists(features_path):
-        print(f"Error: {features_path} not found.")
+    if not store.exists('features'):
+        print(f"Error: {store.dataset_path('features')} not found.")
         return
     
+    # Only decode the columns the models use plus the labels
+    targets = ['very_hot', 'very_cold', 'very_windy', 'very_wet', 'very_uncomfortable']
+    feature_names = joblib.load(os.path.join(evaluator.model_dir, "feature_names.pkl"))
+    available = set(store.columns('features'))
+    columns = [col for col in ['date'] + feature_names + targets if col in available]
+    
     print("Loading test data...")
-    df = pd.read_csv(features_path)
+    df = store.read('features', columns=columns)
     
     # Use last 20% as test set (chronological)
     test_size = int(0.2 * len(df))
@@ -269,8 +276,6 @@ def main():
     print(f"✓ Loaded {len(df_test)} test samples")
     
     # Evaluate all targets
-    targets = ['very_hot', 'very_cold', 'very_windy', 'very_wet', 'very_uncomfortable']
-    
     all_results = {}
     for target in targets:
         if target in df.columns:
@@ -8,13 +8,29 @@ import numpy as np
 from datetime import datetime
 import yaml
 import os
+import io
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+
+from climatology import Climatology, default_path as climatology_path
+from online_features import OnlineFeatureEngineer
+from rolling_stats import group_starts, rolling_window_stats
+from shared_frame import SharedFrame
+from storage import WeatherStore
 
 
 class FeatureEngineer:
     """Creates features from raw weather data"""
     
+    # Weather columns used for lag, rolling, trend and historical features
+    WEATHER_COLUMNS = ['T2M', 'T2M_MAX', 'T2M_MIN', 'PRECTOTCORR',
+                       'WS2M', 'RH2M', 'PS', 'CLOUD_AMT']
+    
     def __init__(self, config_path="config.yaml"):
         """Initialize with configuration"""
+        self.config_path = config_path
         with open(config_path, 'r') as f:
             self.config = yaml.safe_load(f)
     
@@ -90,43 +106,25 @@ class FeatureEngineer:
         print(f"Creating rolling features for windows {windows}...")
         
         df = df.sort_values(['location_name', 'date'])
-        
-        for col in columns:
-            if col in df.columns:
-                for window in windows:
-                    # Rolling mean
-                    df[f'{col}_rolling_mean_{window}'] = (
-                        df.groupby('location_name')[col]
-                        .rolling(window=window, min_periods=1)
-                        .mean()
-                        .reset_index(level=0, drop=True)
-                    )
-                    
-                    # Rolling std
-                    df[f'{col}_rolling_std_{window}'] = (
-                        df.groupby('location_name')[col]
-                        .rolling(window=window, min_periods=1)
-                        .std()
-                        .reset_index(level=0, drop=True)
-                    )
-                    
-                    # Rolling max
-                    df[f'{col}_rolling_max_{window}'] = (
-                        df.groupby('location_name')[col]
-                        .rolling(window=window, min_periods=1)
-                        .max()
-                        .reset_index(level=0, drop=True)
-                    )
-                    
-                    # Rolling min
-                    df[f'{col}_rolling_min_{window}'] = (
-                        df.groupby('location_name')[col]
-                        .rolling(window=window, min_periods=1)
-                        .min()
-                        .reset_index(level=0, drop=True)
-                    )
-        
-        return df
+        columns = [col for col in columns if col in df.columns]
+        if not columns:
+            return df
+        
+        # All columns, windows and statistics in one vectorized pass
+        starts = group_starts(df['location_name'].to_numpy())
+        stats = rolling_window_stats(df[columns].to_numpy(dtype=np.float64), starts, windows)
+        
+        rolling = {}
+        for i, col in enumerate(columns):
+            for window in windows:
+                mean, std, rolling_max, rolling_min = stats[window]
+                rolling[f'{col}_rolling_mean_{window}'] = mean[:, i]
+                rolling[f'{col}_rolling_std_{window}'] = std[:, i]
+                rolling[f'{col}_rolling_max_{window}'] = rolling_max[:, i]
+                rolling[f'{col}_rolling_min_{window}'] = rolling_min[:, i]
+        
+        df = df.drop(columns=[name for name in rolling if name in df.columns])
+        return pd.concat([df, pd.DataFrame(rolling, index=df.index)], axis=1)
     
     def create_trend_features(self, df, columns):
         """
@@ -162,35 +160,30 @@ class FeatureEngineer:
         
         return df
     
-    def create_historical_comparison_features(self, df, columns):
+    def create_historical_comparison_features(self, df, columns, reference=None, climatology=None):
         """
         Compare current values to historical averages for the same day of year
         
         Args:
             df: DataFrame
             columns: List of columns to compare
+            reference: Optional full history (including df's rows) to compare
+                against, used when df only holds newly added rows
+            climatology: Optional prebuilt Climatology covering df's rows
+                (built from reference, or df itself, when not given)
             
         Returns:
             DataFrame with historical comparison features
         """
         print("Creating historical comparison features...")
         
-        for col in columns:
-            if col in df.columns and 'day_of_year' in df.columns:
-                # Historical average for this day of year
-                historical_avg = (
-                    df.groupby(['location_name', 'day_of_year'])[col]
-                    .transform('mean')
-                )
-                df[f'{col}_vs_historical'] = df[col] - historical_avg
-                
-                # Percentile rank within historical data for this day
-                df[f'{col}_historical_percentile'] = (
-                    df.groupby(['location_name', 'day_of_year'])[col]
-                    .rank(pct=True)
-                )
+        if climatology is None:
+            history = reference if reference is not None else df
+            climatology = Climatology.build(history, [col for col in columns if col in df.columns])
         
-        return df
+        comparison = climatology.compare(df, columns)
+        df = df.drop(columns=[name for name in comparison.columns if name in df.columns])
+        return pd.concat([df, comparison], axis=1)
     
     def create_interaction_features(self, df):
         """
@@ -218,12 +211,14 @@ class FeatureEngineer:
         
         return df
     
-    def engineer_features(self, df):
+    def engineer_features(self, df, reference=None, climatology=None):
         """
         Main feature engineering pipeline
         
         Args:
             df: Raw DataFrame with weather data and labels
+            reference: Optional full history for historical comparison features
+            climatology: Optional prebuilt Climatology for historical comparison
             
         Returns:
             DataFrame with engineered features
@@ -236,9 +231,7 @@ class FeatureEngineer:
         df = self.create_temporal_features(df)
         
         # Define weather columns for feature engineering
-        weather_columns = ['T2M', 'T2M_MAX', 'T2M_MIN', 'PRECTOTCORR', 
-                          'WS2M', 'RH2M', 'PS', 'CLOUD_AMT']
-        weather_columns = [col for col in weather_columns if col in df.columns]
+        weather_columns = [col for col in self.WEATHER_COLUMNS if col in df.columns]
         
         # Lag features
         lag_days = self.config['features']['lag_days']
@@ -252,12 +245,28 @@ class FeatureEngineer:
         df = self.create_trend_features(df, weather_columns)
         
         # Historical comparison
-        df = self.create_historical_comparison_features(df, weather_columns)
+        df = self.create_historical_comparison_features(df, weather_columns, reference, climatology)
         
         # Interaction features
         df = self.create_interaction_features(df)
         
         # Sanitize extreme/infinite values before dropping NaNs
+        df = self.sanitize(df)
+
+        # Remove rows with NaN values (from lag/rolling operations)
+        initial_rows = len(df)
+        df = df.dropna()
+        removed_rows = initial_rows - len(df)
+        
+        print(f"\n✓ Feature engineering complete!")
+        print(f"  Total features: {len(df.columns)}")
+        print(f"  Removed {removed_rows} rows due to NaN values")
+        print(f"  Final dataset size: {len(df)} rows")
+        
+        return df
+    
+    def sanitize(self, df):
+        """Replace infinite and absurdly large values with NaN"""
         numeric_cols = df.select_dtypes(include=[np.number]).columns
         # Replace inf/-inf with NaN
         df[numeric_cols] = df[numeric_cols].replace([np.inf, -np.inf], np.nan)
@@ -267,49 +276,210 @@ class FeatureEngineer:
             mask = df[col].abs() > max_float
             if mask.any():
                 df.loc[mask, col] = np.nan
-
-        # Remove rows with NaN values (from lag/rolling operations)
-        initial_rows = len(df)
-        df = df.dropna()
-        removed_rows = initial_rows - len(df)
+        return df
+    
+    def feature_state_path(self):
+        """File holding the per-location online feature state"""
+        return os.path.join(self.config['data']['processed_data_path'], "feature_state.joblib")
+    
+    def resolve_jobs(self, n_jobs=None):
+        """Number of worker processes (None = config, -1 = all cores)"""
+        if n_jobs is None:
+            n_jobs = self.config['features'].get('n_jobs', 1)
+        if n_jobs is None or n_jobs < 1:
+            n_jobs = os.cpu_count() or 1
+        return n_jobs
+    
+    def engineer_features_parallel(self, df, n_jobs=None, climatology=None):
+        """
+        Run engineer_features on shards of locations in a process pool
+        
+        Every feature is computed per location, so shards of whole locations
+        give the same rows as a single-process run. The labeled data and the
+        results are exchanged through shared memory; only shard bounds are
+        pickled. Results come back in location order.
+        
+        Args:
+            df: Raw DataFrame with weather data and labels
+            n_jobs: Worker processes (None = config, -1 = all cores)
+            climatology: Optional prebuilt Climatology; workers open a saved
+                one memory-mapped and otherwise build their shard's own
+            
+        Returns:
+            DataFrame with engineered features
+        """
+        n_jobs = self.resolve_jobs(n_jobs)
+        df = df.sort_values('location_name', kind='mergesort')
+        original_index = df.index
+        df = df.reset_index(drop=True)
+        
+        sizes = df.groupby('location_name', sort=True).size().to_numpy()
+        if n_jobs == 1 or len(sizes) == 1:
+            features = self.engineer_features(df, climatology=climatology)
+            features.index = original_index[features.index]
+            return features
+        
+        print("\n" + "="*50)
+        print(f"Starting Feature Engineering Pipeline ({n_jobs} workers)")
+        print("="*50)
+        
+        # A few shards per worker keeps the pool busy when locations differ in size
+        bounds = np.concatenate([[0], np.cumsum(sizes)])
+        groups = np.array_split(np.arange(len(sizes)), min(len(sizes), n_jobs * 4))
+        shards = [(int(bounds[group[0]]), int(bounds[group[-1] + 1])) for group in groups]
+        
+        # Column layout of the output, from a run that produces no rows
+        with contextlib.redirect_stdout(io.StringIO()):
+            schema = self.engineer_features(df.iloc[:1].copy())
+        shared_climatology = climatology.path if climatology is not None else None
+        
+        source = SharedFrame.from_frame(df)
+        categories = {name: cats for name, kind, _, _, cats in source.layout if kind == 'category'}
+        output = SharedFrame.create(schema, len(df), categories)
+        
+        try:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                futures = {
+                    executor.submit(_engineer_shard, self.config_path, source.spec(),
+                                    output.spec(), start, stop, shared_climatology): start
+                    for start, stop in shards
+                }
+                
+                rows_written = {}
+                for future in tqdm(as_completed(futures), total=len(futures), desc="Engineering shards"):
+                    rows_written[futures[future]] = future.result()
+            
+            df = pd.concat(
+                [output.read(start, start + rows_written[start]) for start, _ in shards]
+            )
+        finally:
+            source.unlink()
+            output.unlink()
+        
+        df.index = original_index[df.index]
         
         print(f"\n✓ Feature engineering complete!")
         print(f"  Total features: {len(df.columns)}")
-        print(f"  Removed {removed_rows} rows due to NaN values")
+        print(f"  Removed {len(original_index) - len(df)} rows due to NaN values")
         print(f"  Final dataset size: {len(df)} rows")
         
         return df
 
 
+def _engineer_shard(config_path, source_spec, output_spec, start, stop, climatology_path=None):
+    """
+    Worker: engineer features for rows start..stop of the shared labeled data
+    
+    Results are written to the same row range of the output block, which is
+    large enough because engineering only ever drops rows. A saved
+    climatology is opened memory-mapped, so workers share its pages.
+    
+    Returns:
+        Number of rows written
+    """
+    source = SharedFrame.attach(source_spec)
+    output = SharedFrame.attach(output_spec)
+    
+    try:
+        shard = source.read(start, stop)
+        engineer = FeatureEngineer(config_path)
+        climatology = Climatology.load(climatology_path) if climatology_path else None
+        
+        with contextlib.redirect_stdout(io.StringIO()):
+            features = engineer.engineer_features(shard, climatology=climatology)
+        
+        columns = [name for name, kind, _, _, _ in output.layout if kind != 'index']
+        output.write(features[columns], start)
+        return len(features)
+    finally:
+        source.close()
+        output.close()
+
+
 def main():
     """Main execution function"""
+    parser = argparse.ArgumentParser(description='Engineer features from labeled data')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only engineer rows newer than the stored features')
+    parser.add_argument('--workers', type=int,
+                        help='Worker processes for a full rebuild (-1 = all cores)')
+    args = parser.parse_args()
+    
     engineer = FeatureEngineer()
+    store = WeatherStore(engineer.config)
     
-    # Load labeled data
-    labeled_data_path = os.path.join(
-        engineer.config['data']['processed_data_path'],
-        'labeled_data.csv'
-    )
+    if not store.exists('labeled'):
+        print(f"Error: {store.dataset_path('labeled')} not found. Run data_collection.py first.")
+        return
     
-    if not os.path.exists(labeled_data_path):
-        print(f"Error: {labeled_data_path} not found. Run data_collection.py first.")
+    if args.incremental and store.exists('features'):
+        feature_dates = store.last_dates('features')
+        affected = [
+            location for location, last_date in store.last_dates('labeled').items()
+            if location not in feature_dates or last_date > feature_dates[location]
+        ]
+        if not affected:
+            print("\n✓ Engineered features are up to date")
+            return
+        
+        online = OnlineFeatureEngineer.load(engineer.feature_state_path(), engineer)
+        if online is None:
+            online = OnlineFeatureEngineer(engineer)
+        
+        # Locations whose state doesn't end at their last engineered day are rebuilt
+        state_dates = online.last_dates()
+        stale = [
+            location for location in affected
+            if location not in feature_dates or state_dates.get(location) != feature_dates[location]
+        ]
+        if stale:
+            print(f"Rebuilding feature state for {len(stale)} locations...")
+            history = store.read('labeled', locations=stale)
+            last_engineered = pd.to_datetime(history['location_name'].map(feature_dates))
+            online.bootstrap(history[history['date'] <= last_engineered])
+        
+        # Only days after each location's state are read (new locations need everything)
+        state_dates = online.last_dates()
+        known = [state_dates[location] for location in affected if location in state_dates]
+        start = min(known) + pd.Timedelta(days=1) if len(known) == len(affected) else None
+        df = store.read('labeled', start=start, locations=affected)
+        last_seen = pd.to_datetime(df['location_name'].map(state_dates))
+        df = df[last_seen.isna() | (df['date'] > last_seen)]
+        
+        print(f"Engineering {len(df)} new rows for {len(affected)} locations...")
+        new_rows = online.append(df)
+        store.write('features', new_rows, mode='append')
+        online.save(engineer.feature_state_path())
+        
+        # Climatology for serving, from the updated day-of-year history
+        coordinates = store.read('labeled', columns=['location_name', 'latitude', 'longitude'])
+        coordinates = coordinates.drop_duplicates('location_name').set_index('location_name')
+        Climatology.from_states(
+            online.states, dict(zip(coordinates.index, coordinates.itertuples(index=False)))
+        ).save(climatology_path(engineer.config))
+        print(f"\n✓ Appended {len(new_rows)} rows to {store.dataset_path('features')}")
         return
     
-    print(f"Loading data from {labeled_data_path}...")
-    df = pd.read_csv(labeled_data_path)
+    print(f"Loading data from {store.dataset_path('labeled')}...")
+    labeled = store.read('labeled')
+    
+    # Day-of-year climatology, shared by training workers and the API
+    climatology = Climatology.build(labeled, engineer.WEATHER_COLUMNS)
+    climatology.save(climatology_path(engineer.config))
+    print(f"✓ Saved climatology to {climatology.path}")
     
     # Engineer features
-    df = engineer.engineer_features(df)
+    df = engineer.engineer_features_parallel(labeled, args.workers, climatology)
     
     # Save processed features
-    output_path = os.path.join(
-        engineer.config['data']['processed_data_path'],
-        'features_engineered.csv'
-    )
-    df.to_csv(output_path, index=False)
-    print(f"\n✓ Saved engineered features to {output_path}")
+    store.write('features', df)
+    print(f"\n✓ Saved engineered features to {store.dataset_path('features')}")
+    
+    # Feature state for later --incremental runs
+    online = OnlineFeatureEngineer(engineer)
+    online.bootstrap(labeled[labeled['date'] <= labeled['location_name'].map(store.last_dates('features'))])
+    online.save(engineer.feature_state_path())
 
 
 if __name__ == "__main__":
     main()
-
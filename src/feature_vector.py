@@ -0,0 +1,312 @@
+"""
+Feature Vector Module
+Single-row feature assembly for serving, from a day-indexed weather array
+"""
+
+import numpy as np
+import pandas as pd
+
+
+WEATHER_COLUMNS = ['T2M', 'T2M_MAX', 'T2M_MIN', 'PRECTOTCORR',
+                   'WS2M', 'RH2M', 'PS', 'CLOUD_AMT']
+
+TEMPORAL_FEATURES = ['day_of_year', 'month', 'day_of_week', 'is_weekend', 'year', 'season',
+                     'day_of_year_sin', 'day_of_year_cos', 'month_sin', 'month_cos']
+
+INTERACTION_FEATURES = [
+    # (name, columns it is computed from)
+    ('temp_humidity_interaction', ('T2M', 'RH2M')),
+    ('wind_precip_interaction', ('WS2M', 'PRECTOTCORR')),
+    ('temp_range', ('T2M_MAX', 'T2M_MIN')),
+    ('heat_index', ('T2M', 'RH2M')),
+]
+
+
+def to_days(dates):
+    """Dates (ISO strings, Timestamps, datetimes) as a datetime64[D] array"""
+    try:
+        return np.asarray(dates, dtype='datetime64[D]')
+    except ValueError:
+        # Formats numpy can't parse go through pandas one by one
+        return np.array([np.datetime64(pd.Timestamp(date).date(), 'D') for date in dates])
+
+
+class WeatherWindow:
+    """
+    Fetched daily weather as a dense array indexed by day
+
+    Row i holds the day ``start + i``; days missing from the source are
+    flagged in ``present`` so lookups never have to scan or filter.
+    """
+
+    def __init__(self, start, values, present, columns_present, columns=WEATHER_COLUMNS):
+        self.start = start
+        self.values = values
+        self.present = present
+        self.columns_present = columns_present
+        self.columns = columns
+
+    @classmethod
+    def from_frame(cls, df, columns=WEATHER_COLUMNS):
+        """
+        Args:
+            df: DataFrame with a 'date' column and weather columns
+            columns: Weather columns to keep, in feature order
+
+        Returns:
+            WeatherWindow covering df's first to last day
+        """
+        days = np.asarray(df['date'].to_numpy(), dtype='datetime64[D]').astype(np.int64)
+        start = int(days.min())
+        offsets = days - start
+
+        columns_present = np.array([col in df.columns for col in columns])
+        values = np.full((int(offsets.max()) + 1, len(columns)), np.nan)
+        for i, col in enumerate(columns):
+            if columns_present[i]:
+                values[offsets, i] = df[col].to_numpy(dtype=np.float64)
+        present = np.zeros(len(values), dtype=bool)
+        present[offsets] = True
+
+        return cls(start, values, present, columns_present, columns)
+
+    def offset(self, date):
+        """Row of a date (may fall outside the window)"""
+        return int(np.datetime64(pd.Timestamp(date).date(), 'D').astype(np.int64)) - self.start
+
+    def offsets(self, dates):
+        """Rows of several dates (may fall outside the window)"""
+        return to_days(dates).astype(np.int64) - self.start
+
+    def has_days(self, offsets):
+        """Which rows are inside the window and hold fetched data"""
+        offsets = np.asarray(offsets)
+        inside = (offsets >= 0) & (offsets < len(self.values))
+        inside[inside] = self.present[offsets[inside]]
+        return inside
+
+
+class FeatureVectorBuilder:
+    """
+    Builds model input rows ordered like ``feature_names.pkl``
+
+    The mapping from computed features to model columns is resolved once, so
+    a request only slices the WeatherWindow and scatters the results into a
+    preallocated vector. Semantics follow the original per-feature builder:
+    rolling windows cover the days before the target day, features that
+    cannot be computed (missing days or columns, features the builder does
+    not produce) are 0, and std is 0 for windows with fewer than two days.
+    Historical comparison features come from a Climatology when the request
+    is matched to one of its locations.
+    """
+
+    def __init__(self, feature_names, lag_days, windows, columns=WEATHER_COLUMNS, climatology=None):
+        """
+        Args:
+            feature_names: Model feature order
+            lag_days: Lags in days
+            windows: Rolling window sizes in days
+            columns: Weather columns, in the order used by WeatherWindow
+            climatology: Optional Climatology for historical comparison features
+        """
+        self.feature_names = list(feature_names)
+        self.lag_days = list(lag_days)
+        self.windows = list(windows)
+        self.columns = list(columns)
+        self.climatology = climatology
+
+        # Computed features in build order, with the weather columns each depends on
+        names, depends = [], []
+
+        def add(name, *cols):
+            names.append(name)
+            depends.append([self.columns.index(col) for col in cols if col in self.columns])
+
+        for name in TEMPORAL_FEATURES:
+            add(name)
+        for col in self.columns:
+            add(col, col)
+        for col in self.columns:
+            for lag in self.lag_days:
+                add(f'{col}_lag_{lag}', col)
+        for col in self.columns:
+            for window in self.windows:
+                for stat in ('mean', 'std', 'max', 'min'):
+                    add(f'{col}_rolling_{stat}_{window}', col)
+        for col in self.columns:
+            for name in (f'{col}_change_1d', f'{col}_pct_change_1d', f'{col}_change_7d'):
+                add(name, col)
+        for name, cols in INTERACTION_FEATURES:
+            add(name, *cols)
+        for col in self.columns:
+            add(f'{col}_vs_historical', col)
+            add(f'{col}_historical_percentile', col)
+
+        position = {name: i for i, name in enumerate(self.feature_names)}
+        self.computed_names = names
+        computed = [i for i, name in enumerate(names) if name in position]
+        self._source = np.array(computed, dtype=np.int64)
+        self._target = np.array([position[names[i]] for i in computed], dtype=np.int64)
+
+        self._depends = np.zeros((len(names), len(self.columns)), dtype=bool)
+        for i, cols in enumerate(depends):
+            self._depends[i, cols] = True
+
+        self._interaction_columns = [
+            [self.columns.index(col) for col in cols] for _, cols in INTERACTION_FEATURES
+        ]
+
+        # Climatology column of each weather column (-1 if it has none)
+        self._climatology_columns = None
+        if climatology is not None:
+            self._climatology_columns = np.array([
+                climatology.columns.index(col) if col in climatology.columns else -1
+                for col in self.columns
+            ])
+
+    def build(self, window, date, location=None):
+        """
+        Feature vector for one day
+
+        Args:
+            window: WeatherWindow holding the day and the days before it
+            date: Target day
+            location: Climatology row of the request's location (historical
+                comparison features are 0 without one)
+
+        Returns:
+            1D float array ordered like feature_names
+        """
+        return self.build_batch(window, [date], location)[0]
+
+    def build_batch(self, window, dates, location=None):
+        """
+        Feature matrix for several days of one location
+
+        Every feature group is computed for all days at once by gathering
+        the rows it needs from the window, so the cost per day is a few
+        array operations rather than a pass through Python code.
+
+        Args:
+            window: WeatherWindow holding the days and the days before them
+            dates: Target days
+            location: Climatology row of the location (historical comparison
+                features are 0 without one)
+
+        Returns:
+            2D float array (dates x feature_names)
+        """
+        dates = to_days(dates)
+        days = dates.astype(np.int64) - window.start
+        available = window.has_days(days)
+        if not available.all():
+            raise ValueError(f"No NASA data for {dates[np.argmin(available)]}")
+
+        n = len(days)
+        current = window.values[days]
+        temporal = self._temporal(dates)
+        parts = [temporal, current]
+
+        lags = np.zeros((n, len(self.columns), len(self.lag_days)))
+        for j, lag in enumerate(self.lag_days):
+            previous, found = self._rows(window, days - lag)
+            lags[found, :, j] = previous[found]
+        parts.append(lags)
+
+        rolling = np.zeros((n, len(self.columns), len(self.windows), 4))
+        for j, size in enumerate(self.windows):
+            # The `size` days before each target day; missing days are NaN
+            block, found = self._rows(window, days[:, None] - size + np.arange(size))
+            block[~found] = np.nan
+            stats = self._window_stats(block)
+            n_days = found.sum(axis=1)
+            stats[n_days < 2, :, 1] = 0.0
+            stats[n_days == 0] = 0.0
+            rolling[:, :, j] = stats
+        parts.append(rolling)
+
+        trend = np.zeros((n, len(self.columns), 3))
+        previous, found = self._rows(window, days - 1)
+        trend[found, :, 0] = current[found] - previous[found]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            trend[found, :, 1] = np.where(
+                previous[found] != 0, (current[found] - previous[found]) / previous[found], 0.0
+            )
+        week_ago, found = self._rows(window, days - 7)
+        trend[found, :, 2] = current[found] - week_ago[found]
+        parts.append(trend)
+
+        parts.append(self._interactions(current))
+        parts.append(self._historical(current, temporal[:, 0].astype(np.int64), location))
+
+        computed = np.concatenate([part.reshape(n, -1) for part in parts], axis=1)
+        if not window.columns_present.all():
+            computed[:, self._depends[:, ~window.columns_present].any(axis=1)] = 0.0
+
+        matrix = np.zeros((n, len(self.feature_names)))
+        matrix[:, self._target] = computed[:, self._source]
+        return matrix
+
+    @staticmethod
+    def _rows(window, offsets):
+        """Window rows at offsets, and which of them hold fetched data"""
+        found = window.has_days(offsets)
+        return window.values[np.where(found, offsets, 0)], found
+
+    @staticmethod
+    def _temporal(dates):
+        years = dates.astype('datetime64[Y]')
+        day_of_year = (dates - years.astype('datetime64[D]')).astype(np.int64) + 1
+        month = dates.astype('datetime64[M]').astype(np.int64) % 12 + 1
+        # 1970-01-01 was a Thursday (Monday = 0)
+        day_of_week = (dates.astype(np.int64) + 3) % 7
+        return np.stack([
+            day_of_year,
+            month,
+            day_of_week,
+            (day_of_week >= 5).astype(int),
+            years.astype(np.int64) + 1970,
+            (month % 12 + 3) // 3,
+            np.sin(2 * np.pi * day_of_year / 365.25),
+            np.cos(2 * np.pi * day_of_year / 365.25),
+            np.sin(2 * np.pi * month / 12),
+            np.cos(2 * np.pi * month / 12),
+        ], axis=1).astype(np.float64)
+
+    @staticmethod
+    def _window_stats(days):
+        """Mean, std, max and min per column over axis -2, skipping NaN like pandas"""
+        valid = ~np.isnan(days)
+        count = valid.sum(axis=-2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(valid, days, 0.0).sum(axis=-2) / count
+            deviations = np.where(valid, days - mean[..., None, :], 0.0)
+            std = np.sqrt((deviations * deviations).sum(axis=-2) / (count - 1))
+        std[count < 2] = np.nan
+        return np.stack([mean, std, np.fmax.reduce(days, axis=-2), np.fmin.reduce(days, axis=-2)], axis=-1)
+
+    def _historical(self, current, day_of_year, location):
+        """vs_historical and percentile per column, 0 where unavailable"""
+        historical = np.zeros((len(current), len(self.columns), 2))
+        if self.climatology is None or location is None:
+            return historical
+
+        mapped = self._climatology_columns >= 0
+        values = np.full((len(current), len(self.climatology.columns)), np.nan)
+        values[:, self._climatology_columns[mapped]] = current[:, mapped]
+        vs_historical, percentile = self.climatology.lookup(location, day_of_year, values)
+
+        historical[:, mapped, 0] = vs_historical[:, self._climatology_columns[mapped]]
+        historical[:, mapped, 1] = percentile[:, self._climatology_columns[mapped]]
+        return np.nan_to_num(historical, nan=0.0)
+
+    def _interactions(self, current):
+        (t, rh), (ws, precip), (t_max, t_min), _ = [
+            [current[:, i] for i in cols] for cols in self._interaction_columns
+        ]
+        return np.stack([
+            t * rh,
+            ws * precip,
+            t_max - t_min,
+            t + (0.5 * (t + 61.0 + ((t - 68.0) * 1.2) + (rh * 0.094))),
+        ], axis=1)
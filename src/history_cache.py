@@ -0,0 +1,200 @@
+"""
+History Cache Module
+In-memory daily weather history per NASA POWER grid cell, shared by nearby requests
+"""
+
+import asyncio
+from collections import OrderedDict
+
+import pandas as pd
+
+
+# POWER meteorology (MERRA-2) grid spacing in degrees (latitude, longitude)
+POWER_GRID = (0.5, 0.625)
+
+
+def snap_to_grid(latitude, longitude, lat_step=POWER_GRID[0], lon_step=POWER_GRID[1]):
+    """
+    Center of the grid cell containing a point
+
+    Args:
+        latitude, longitude: Point in degrees
+        lat_step, lon_step: Grid spacing in degrees
+
+    Returns:
+        (latitude, longitude) of the cell center
+    """
+    lat = min(max(round(latitude / lat_step) * lat_step, -90.0), 90.0)
+    lon = round(longitude / lon_step) * lon_step
+    lon = (lon + 180.0) % 360.0 - 180.0
+    return round(lat, 4), round(lon, 4)
+
+
+class CellHistory:
+    """Daily rows fetched for one grid cell, indexed by date"""
+
+    def __init__(self):
+        self.frame = None
+        self.complete_until = None
+        self.lock = asyncio.Lock()
+
+    def missing(self, start, end, max_days):
+        """
+        Date ranges to fetch so that start..end is covered
+
+        Days after the last complete day are always refetched, since POWER
+        publishes recent days with fill values until they are processed.
+        Cached days stay contiguous: a request beside the cached span also
+        fetches the gap when the result still fits in max_days, and replaces
+        the span otherwise.
+        """
+        if self.frame is None:
+            return [(start, end)]
+
+        first = self.frame.index[0]
+        resume = self.complete_until + pd.Timedelta(days=1)
+        span = max(end, self.frame.index[-1]) - min(start, first)
+        if max_days and span >= pd.Timedelta(days=max_days) and (end < first or start > resume):
+            self.frame = None
+            return [(start, end)]
+
+        ranges = []
+        if start < first:
+            ranges.append((start, first - pd.Timedelta(days=1)))
+        if end >= resume:
+            ranges.append((resume, end))
+        return ranges
+
+    def add(self, df, fill_value):
+        """Merge fetched rows; rows from the newer fetch win"""
+        df = df.set_index('date').sort_index()
+        if self.frame is not None:
+            df = pd.concat([self.frame, df])
+            df = df[~df.index.duplicated(keep='last')].sort_index()
+        self.frame = df
+        self._update_complete(fill_value)
+
+    def trim(self, max_days, fill_value):
+        """Keep the newest max_days days"""
+        if max_days and self.frame is not None and len(self.frame):
+            self.frame = self.frame[self.frame.index > self.frame.index[-1] - pd.Timedelta(days=max_days)]
+            self._update_complete(fill_value)
+
+    def slice(self, start, end):
+        return self.frame.loc[start:end].reset_index()
+
+    def _update_complete(self, fill_value):
+        # Days up to the last one without fill values count as final
+        complete = ~(self.frame == fill_value).any(axis=1)
+        if complete.any():
+            self.complete_until = complete[complete].index[-1]
+        else:
+            self.complete_until = self.frame.index[0] - pd.Timedelta(days=1)
+
+
+class GridHistoryCache:
+    """
+    Daily POWER history per grid cell, extended incrementally
+
+    Requests are snapped to the POWER grid, so every point in a cell shares
+    one history: the first request downloads its window, and later ones
+    only fetch the days that are not cached yet (typically the newest day).
+    Cells are evicted least recently used first; each cell keeps at most
+    max_days days.
+    """
+
+    def __init__(self, lat_step=POWER_GRID[0], lon_step=POWER_GRID[1],
+                 max_cells=2048, max_days=800, fill_value=-999):
+        """
+        Args:
+            lat_step, lon_step: Grid spacing in degrees
+            max_cells: Cells kept in memory
+            max_days: Days kept per cell
+            fill_value: Value POWER uses for days not processed yet
+        """
+        self.lat_step = lat_step
+        self.lon_step = lon_step
+        self.max_cells = max_cells
+        self.max_days = max_days
+        self.fill_value = fill_value
+        self._cells = OrderedDict()
+        self.hits = 0
+        self.extensions = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """Create the cache from the 'api.history_cache' section of config.yaml"""
+        cache_config = config.get('api', {}).get('history_cache', {})
+        return cls(
+            lat_step=cache_config.get('lat_step', POWER_GRID[0]),
+            lon_step=cache_config.get('lon_step', POWER_GRID[1]),
+            max_cells=cache_config.get('max_cells', 2048),
+            max_days=cache_config.get('max_days', 800),
+        )
+
+    def cell(self, latitude, longitude):
+        """Grid cell key (cell center) of a point"""
+        return snap_to_grid(latitude, longitude, self.lat_step, self.lon_step)
+
+    async def get(self, latitude, longitude, start, end, fetch):
+        """
+        Daily rows of the point's cell for start..end
+
+        Args:
+            latitude, longitude: Requested point
+            start, end: First and last day (inclusive)
+            fetch: Coroutine function (cell_lat, cell_lon, start, end) returning
+                a DataFrame with 'date' and weather columns
+
+        Returns:
+            DataFrame with 'date' and weather columns (a copy)
+        """
+        start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        key = self.cell(latitude, longitude)
+
+        entry = self._cells.get(key)
+        if entry is None:
+            entry = self._cells[key] = CellHistory()
+            self._evict(key)
+        self._cells.move_to_end(key)
+
+        # One fetch at a time per cell; waiters then find the days cached
+        async with entry.lock:
+            ranges = entry.missing(start, end, self.max_days)
+            if not ranges:
+                self.hits += 1
+            elif entry.frame is None:
+                self.misses += 1
+            else:
+                self.extensions += 1
+
+            for first, last in ranges:
+                entry.add(await fetch(key[0], key[1], first, last), self.fill_value)
+            rows = entry.slice(start, end)
+            entry.trim(self.max_days, self.fill_value)
+            return rows
+
+    def _evict(self, keep):
+        """
+        Drop least recently used cells until at most max_cells remain
+
+        Cells with a fetch in progress are skipped: dropping one would let
+        the next request for it fetch the same days again. The cache may
+        briefly hold more than max_cells while they finish.
+        """
+        excess = len(self._cells) - self.max_cells
+        if excess <= 0:
+            return
+        idle = [key for key, entry in self._cells.items() if key != keep and not entry.lock.locked()]
+        for key in idle[:excess]:
+            del self._cells[key]
+
+    def stats(self):
+        """Counters for health endpoints"""
+        return {
+            'cells': len(self._cells),
+            'hits': self.hits,
+            'extensions': self.extensions,
+            'misses': self.misses,
+        }
@@ -0,0 +1,277 @@
+"""
+Metrics Module
+Latency histograms, counters and cache stats in Prometheus text format
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Latency buckets in seconds (upper bounds)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Starlette appends '; charset=utf-8' to text responses
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+# Stage timings of the request being handled, for its Server-Timing header
+_request_stages = contextvars.ContextVar('request_stages', default=None)
+
+
+def _label_text(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key, value):
+        return [f'{self.name}{_label_text(self.labels, key)} {value}']
+
+
+class Counter(_Metric):
+    """Monotonic count per label set"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Current value per label set"""
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values per label set (cumulative buckets)"""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self, key, state):
+        counts, total, count = state
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = _label_text(self.labels + ('le',), key + (repr(float(bound)),))
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _label_text(self.labels + ('le',), key + ('+Inf',))
+        lines.append(f'{self.name}_bucket{labels} {count}')
+        lines.append(f'{self.name}_sum{_label_text(self.labels, key)} {total}')
+        lines.append(f'{self.name}_count{_label_text(self.labels, key)} {count}')
+        return lines
+
+
+class Registry:
+    """Metrics of this process, plus stats() dicts read at scrape time"""
+
+    def __init__(self):
+        self.metrics = []
+        self.sources = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_stats(self, prefix, stats):
+        """
+        Export a component's stats() as gauges on every scrape
+
+        Numeric values become '<prefix>_<key>' gauges (nested dicts add their
+        keys to the name); hits/misses pairs also get a '<prefix>_hit_ratio'.
+
+        Args:
+            prefix: Metric name prefix, e.g. 'power_cache'
+            stats: Zero-argument function returning a dict
+        """
+        self.sources.append((prefix, stats))
+
+    def render(self):
+        """All metrics in Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for prefix, stats in self.sources:
+            try:
+                values = stats()
+            except Exception:
+                continue
+            lines.extend(_stats_lines(prefix, values or {}))
+        return '\n'.join(lines) + '\n'
+
+
+def _stats_lines(prefix, values):
+    lines = []
+    for key, value in values.items():
+        name = f'{prefix}_{key}'
+        if isinstance(value, dict):
+            lines.extend(_stats_lines(name, value))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {value}')
+    if 'hit_rate' not in values and isinstance(values.get('hits'), int) and isinstance(values.get('misses'), int):
+        lookups = values['hits'] + values['misses']
+        lines.append(f'# TYPE {prefix}_hit_ratio gauge')
+        lines.append(f'{prefix}_hit_ratio {values["hits"] / lookups if lookups else 0.0}')
+    return lines
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.add(Histogram(
+    'http_request_duration_seconds', 'Time to handle a request', ('path', 'method')))
+REQUESTS = REGISTRY.add(Counter(
+    'http_requests_total', 'Requests handled', ('path', 'method', 'status')))
+IN_PROGRESS = REGISTRY.add(Gauge(
+    'http_requests_in_progress', 'Requests being handled'))
+STAGE_SECONDS = REGISTRY.add(Histogram(
+    'request_stage_seconds', 'Time spent in each stage of a request', ('stage',)))
+UPSTREAM_SECONDS = REGISTRY.add(Histogram(
+    'upstream_request_seconds', 'Time of upstream HTTP calls', ('source', 'endpoint')))
+UPSTREAM_ERRORS = REGISTRY.add(Counter(
+    'upstream_errors_total', 'Failed upstream HTTP calls', ('source', 'endpoint')))
+INFERENCE_SECONDS = REGISTRY.add(Histogram(
+    'model_inference_seconds', 'Time of one predict_proba call', ('target',)))
+INFERENCE_ROWS = REGISTRY.add(Counter(
+    'model_inference_rows_total', 'Feature rows scored', ('target',)))
+
+
+@contextmanager
+def stage(name):
+    """
+    Time a stage of the current request
+
+    The duration is added to the request_stage_seconds histogram and to the
+    request's Server-Timing header (stages with the same name add up).
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        stages = _request_stages.get()
+        if stages is not None:
+            stages[name] = stages.get(name, 0.0) + elapsed
+
+
+@contextmanager
+def upstream(source, endpoint):
+    """Time an upstream HTTP call (and count it if it raises)"""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        UPSTREAM_ERRORS.inc(source=source, endpoint=endpoint)
+        raise
+    finally:
+        UPSTREAM_SECONDS.observe(time.perf_counter() - started, source=source, endpoint=endpoint)
+
+
+def server_timing(stages, total):
+    """Server-Timing header value for a request's stages (durations in ms)"""
+    entries = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in stages.items()]
+    entries.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(entries)
+
+
+def json_response(model):
+    """Serialize a response model as its own timed stage"""
+    from fastapi import Response
+
+    with stage('serialize'):
+        return Response(content=model.model_dump_json(), media_type='application/json')
+
+
+def instrument(app, registry=REGISTRY):
+    """
+    Add request metrics, Server-Timing headers and a /metrics endpoint to an app
+
+    Args:
+        app: FastAPI application
+        registry: Registry rendered by /metrics
+    """
+    from fastapi import Response
+
+    @app.middleware('http')
+    async def record_request(request, call_next):
+        if request.url.path == '/metrics':
+            return await call_next(request)
+
+        stages = {}
+        token = _request_stages.set(stages)
+        started = time.perf_counter()
+        IN_PROGRESS.inc()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            total = time.perf_counter() - started
+            IN_PROGRESS.dec()
+            _request_stages.reset(token)
+            # Route templates keep the label set small
+            label = getattr(request.scope.get('route'), 'path', 'unmatched')
+            REQUEST_SECONDS.observe(total, path=label, method=request.method)
+            REQUESTS.inc(path=label, method=request.method, status=status)
+        response.headers['Server-Timing'] = server_timing(stages, total)
+        # The web interface is served from another origin
+        response.headers['Timing-Allow-Origin'] = '*'
+        return response
+
+    @app.get('/metrics', include_in_schema=False)
+    def metrics():
+        """Prometheus metrics of this process"""
+        return Response(content=registry.render(), media_type=CONTENT_TYPE)
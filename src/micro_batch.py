@@ -0,0 +1,141 @@
+"""
+Micro-Batch Module
+Collects feature rows from concurrent requests into shared model calls
+"""
+
+import asyncio
+import time
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    Scores feature rows from concurrent requests in shared batches
+
+    Rows submitted while the models are busy, or within max_wait_ms of the
+    first waiting row, are stacked into one matrix and scored with a single
+    call of the predict function; each caller gets back its own slice. At
+    most one batch runs at a time (in a worker thread, so the event loop
+    keeps accepting requests), which means a loaded server naturally forms
+    larger batches while an idle one adds at most max_wait_ms of latency.
+    """
+
+    def __init__(self, predict, max_wait_ms=3, max_batch_rows=256):
+        """
+        Args:
+            predict: Function scoring a 2D feature matrix, returning a dict of
+                target -> 1D array (e.g. ModelLoader.predict_batch)
+            max_wait_ms: Longest a row waits for others before its batch runs
+            max_batch_rows: Rows per batch; a full batch runs immediately
+        """
+        self.predict = predict
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_rows = max_batch_rows
+        self._pending = []
+        self._rows = 0
+        self._full = None
+        self._worker = None
+        self.batches = 0
+        self.scored_rows = 0
+        self.largest_batch = 0
+
+    @classmethod
+    def from_config(cls, config, predict):
+        """Create the batcher from the 'api.inference_batching' section of config.yaml"""
+        batching = config.get('api', {}).get('inference_batching', {})
+        return cls(
+            predict,
+            max_wait_ms=batching.get('max_wait_ms', 3),
+            max_batch_rows=batching.get('max_batch_rows', 256),
+        )
+
+    async def submit(self, X):
+        """
+        Score rows together with other waiting requests
+
+        Args:
+            X: 2D array (rows x features)
+
+        Returns:
+            Dict of target -> 1D array of probabilities for X's rows
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((X, future, time.monotonic()))
+        self._rows += len(X)
+
+        if self._worker is None:
+            self._full = asyncio.Event()
+            self._worker = asyncio.ensure_future(self._run())
+        if self._rows >= self.max_batch_rows:
+            self._full.set()
+
+        return await future
+
+    async def _run(self):
+        try:
+            while self._pending:
+                # Wait for more rows until the oldest waiting row's deadline
+                remaining = self._pending[0][2] + self.max_wait - time.monotonic()
+                if self._rows < self.max_batch_rows and remaining > 0:
+                    try:
+                        await asyncio.wait_for(self._full.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+
+                batch = self._take()
+                self._full.clear()
+                if self._rows >= self.max_batch_rows:
+                    self._full.set()
+
+                waiting = [(X, future) for X, future in batch if not future.cancelled()]
+                if not waiting:
+                    continue
+                try:
+                    matrix = np.vstack([X for X, _ in waiting])
+                    probabilities = await asyncio.to_thread(self.predict, matrix)
+                except Exception as e:
+                    for _, future in waiting:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+
+                self.batches += 1
+                self.scored_rows += len(matrix)
+                self.largest_batch = max(self.largest_batch, len(matrix))
+
+                begin = 0
+                for X, future in waiting:
+                    end = begin + len(X)
+                    if not future.done():
+                        future.set_result({
+                            target: values[begin:end] for target, values in probabilities.items()
+                        })
+                    begin = end
+        finally:
+            self._worker = None
+
+    def _take(self):
+        """Pop waiting requests up to max_batch_rows rows (at least one request)"""
+        count, rows = 0, 0
+        for X, _, _ in self._pending:
+            if count and rows + len(X) > self.max_batch_rows:
+                break
+            count += 1
+            rows += len(X)
+
+        batch = [(X, future) for X, future, _ in self._pending[:count]]
+        del self._pending[:count]
+        self._rows -= rows
+        return batch
+
+    def stats(self):
+        """Counters for health endpoints"""
+        return {
+            'batches': self.batches,
+            'rows': self.scored_rows,
+            'largest_batch': self.largest_batch,
+            'mean_batch': round(self.scored_rows / self.batches, 2) if self.batches else 0.0,
+            'waiting_rows': self._rows,
+        }
@@ -0,0 +1,352 @@
+"""
+Model Store Module
+Lazily loaded, memory-mapped trained model artifacts shared by the APIs
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from collections.abc import Mapping
+from datetime import datetime
+
+import joblib
+import numpy as np
+
+from metrics import INFERENCE_ROWS, INFERENCE_SECONDS
+
+
+# Registry layout under the model directory: versions/<version>/ holds one
+# training run, and the CURRENT file names the version the APIs serve
+VERSIONS_DIR = 'versions'
+CURRENT_FILE = 'CURRENT'
+
+
+def create_version(model_dir):
+    """
+    Create an empty directory for a new model version
+
+    Returns:
+        (version, path)
+    """
+    version = datetime.now().strftime('%Y%m%d-%H%M%S')
+    path = os.path.join(model_dir, VERSIONS_DIR, version)
+    suffix = 1
+    while os.path.exists(path):
+        suffix += 1
+        path = os.path.join(model_dir, VERSIONS_DIR, f"{version}-{suffix}")
+    os.makedirs(path)
+    return os.path.basename(path), path
+
+
+def publish_version(model_dir, version):
+    """Point CURRENT at a version (atomically, so readers never see a partial file)"""
+    if not os.path.isdir(os.path.join(model_dir, VERSIONS_DIR, version)):
+        raise FileNotFoundError(f"Model version {version} not found in {model_dir}")
+    fd, staging = tempfile.mkstemp(dir=model_dir, prefix='.current-')
+    with os.fdopen(fd, 'w') as f:
+        f.write(version + '\n')
+    os.replace(staging, os.path.join(model_dir, CURRENT_FILE))
+
+
+def resolve_version(model_dir, version=None):
+    """
+    Directory of a model version
+
+    Args:
+        model_dir: Model registry directory (api.model_path)
+        version: Version to open (default: the one CURRENT points at)
+
+    Returns:
+        (version, path); version is None for the unversioned layout, where
+        the model files sit directly in model_dir
+    """
+    if version is None:
+        current_path = os.path.join(model_dir, CURRENT_FILE)
+        if not os.path.exists(current_path):
+            return None, model_dir
+        with open(current_path) as f:
+            version = f.read().strip()
+
+    path = os.path.join(model_dir, VERSIONS_DIR, version)
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"Model version {version} not found in {model_dir}")
+    return version, path
+
+
+def list_versions(model_dir):
+    """Versions in the registry, oldest first"""
+    versions_dir = os.path.join(model_dir, VERSIONS_DIR)
+    if not os.path.isdir(versions_dir):
+        return []
+    return sorted(name for name in os.listdir(versions_dir)
+                  if os.path.isdir(os.path.join(versions_dir, name)))
+
+
+def save_artifact(obj, path):
+    """
+    Save a model, scaler or feature list for ModelStore
+
+    Artifacts are written uncompressed, which keeps their numpy arrays in a
+    layout joblib can memory-map on load.
+    """
+    joblib.dump(obj, path, compress=0)
+
+
+def current_rss_mb():
+    """Resident memory of this process in MB (None if it can't be read)"""
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().rss / 2**20, 1)
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf('SC_PAGE_SIZE') / 2**20, 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class LazyArtifacts(Mapping):
+    """Read-only target -> artifact mapping that loads entries on first access"""
+
+    def __init__(self, store, kind):
+        self._store = store
+        self._kind = kind
+
+    def __getitem__(self, target):
+        if target not in self._store.paths:
+            raise KeyError(target)
+        return self._store.load(target)[self._kind]
+
+    def __iter__(self):
+        return iter(self._store.paths)
+
+    def __len__(self):
+        return len(self._store.paths)
+
+
+class ModelStore:
+    """
+    Trained models of one model directory, loaded on first use
+
+    Opening the store only reads metadata.json and the feature names, so an
+    API process starts in milliseconds; each target's model and scaler are
+    loaded the first time they are needed (or all at once with preload()).
+    Artifacts are opened with joblib's mmap_mode, so their numpy arrays are
+    mapped from the page cache and shared by every worker process instead
+    of being copied into each one. Estimators that copy their arrays into
+    native structures when unpickled (e.g. scikit-learn tree nodes) still
+    hold a private copy, but are only built when first used.
+
+    With backend='compiled', a target whose model was exported by
+    compiled_models scores batches of up to the export's max_rows with the
+    flat-array export (larger ones keep the original model), once its
+    probabilities match the original model's on the rows saved with the
+    export.
+
+    ``models`` and ``scalers`` behave like the dicts the API model loaders
+    used to fill eagerly.
+    """
+
+    def __init__(self, model_dir, mmap_mode='r', version=None, backend='pickle', check_tolerance=1e-4):
+        """
+        Args:
+            model_dir: Directory holding one version's files
+            mmap_mode: joblib mmap_mode for artifacts (None loads into memory)
+            version: Registry version the directory belongs to (if any)
+            backend: 'pickle' (the trained estimators) or 'compiled'
+                (compiled_models exports, where they check out)
+            check_tolerance: Largest probability difference accepted between
+                a compiled export and its original model
+        """
+        if backend not in ('pickle', 'compiled'):
+            raise ValueError(f"Unknown model backend: {backend}")
+        started = time.perf_counter()
+        self.model_dir = model_dir
+        self.mmap_mode = mmap_mode
+        self.version = version
+        self.backend = backend
+        self.check_tolerance = check_tolerance
+
+        metadata_path = os.path.join(model_dir, "metadata.json")
+        if not os.path.exists(metadata_path):
+            raise FileNotFoundError(f"Model metadata not found in {model_dir}. Train models first.")
+        with open(metadata_path, 'r') as f:
+            self.metadata = json.load(f)
+
+        self.feature_names = joblib.load(os.path.join(model_dir, "feature_names.pkl"))
+
+        # Artifact files of each target's best model
+        self.paths = {}
+        self.missing = []
+        for target in self.metadata.get('targets', []):
+            best_model_name = self.metadata['model_performance'][target]['best_model']
+            model_path = os.path.join(model_dir, f"{target}_{best_model_name}.pkl")
+            scaler_path = os.path.join(model_dir, f"{target}_{best_model_name}_scaler.pkl")
+            if os.path.exists(model_path):
+                self.paths[target] = (model_path, scaler_path if os.path.exists(scaler_path) else None)
+            else:
+                self.missing.append(target)
+
+        self.models = LazyArtifacts(self, 'model')
+        self.scalers = LazyArtifacts(self, 'scaler')
+        self._loaded = {}
+        self._locks = {target: threading.Lock() for target in self.paths}
+        self.load_ms = {}
+        self.backends = {}
+        self.check_differences = {}
+        self.open_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    @classmethod
+    def from_config(cls, config, model_dir=None, version=None):
+        """
+        Open a store as configured in the 'api.model_store' section of config.yaml
+
+        Args:
+            config: Loaded config.yaml
+            model_dir: Model registry directory (default: api.model_path)
+            version: Version to open (default: the current one)
+        """
+        store_config = config.get('api', {}).get('model_store', {})
+        version, path = resolve_version(model_dir or config['api']['model_path'], version)
+        store = cls(
+            path,
+            mmap_mode='r' if store_config.get('mmap', True) else None,
+            version=version,
+            backend=store_config.get('backend', 'pickle'),
+            check_tolerance=store_config.get('check_tolerance', 1e-4)
+        )
+        if store_config.get('preload', False):
+            store.preload()
+        return store
+
+    def load(self, target):
+        """
+        Model and scaler of a target, loading them on first use
+
+        Returns:
+            Dict with 'model', 'compiled' (None unless the compiled backend
+            serves it) and 'scaler' (None if the model has no scaler)
+        """
+        loaded = self._loaded.get(target)
+        if loaded is not None:
+            return loaded
+
+        with self._locks[target]:
+            if target not in self._loaded:
+                started = time.perf_counter()
+                model_path, scaler_path = self.paths[target]
+                model = joblib.load(model_path, mmap_mode=self.mmap_mode)
+                self._loaded[target] = {
+                    'model': model,
+                    'compiled': self._compiled(target, model_path, model) if self.backend == 'compiled' else None,
+                    'scaler': joblib.load(scaler_path, mmap_mode=self.mmap_mode) if scaler_path else None,
+                }
+                self.load_ms[target] = round((time.perf_counter() - started) * 1000, 1)
+        return self._loaded[target]
+
+    def _compiled(self, target, model_path, model):
+        """Compiled export of a model if it matches the model, else None"""
+        # Imported here: compiled_models builds on this module
+        from compiled_models import compiled_path, max_difference
+
+        path = compiled_path(model_path)
+        self.backends[target] = 'pickle'
+        if not os.path.exists(path):
+            return None
+        try:
+            compiled = joblib.load(path, mmap_mode=self.mmap_mode)
+            difference = max_difference(compiled, model)
+        except Exception as e:
+            print(f"Warning: Compiled {target} model unusable, serving the original - {e}")
+            return None
+        self.check_differences[target] = difference
+        if difference > self.check_tolerance:
+            print(f"Warning: Compiled {target} model differs from the original by {difference:.2e}, "
+                  f"serving the original")
+            return None
+        self.backends[target] = 'compiled'
+        return compiled
+
+    def preload(self):
+        """Load every target now (e.g. before serving traffic)"""
+        for target in self.paths:
+            self.load(target)
+
+    def warm_up(self, rows=8):
+        """Load every target and run a few predictions (before serving traffic)"""
+        self.preload()
+        self.predict_batch(np.zeros((rows, len(self.feature_names))))
+
+    def predict_batch(self, X):
+        """
+        Probabilities for every target on a feature matrix
+
+        Args:
+            X: 2D array (rows x feature_names)
+
+        Returns:
+            Dict of target -> 1D array of probabilities
+        """
+        probabilities = {}
+        for target in self.paths:
+            artifacts = self.load(target)
+            scaler, model, compiled = artifacts['scaler'], artifacts['model'], artifacts['compiled']
+            if compiled is not None and (compiled.max_rows is None or len(X) <= compiled.max_rows):
+                model = compiled
+            started = time.perf_counter()
+            X_scaled = scaler.transform(X) if scaler is not None else X
+            probabilities[target] = model.predict_proba(X_scaled)[:, 1]
+            INFERENCE_SECONDS.observe(time.perf_counter() - started, target=target)
+            INFERENCE_ROWS.inc(len(X), target=target)
+        return probabilities
+
+    def stats(self):
+        """Load state and memory for health endpoints"""
+        return {
+            'version': self.version,
+            'targets': len(self.paths),
+            'loaded': sorted(self._loaded),
+            'open_ms': self.open_ms,
+            'load_ms': dict(self.load_ms),
+            'backends': dict(self.backends),
+            'check_differences': dict(self.check_differences),
+            'rss_mb': current_rss_mb(),
+        }
+
+    def report(self):
+        """One-line startup summary: cold start time and process memory"""
+        state = f"{len(self._loaded)} loaded" if self._loaded else "loaded on first use"
+        rss = current_rss_mb()
+        memory = f", RSS {rss} MB" if rss is not None else ""
+        return (f"Model store {self.model_dir}: {len(self.paths)} targets in "
+                f"{self.open_ms + sum(self.load_ms.values()):.1f} ms ({state}){memory}")
+
+
+async def watch_versions(model_dir, interval, loaded_version, reload):
+    """
+    Reload models whenever CURRENT points at a new version
+
+    Args:
+        model_dir: Model registry directory
+        interval: Seconds between checks
+        loaded_version: Function returning the version being served
+        reload: Blocking function loading and swapping in the current
+            version (run in a worker thread)
+    """
+    failed = None
+    while True:
+        await asyncio.sleep(interval)
+        version = None
+        try:
+            version, _ = await asyncio.to_thread(resolve_version, model_dir)
+            # A version that failed to load is retried only after CURRENT changes
+            if version != loaded_version() and version != failed:
+                await asyncio.to_thread(reload)
+        except Exception as e:
+            failed = version
+            print(f"Warning: Model reload failed, still serving the previous version - {e}")
@@ -0,0 +1,259 @@
+"""
+Online Feature Module
+Per-location feature state for appending new days without reprocessing history
+"""
+
+import os
+from bisect import bisect_left, bisect_right, insort
+
+import joblib
+import numpy as np
+import pandas as pd
+
+
+class LocationFeatureState:
+    """
+    Running state for one location's lag, rolling, trend and climatology features
+
+    A ring buffer keeps the last few days of every weather column, and each
+    day of year keeps a running sum, count and sorted list of its values.
+    Appending a day touches only the buffer and that day of year's aggregates.
+    Slots that have never been written hold NaN, which gives the same results
+    as the shorter windows and missing lags at the start of a location's
+    history.
+    """
+
+    def __init__(self, columns, lag_days, windows):
+        """
+        Args:
+            columns: Weather columns the features are computed for
+            lag_days: Lags in days (e.g. [1, 2, 3, 7])
+            windows: Rolling window sizes in days (e.g. [3, 7, 14, 30])
+        """
+        self.columns = list(columns)
+        self.lag_days = list(lag_days)
+        self.windows = list(windows)
+
+        # Previous days needed by lags, rolling windows and the 7-day change
+        self.depth = max(self.lag_days + [w - 1 for w in self.windows] + [7])
+        self.buffer = np.full((self.depth, len(self.columns)), np.nan)
+        self.position = 0
+        self.last_valid = np.full(len(self.columns), np.nan)
+        self.last_date = None
+
+        self.doy_sum = np.zeros((367, len(self.columns)))
+        self.doy_count = np.zeros((367, len(self.columns)), dtype=np.int64)
+        self.doy_values = [[[] for _ in self.columns] for _ in range(367)]
+
+    @classmethod
+    def from_history(cls, history, columns, lag_days, windows):
+        """
+        Build the state from a location's stored history in one pass
+
+        Args:
+            history: DataFrame with 'date' and the weather columns
+            columns, lag_days, windows: As for the constructor
+        """
+        state = cls(columns, lag_days, windows)
+        history = history.sort_values('date')
+        values = history[state.columns].to_numpy(dtype=np.float64)
+
+        recent = values[-state.depth:]
+        state.buffer[:len(recent)] = recent
+        state.position = len(recent) % state.depth
+        state.last_valid = history[state.columns].ffill().iloc[-1].to_numpy(dtype=np.float64)
+        state.last_date = pd.Timestamp(history['date'].iloc[-1])
+
+        doy = pd.to_datetime(history['date']).dt.dayofyear.to_numpy()
+        for i in range(len(state.columns)):
+            valid = ~np.isnan(values[:, i])
+            np.add.at(state.doy_sum[:, i], doy[valid], values[valid, i])
+            np.add.at(state.doy_count[:, i], doy[valid], 1)
+            for day, day_values in pd.Series(values[valid, i]).groupby(doy[valid]):
+                state.doy_values[day][i] = sorted(day_values.tolist())
+
+        return state
+
+    def feature_names(self):
+        """Names of the values returned by update(), in engineer_features order"""
+        names = [f'{col}_lag_{lag}' for col in self.columns for lag in self.lag_days]
+        for col in self.columns:
+            for window in self.windows:
+                names += [f'{col}_rolling_{stat}_{window}' for stat in ('mean', 'std', 'max', 'min')]
+        for col in self.columns:
+            names += [f'{col}_change_1d', f'{col}_change_7d', f'{col}_pct_change_1d']
+        for col in self.columns:
+            names += [f'{col}_vs_historical', f'{col}_historical_percentile']
+        return names
+
+    def update(self, date, values):
+        """
+        Append one day and return its features
+
+        Args:
+            date: Day being appended (must be after the last appended day)
+            values: Weather values in column order
+
+        Returns:
+            Array of feature values in feature_names() order
+        """
+        date = pd.Timestamp(date)
+        if self.last_date is not None and date <= self.last_date:
+            raise ValueError(f"Day {date.date()} is not after the last appended day {self.last_date.date()}")
+
+        values = np.asarray(values, dtype=np.float64)
+        order = (self.position + np.arange(self.depth)) % self.depth
+        days = np.vstack([self.buffer[order], values])
+
+        lags = np.stack([days[-1 - lag] for lag in self.lag_days], axis=1)
+
+        rolling = []
+        for window in self.windows:
+            recent = days[-window:]
+            valid = ~np.isnan(recent)
+            count = valid.sum(axis=0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = np.where(valid, recent, 0.0).sum(axis=0) / count
+                deviations = np.where(valid, recent - mean, 0.0)
+                std = np.sqrt((deviations * deviations).sum(axis=0) / (count - 1))
+            highest = np.fmax.reduce(recent, axis=0)
+            lowest = np.fmin.reduce(recent, axis=0)
+            std[highest == lowest] = 0.0
+            std[count < 2] = np.nan
+            rolling.append(np.stack([mean, std, highest, lowest], axis=1))
+
+        # pct_change forward-fills gaps before comparing with the previous day
+        filled = np.where(np.isnan(values), self.last_valid, values)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            trend = np.stack([values - days[-2], values - days[-8], filled / self.last_valid - 1], axis=1)
+
+        historical = np.full((len(self.columns), 2), np.nan)
+        day_of_year = date.dayofyear
+        for i, value in enumerate(values):
+            if np.isnan(value):
+                continue
+            history = self.doy_values[day_of_year][i]
+            insort(history, value)
+            self.doy_sum[day_of_year, i] += value
+            self.doy_count[day_of_year, i] += 1
+
+            # Average rank among the day of year's values, as rank(pct=True)
+            less = bisect_left(history, value)
+            equal = bisect_right(history, value) - less
+            historical[i, 0] = value - self.doy_sum[day_of_year, i] / self.doy_count[day_of_year, i]
+            historical[i, 1] = (less + (equal + 1) / 2) / len(history)
+
+        self.buffer[self.position] = values
+        self.position = (self.position + 1) % self.depth
+        self.last_valid = filled
+        self.last_date = date
+
+        return np.concatenate([
+            lags.ravel(),
+            np.stack(rolling, axis=1).ravel(),
+            trend.ravel(),
+            historical.ravel(),
+        ])
+
+
+class OnlineFeatureEngineer:
+    """
+    Emits engineered feature rows for newly appended days
+
+    Keeps a LocationFeatureState per location. Calendar and interaction
+    features are row-local and come from the FeatureEngineer itself, so rows
+    have the same columns as engineer_features output. Historical comparisons
+    use each location's history up to and including the appended day.
+    """
+
+    def __init__(self, engineer, states=None):
+        """
+        Args:
+            engineer: FeatureEngineer providing config and row-local features
+            states: Dict of location_name -> LocationFeatureState
+        """
+        self.engineer = engineer
+        features_config = engineer.config['features']
+        self.lag_days = list(features_config['lag_days'])
+        self.windows = list(features_config['rolling_window_days'])
+        self.states = states or {}
+
+    def bootstrap(self, history):
+        """
+        (Re)build the state of every location in history
+
+        Args:
+            history: Labeled data holding each location's full history
+        """
+        columns = [col for col in self.engineer.WEATHER_COLUMNS if col in history.columns]
+        for location, rows in history.groupby('location_name'):
+            self.states[location] = LocationFeatureState.from_history(
+                rows, columns, self.lag_days, self.windows
+            )
+
+    def last_dates(self):
+        """Dict of location_name -> last appended day"""
+        return {location: state.last_date for location, state in self.states.items()}
+
+    def append(self, new_rows):
+        """
+        Append new days and return their engineered features
+
+        Args:
+            new_rows: Labeled rows newer than each location's last appended day
+
+        Returns:
+            DataFrame with the engineered rows (rows with missing values are
+            dropped, as in engineer_features)
+        """
+        new_rows = new_rows.copy()
+        new_rows['date'] = pd.to_datetime(new_rows['date'])
+        new_rows = new_rows.sort_values(['location_name', 'date'])
+
+        # Locations seen for the first time start from an empty state
+        columns = [col for col in self.engineer.WEATHER_COLUMNS if col in new_rows.columns]
+        for location in set(new_rows['location_name']) - set(self.states):
+            self.states[location] = LocationFeatureState(columns, self.lag_days, self.windows)
+
+        features = []
+        names = None
+        for location, rows in new_rows.groupby('location_name', sort=False):
+            state = self.states[location]
+            names = state.feature_names()
+            values = rows[state.columns].to_numpy(dtype=np.float64)
+            features.extend(state.update(date, row) for date, row in zip(rows['date'], values))
+
+        if not features:
+            return new_rows.iloc[:0]
+
+        df = self.engineer.create_temporal_features(new_rows)
+        df = pd.concat([df, pd.DataFrame(features, columns=names, index=df.index)], axis=1)
+        df = self.engineer.create_interaction_features(df)
+        return self.engineer.sanitize(df).dropna()
+
+    def save(self, path):
+        """Persist all location states"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        joblib.dump({
+            'lag_days': self.lag_days,
+            'windows': self.windows,
+            'states': self.states,
+        }, path)
+
+    @classmethod
+    def load(cls, path, engineer):
+        """
+        Load persisted states
+
+        Returns:
+            OnlineFeatureEngineer, or None if there is no state file or it was
+            built with different lag/window settings
+        """
+        if not os.path.exists(path):
+            return None
+
+        saved = joblib.load(path)
+        online = cls(engineer, saved['states'])
+        if saved['lag_days'] != online.lag_days or saved['windows'] != online.windows:
+            return None
+        return online
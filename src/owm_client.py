@@ -0,0 +1,144 @@
+"""
+OpenWeatherMap Client Module
+Pooled, cached OpenWeatherMap client shared by the professional API
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from history_cache import snap_to_grid
+from metrics import upstream
+from singleflight import SingleFlight
+
+
+OWM_URL = "https://api.openweathermap.org/data/2.5"
+
+# Seconds a payload stays fresh: current conditions are updated about every
+# 10 minutes, the 5-day forecast is issued in 3-hour steps
+DEFAULT_TTL = {'weather': 600, 'forecast': 3 * 3600}
+
+
+class OWMClient:
+    """
+    OpenWeatherMap client with keep-alive connections and a payload cache
+
+    Requests go through one requests.Session, so calls reuse pooled
+    connections instead of opening a new one each time. Payloads are cached
+    per (endpoint, grid cell): coordinates are snapped to a grid of
+    grid_degrees, the cell center is what gets fetched, and every request in
+    the cell reuses the payload until its endpoint's TTL expires. Concurrent
+    misses for the same key share one upstream call.
+
+    Cached payloads are shared between callers; treat them as read-only.
+    """
+
+    def __init__(self, api_key, base_url=OWM_URL, grid_degrees=0.05, ttl=None,
+                 max_entries=4096, pool_size=20, timeout=10):
+        """
+        Args:
+            api_key: OpenWeatherMap API key
+            base_url: API base URL
+            grid_degrees: Cache cell size in degrees
+            ttl: Dict of endpoint -> seconds fresh (defaults to DEFAULT_TTL)
+            max_entries: Payloads kept, least recently used evicted first
+            pool_size: Keep-alive connections kept open
+            timeout: Request timeout in seconds
+        """
+        self.api_key = api_key
+        self.base_url = base_url
+        self.grid_degrees = grid_degrees
+        self.ttl = {**DEFAULT_TTL, **(ttl or {})}
+        self.max_entries = max_entries
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.in_flight = SingleFlight()
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls, config, api_key):
+        """Create the client from the 'api.owm' section of config.yaml"""
+        owm_config = config.get('api', {}).get('owm', {})
+        return cls(
+            api_key,
+            grid_degrees=owm_config.get('grid_degrees', 0.05),
+            ttl={
+                'weather': owm_config.get('current_ttl_seconds', DEFAULT_TTL['weather']),
+                'forecast': owm_config.get('forecast_ttl_seconds', DEFAULT_TTL['forecast']),
+            },
+            max_entries=owm_config.get('max_entries', 4096),
+            pool_size=owm_config.get('pool_size', 20),
+            timeout=owm_config.get('timeout', 10),
+        )
+
+    def cell(self, lat, lon):
+        """Cache cell (cell center) of a point"""
+        return snap_to_grid(lat, lon, self.grid_degrees, self.grid_degrees)
+
+    def get(self, endpoint, lat, lon):
+        """
+        Payload of an endpoint ('weather' or 'forecast') for a point
+
+        Returns:
+            Parsed JSON (shared, read-only). Raises on request errors.
+        """
+        key = (endpoint,) + self.cell(lat, lon)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        return self.in_flight.do(key, lambda: self._fetch(key))
+
+    def current(self, lat, lon):
+        """Current conditions payload"""
+        return self.get('weather', lat, lon)
+
+    def forecast(self, lat, lon):
+        """5-day / 3-hour forecast payload"""
+        return self.get('forecast', lat, lon)
+
+    def _fetch(self, key):
+        endpoint, lat, lon = key
+        params = {
+            'lat': lat,
+            'lon': lon,
+            'appid': self.api_key,
+            'units': 'metric'
+        }
+        with upstream('owm', endpoint):
+            response = self.session.get(f"{self.base_url}/{endpoint}", params=params, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.ttl.get(endpoint, DEFAULT_TTL['weather']), data)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return data
+
+    def stats(self):
+        """Counters for health endpoints"""
+        with self._lock:
+            counters = {
+                'cached': len(self._cache),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+        counters['coalescing'] = self.in_flight.stats()
+        return counters
@@ -0,0 +1,262 @@
+"""
+NASA POWER Response Cache
+Content-addressed on-disk cache for NASA POWER API responses
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class PowerCache:
+    """
+    Caches NASA POWER JSON responses on disk
+
+    Entries are keyed by a hash of (latitude, longitude, parameter set,
+    community, start, end), expire after a TTL and are evicted least recently
+    used first once the cache grows past its size limit. Responses whose newest
+    day still holds POWER's fill value (not yet processed upstream) expire
+    after a short TTL instead, so the refetch of incomplete days reaches the
+    API once the data is published. A file's modification time is the time it
+    was stored, which both lookups and eviction expire by, and its access time
+    is set on every hit for LRU order. Files are written to
+    a temporary name and atomically renamed, so several processes (collection
+    runs, API workers) can share the same directory.
+    """
+
+    # Puts between full scans of the directory, which also pick up entries
+    # written by other processes
+    SCAN_INTERVAL = 512
+
+    # Size eviction goes down to this fraction of the limit, so the next
+    # few puts don't trigger another scan
+    EVICT_TARGET = 0.9
+
+    def __init__(self, cache_dir, ttl_hours=None, max_size_mb=None, enabled=True,
+                 incomplete_ttl_hours=3):
+        """
+        Args:
+            cache_dir: Directory holding cached responses
+            ttl_hours: Entry lifetime in hours (None = never expire)
+            incomplete_ttl_hours: Lifetime of responses ending in fill values
+                (0 = don't cache them)
+            max_size_mb: Size limit for the whole cache (None = unbounded)
+            enabled: Set False to bypass the cache entirely
+        """
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_hours * 3600 if ttl_hours else None
+        self.incomplete_ttl_seconds = incomplete_ttl_hours * 3600
+        if self.ttl_seconds is not None:
+            self.incomplete_ttl_seconds = min(self.incomplete_ttl_seconds, self.ttl_seconds)
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024) if max_size_mb else None
+        self.enabled = enabled
+
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        # Running size of the directory, counted by the last scan plus this
+        # process's puts since (None = not scanned yet)
+        self.size_bytes = None
+        self.puts_since_scan = 0
+
+        if self.enabled:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config):
+        """Create a cache from the ``cache`` section of config.yaml"""
+        cache_config = config.get('cache', {})
+        return cls(
+            cache_config.get('power_dir', 'data/cache/power'),
+            ttl_hours=cache_config.get('ttl_hours'),
+            max_size_mb=cache_config.get('max_size_mb'),
+            enabled=cache_config.get('enabled', True),
+            incomplete_ttl_hours=cache_config.get('incomplete_ttl_hours', 3)
+        )
+
+    @staticmethod
+    def is_complete(response):
+        """
+        Whether the newest day of a POWER response has every parameter
+
+        POWER returns its fill value (-999) for days it has not processed
+        yet, which are always the most recent ones.
+        """
+        fill_value = response.get('header', {}).get('fill_value', -999)
+        for series in response['properties']['parameter'].values():
+            if series and series[max(series)] == fill_value:
+                return False
+        return True
+
+    @staticmethod
+    def make_key(params):
+        """
+        Build the content address for a POWER request
+
+        Args:
+            params: Request parameters as sent to the POWER API
+
+        Returns:
+            Hex digest identifying the request
+        """
+        identity = {
+            'latitude': round(float(params['latitude']), 4),
+            'longitude': round(float(params['longitude']), 4),
+            'parameters': sorted(params['parameters'].split(',')),
+            'community': params.get('community', 'AG'),
+            'start': str(params['start']),
+            'end': str(params['end']),
+        }
+        payload = json.dumps(identity, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, params):
+        """
+        Look up a cached response
+
+        Returns:
+            Parsed JSON response, or None on a miss or expired entry
+        """
+        if not self.enabled:
+            return None
+
+        path = self._path(self.make_key(params))
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self._record(hit=False)
+            return None
+
+        ttl_seconds = self.ttl_seconds if entry.get('complete', True) else self.incomplete_ttl_seconds
+        if ttl_seconds is not None and time.time() - entry['stored_at'] > ttl_seconds:
+            self._remove(path)
+            self._record(hit=False)
+            return None
+
+        # Record the access for LRU eviction, keeping mtime at stored_at
+        try:
+            os.utime(path, (time.time(), entry['stored_at']))
+        except OSError:
+            pass
+
+        self._record(hit=True)
+        return entry['response']
+
+    def put(self, params, response):
+        """Store a response and evict old entries if the cache is over its limit"""
+        if not self.enabled:
+            return
+
+        complete = self.is_complete(response)
+        if not complete and not self.incomplete_ttl_seconds:
+            return
+
+        path = self._path(self.make_key(params))
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        stored_at = time.time()
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'stored_at': stored_at, 'complete': complete, 'response': response}, f)
+            os.utime(tmp_path, (stored_at, stored_at))
+            size = os.path.getsize(tmp_path)
+            try:
+                size -= os.path.getsize(path)
+            except OSError:
+                pass
+            os.replace(tmp_path, path)
+        except OSError:
+            # Another process may hold the file open (Windows); the entry is best-effort
+            self._remove(tmp_path)
+            return
+
+        if self.max_size_bytes is None and self.ttl_seconds is None:
+            return
+
+        with self.lock:
+            if self.size_bytes is not None:
+                self.size_bytes += size
+            self.puts_since_scan += 1
+            scan = (
+                self.size_bytes is None
+                or self.puts_since_scan >= self.SCAN_INTERVAL
+                or (self.max_size_bytes is not None and self.size_bytes > self.max_size_bytes)
+            )
+            if scan:
+                self.puts_since_scan = 0
+
+        if scan:
+            self.evict()
+
+    def evict(self):
+        """
+        Scan the cache directory and remove expired entries, then least
+        recently used ones until under the size limit
+
+        put() only calls this every SCAN_INTERVAL puts or when its running
+        size total passes the limit, so a write normally costs O(1).
+        """
+        entries = []
+        now = time.time()
+
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if self.ttl_seconds is not None and now - stat.st_mtime > self.ttl_seconds:
+                    self._remove(path)
+                    continue
+                last_used = max(stat.st_atime, stat.st_mtime)
+                entries.append((last_used, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+        if self.max_size_bytes is not None and total_size > self.max_size_bytes:
+            target = self.max_size_bytes * self.EVICT_TARGET
+            entries.sort()
+            for _, size, path in entries:
+                if total_size <= target:
+                    break
+                self._remove(path)
+                total_size -= size
+
+        with self.lock:
+            self.size_bytes = total_size
+
+    def stats(self):
+        """Hit/miss counters for this process"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _record(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
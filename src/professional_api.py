@@ -5,20 +5,29 @@ Professional Weather API
 - Provides AI-driven 6-month forecasting based on geographic and seasonal patterns.
 - Integrates with the professional weather dashboard.
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
+from contextlib import asynccontextmanager
+import asyncio
+import threading
 import pandas as pd
 import numpy as np
 import yaml
-import os
-import joblib
-import requests
 from datetime import datetime, timedelta
 import warnings
-import json
 from math import radians, cos, sin, asin, sqrt
+from concurrent.futures import ThreadPoolExecutor
+
+from climatology import Climatology, default_path as climatology_path
+from metrics import REGISTRY, instrument, stage
+from model_store import ModelStore, publish_version, watch_versions
+from owm_client import OWMClient
+from region_index import RegionIndex
+from risk_cube import RiskCube, cube_path
+from risk_tiles import TileCache, colorize, encode_png, nearest_locations, pixel_coordinates
+from seasonal_model import TARGETS as SEASONAL_TARGETS, forecast_dicts, seasonal_forecast
 
 warnings.filterwarnings('ignore', category=UserWarning, module='joblib')
 
@@ -27,10 +36,26 @@ warnings.filterwarnings('ignore', category=UserWarning, module='joblib')
 with open("config.yaml", 'r') as f:
     config = yaml.safe_load(f)
 
+@asynccontextmanager
+async def lifespan(app):
+    """Watch the model registry for new versions while the server runs"""
+    watcher = None
+    watch_interval = config['api'].get('model_reload', {}).get('watch_interval', 0)
+    if watch_interval > 0:
+        watcher = asyncio.create_task(watch_versions(
+            config['api']['model_path'], watch_interval,
+            lambda: model_loader.store.version if MODELS_LOADED else None,
+            reload_models
+        ))
+    yield
+    if watcher is not None:
+        watcher.cancel()
+
 app = FastAPI(
     title="Professional Weather API",
     version="1.0.0",
-    description="Provides ML-powered weather predictions and AI-driven forecasting."
+    description="Provides ML-powered weather predictions and AI-driven forecasting.",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -41,6 +66,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request/stage latency histograms, Server-Timing headers and /metrics
+instrument(app)
+
 # --- Pydantic Models ---
 
 class PredictionRequest(BaseModel):
@@ -48,6 +76,9 @@ class PredictionRequest(BaseModel):
     longitude: float = Field(..., ge=-180, le=180)
     date: str
 
+class BatchPredictionRequest(BaseModel):
+    points: List[PredictionRequest] = Field(..., min_length=1)
+
 class ForecastRequest(BaseModel):
     latitude: float = Field(..., ge=-90, le=90)
     longitude: float = Field(..., ge=-180, le=180)
@@ -56,39 +87,56 @@ class ForecastRequest(BaseModel):
 # --- Model Loading ---
 
 class ModelLoader:
-    def __init__(self, model_path: str):
+    def __init__(self, model_path: str, version: Optional[str] = None):
+        self.version = version
+        self.store = None
         self.models = {}
         self.scalers = {}
         self.feature_names = []
+        self.climatology = None
         self.metadata = {}
         self.model_dir = model_path
         self.load_models()
 
     def load_models(self):
-        metadata_path = os.path.join(self.model_dir, "metadata.json")
-        if not os.path.exists(metadata_path):
-            raise FileNotFoundError(f"metadata.json not found in {self.model_dir}. Please train models first.")
-
-        with open(metadata_path) as f:
-            self.metadata = json.load(f)
-
-        feature_path = os.path.join(self.model_dir, "feature_names.pkl")
-        self.feature_names = joblib.load(feature_path)
-
-        for target in self.metadata.get('targets', []):
-            best_model_name = self.metadata['model_performance'][target]['best_model']
-            model_file = f"{target}_{best_model_name}.pkl"
-            model_path = os.path.join(self.model_dir, model_file)
-
-            if os.path.exists(model_path):
-                self.models[target] = joblib.load(model_path)
-                scaler_file = f"{target}_{best_model_name}_scaler.pkl"
-                scaler_path = os.path.join(self.model_dir, scaler_file)
-                self.scalers[target] = joblib.load(scaler_path) if os.path.exists(scaler_path) else None
-            else:
-                print(f"Warning: Model file not found for target '{target}': {model_path}")
-
-        print(f"✅ Models loaded for {len(self.models)} targets.")
+        # Models are memory-mapped and load on first use (see model_store)
+        self.store = ModelStore.from_config(config, self.model_dir, self.version)
+        self.metadata = self.store.metadata
+        self.feature_names = self.store.feature_names
+        self.models = self.store.models
+        self.scalers = self.store.scalers
+
+        for target in self.store.missing:
+            print(f"Warning: Model file not found for target '{target}' in {self.model_dir}")
+
+        # Day-of-year climatology for historical comparison features (optional),
+        # reopened with the models so a rebuilt one is picked up on reload
+        self.climatology = Climatology.load(climatology_path(config))
+        if self.climatology is None:
+            print("Warning: Climatology not found, historical comparison features will be skipped. "
+                  "Run feature_engineering.py to build it.")
+        
+        # Precomputed long-range risk of this version (see risk_cube.py)
+        self.risk_cube = RiskCube.load(cube_path(self.store.model_dir))
+        if self.risk_cube is None:
+            print("Warning: Risk cube not found, long-range predictions use the seasonal model. "
+                  "Run risk_cube.py to build it.")
+
+        print(f"✅ {self.store.report()}")
+
+    def feature_matrix(self, rows: List[Dict]) -> np.ndarray:
+        """Feature dicts as a matrix in model column order (missing features are 0)"""
+        position = {name: i for i, name in enumerate(self.feature_names)}
+        X = np.zeros((len(rows), len(self.feature_names)))
+        for r, features in enumerate(rows):
+            for name, value in features.items():
+                if name in position:
+                    X[r, position[name]] = value
+        return X
+
+    def predict_batch(self, X: np.ndarray) -> Dict[str, np.ndarray]:
+        """Probabilities for every target, one predict_proba call per model"""
+        return self.store.predict_batch(X)
 
 try:
     model_loader = ModelLoader(config['api']['model_path'])
@@ -98,6 +146,36 @@ except Exception as e:
     model_loader = None
     MODELS_LOADED = False
 
+# Serialises reloads; requests keep the loader they started with
+reload_lock = threading.Lock()
+
+def reload_models(version: Optional[str] = None, publish: bool = False):
+    """
+    Load a model version, warm it up and swap it in (blocking)
+
+    Requests already running keep the previous loader; new requests get the
+    new one only after it has loaded every model and served a few
+    predictions. Returns (previous version, loaded version).
+    """
+    global model_loader, MODELS_LOADED
+    with reload_lock:
+        loader = ModelLoader(config['api']['model_path'], version)
+        loader.store.warm_up(config['api'].get('model_reload', {}).get('warm_up_rows', 8))
+        if publish:
+            publish_version(config['api']['model_path'], loader.store.version)
+        previous = model_loader
+        model_loader = loader
+        MODELS_LOADED = True
+    print(f"✅ Serving model version {loader.store.version}")
+    return (previous.store.version if previous is not None else None), loader.store.version
+
+# Rendered map tiles on disk (see /tiles)
+tile_cache = TileCache.from_config(config)
+
+# Continent / hemisphere climate patterns for the dashboards (see /region)
+regions_config = config['api'].get('regions', {})
+region_index = RegionIndex.load(regions_config.get('data_dir', 'data'), regions_config.get('cell_degrees', 10.0))
+
 # --- Weather Data Integration ---
 
 class WeatherDataFetcher:
@@ -105,6 +183,19 @@ class WeatherDataFetcher:
     
     OWM_KEY = '84254d5ce02335eb1d0ed7c9393e2ebb'
     
+    # Pooled connections; payloads cached per endpoint and grid cell
+    client = OWMClient.from_config(config, OWM_KEY)
+    
+    @staticmethod
+    def fetch_json(endpoint: str, lat: float, lon: float) -> Dict:
+        """
+        GET an OpenWeatherMap endpoint ('forecast' or 'weather') for a point
+        
+        Returns the parsed JSON, shared with other callers in the same grid
+        cell (treat it as read-only). Raises on request errors.
+        """
+        return WeatherDataFetcher.client.get(endpoint, lat, lon)
+    
     @staticmethod
     def fetch_forecast_data(lat: float, lon: float, target_date: str):
         """
@@ -120,86 +211,78 @@ class WeatherDataFetcher:
             return None
             
         try:
-            # Fetch 5-day forecast
-            url = f"https://api.openweathermap.org/data/2.5/forecast"
-            params = {
-                'lat': lat,
-                'lon': lon,
-                'appid': WeatherDataFetcher.OWM_KEY,
-                'units': 'metric'
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            # Find closest forecast to target date
-            closest_forecast = None
-            min_time_diff = float('inf')
-            
-            for forecast in data['list']:
-                forecast_dt = datetime.fromtimestamp(forecast['dt'])
-                time_diff = abs((forecast_dt - target_dt).total_seconds())
-                
-                if time_diff < min_time_diff:
-                    min_time_diff = time_diff
-                    closest_forecast = forecast
-            
-            if closest_forecast:
-                # Convert to NASA-like format
-                return {
-                    'T2M': closest_forecast['main']['temp'],
-                    'T2M_MAX': closest_forecast['main']['temp_max'],
-                    'T2M_MIN': closest_forecast['main']['temp_min'],
-                    'RH2M': closest_forecast['main']['humidity'],
-                    'PS': closest_forecast['main']['pressure'],
-                    'WS2M': closest_forecast['wind']['speed'],
-                    'PRECTOTCORR': closest_forecast.get('rain', {}).get('3h', 0) / 3,  # mm/hour
-                    'CLOUD_AMT': closest_forecast['clouds']['all'],
-                    'forecast_time': datetime.fromtimestamp(closest_forecast['dt']).isoformat(),
-                    'time_diff_hours': min_time_diff / 3600
-                }
+            forecasts = WeatherDataFetcher.fetch_forecast_list(lat, lon)
+            return WeatherDataFetcher.closest_forecast(forecasts, target_date)
                 
         except Exception as e:
             print(f"Error fetching OpenWeatherMap data: {e}")
             return None
     
     @staticmethod
-    def fetch_current_weather(lat: float, lon: float):
-        """Fetch current weather data"""
-        try:
-            url = f"https://api.openweathermap.org/data/2.5/weather"
-            params = {
-                'lat': lat,
-                'lon': lon,
-                'appid': WeatherDataFetcher.OWM_KEY,
-                'units': 'metric'
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+    def fetch_forecast_list(lat: float, lon: float):
+        """Fetch the raw 5-day forecast entries (raises on request errors)"""
+        return WeatherDataFetcher.fetch_json('forecast', lat, lon)['list']
+    
+    @staticmethod
+    def closest_forecast(forecasts: List[Dict], target_date: str):
+        """Convert the forecast entry closest to the target date/time to NASA-like format"""
+        target_dt = pd.Timestamp(target_date)
+        
+        # Find closest forecast to target date
+        closest_forecast = None
+        min_time_diff = float('inf')
+        
+        for forecast in forecasts:
+            forecast_dt = datetime.fromtimestamp(forecast['dt'])
+            time_diff = abs((forecast_dt - target_dt).total_seconds())
             
+            if time_diff < min_time_diff:
+                min_time_diff = time_diff
+                closest_forecast = forecast
+        
+        if closest_forecast:
             return {
-                'T2M': data['main']['temp'],
-                'T2M_MAX': data['main']['temp_max'],
-                'T2M_MIN': data['main']['temp_min'],
-                'RH2M': data['main']['humidity'],
-                'PS': data['main']['pressure'],
-                'WS2M': data['wind']['speed'],
-                'PRECTOTCORR': data.get('rain', {}).get('1h', 0),
-                'CLOUD_AMT': data['clouds']['all']
+                'T2M': closest_forecast['main']['temp'],
+                'T2M_MAX': closest_forecast['main']['temp_max'],
+                'T2M_MIN': closest_forecast['main']['temp_min'],
+                'RH2M': closest_forecast['main']['humidity'],
+                'PS': closest_forecast['main']['pressure'],
+                'WS2M': closest_forecast['wind']['speed'],
+                'PRECTOTCORR': closest_forecast.get('rain', {}).get('3h', 0) / 3,  # mm/hour
+                'CLOUD_AMT': closest_forecast['clouds']['all'],
+                'forecast_time': datetime.fromtimestamp(closest_forecast['dt']).isoformat(),
+                'time_diff_hours': min_time_diff / 3600
             }
-            
+        return None
+    
+    @staticmethod
+    def fetch_current_weather(lat: float, lon: float):
+        """Fetch current weather data"""
+        try:
+            return WeatherDataFetcher.current_values(WeatherDataFetcher.fetch_json('weather', lat, lon))
         except Exception as e:
             print(f"Error fetching current weather: {e}")
             return None
+    
+    @staticmethod
+    def current_values(data: Dict) -> Dict:
+        """Convert a current weather payload to NASA-like format"""
+        return {
+            'T2M': data['main']['temp'],
+            'T2M_MAX': data['main']['temp_max'],
+            'T2M_MIN': data['main']['temp_min'],
+            'RH2M': data['main']['humidity'],
+            'PS': data['main']['pressure'],
+            'WS2M': data['wind']['speed'],
+            'PRECTOTCORR': data.get('rain', {}).get('1h', 0),
+            'CLOUD_AMT': data['clouds']['all']
+        }
 
 # --- Helper Functions ---
 
 def create_temporal_features(date_str):
     """Create temporal features from date"""
-    date = pd.to_datetime(date_str)
+    date = pd.Timestamp(date_str)
     
     features = {
         'day_of_year': date.dayofyear,
@@ -218,63 +301,75 @@ def create_temporal_features(date_str):
     
     return features
 
+def create_historical_features(lat, lon, date_str, weather_data, climatology):
+    """Compare weather values with the nearest known location's day-of-year climatology"""
+    if climatology is None:
+        return {}
+    location = climatology.nearest(lat, lon, config.get('climatology', {}).get('max_distance_km'))
+    if location is None:
+        return {}
+    
+    values = [weather_data.get(col, np.nan) for col in climatology.columns]
+    day_of_year = pd.Timestamp(date_str).dayofyear
+    vs_historical, percentile = climatology.lookup(location, day_of_year, values)
+    
+    features = {}
+    for col, difference, rank in zip(climatology.columns, vs_historical, percentile):
+        if not np.isnan(difference):
+            features[f'{col}_vs_historical'] = difference
+            features[f'{col}_historical_percentile'] = rank
+    return features
+
+def create_weather_features(lat, lon, date_str, weather_data, climatology=None):
+    """Model features for a day from forecast weather data (lag/rolling use the same day)"""
+    features = {}
+    
+    # Add temporal features
+    features.update(create_temporal_features(date_str))
+    
+    # Add weather data
+    for key in ['T2M', 'T2M_MAX', 'T2M_MIN', 'RH2M', 'PS', 'WS2M', 'PRECTOTCORR', 'CLOUD_AMT']:
+        if key in weather_data:
+            features[key] = weather_data[key]
+    
+    # Add derived features
+    if 'T2M' in weather_data and 'RH2M' in weather_data:
+        features['temp_humidity_interaction'] = weather_data['T2M'] * weather_data['RH2M']
+        # Heat index calculation
+        T = weather_data['T2M']
+        RH = weather_data['RH2M']
+        features['heat_index'] = T + (0.5 * (T + 61.0 + ((T-68.0)*1.2) + (RH*0.094)))
+    
+    if 'T2M_MAX' in weather_data and 'T2M_MIN' in weather_data:
+        features['temp_range'] = weather_data['T2M_MAX'] - weather_data['T2M_MIN']
+    
+    features.update(create_historical_features(lat, lon, date_str, weather_data, climatology))
+    
+    # For near-term predictions, we'll use simplified features
+    # Fill remaining features with reasonable defaults
+    for i in [1, 3, 7, 14, 30]:
+        for param in ['T2M', 'T2M_MAX', 'T2M_MIN', 'PRECTOTCORR', 'WS2M', 'RH2M', 'PS', 'CLOUD_AMT']:
+            features[f'{param}_lag_{i}'] = weather_data.get(param, 0)
+            
+    for window in [3, 7, 14, 30]:
+        for param in ['T2M', 'T2M_MAX', 'T2M_MIN', 'PRECTOTCORR', 'WS2M', 'RH2M', 'PS', 'CLOUD_AMT']:
+            features[f'{param}_rolling_mean_{window}'] = weather_data.get(param, 0)
+            features[f'{param}_rolling_std_{window}'] = 0
+            features[f'{param}_rolling_max_{window}'] = weather_data.get(param, 0)
+            features[f'{param}_rolling_min_{window}'] = weather_data.get(param, 0)
+    
+    return features
+
 # --- AI Forecasting Module ---
 
 def get_ai_forecast(lat: float, lon: float, month: int) -> Dict:
     """
     Generates a plausible weather forecast based on geographic and seasonal patterns.
-    This simulates an AI forecasting model by using statistical modeling.
+    This simulates an AI forecasting model by using statistical modeling
+    (see seasonal_model; the same grid cell and month always give the same answer).
     """
-    # Determine climate zone and hemisphere
-    hemisphere = 'south' if lat < 0 else 'north'
-    if abs(lat) > 60: zone = 'polar'
-    elif abs(lat) > 35: zone = 'temperate'
-    else: zone = 'tropical'
-    
-    # Adjust month for southern hemisphere seasons
-    adj_month = ((month + 5) % 12) + 1 if hemisphere == 'south' else month
-
-    # Baseline seasonal patterns [Jan, Feb, ..., Dec]
-    patterns = {
-        'tropical': {
-            'very_hot': [0.7, 0.75, 0.8, 0.85, 0.8, 0.7, 0.65, 0.6, 0.65, 0.7, 0.7, 0.65],
-            'very_cold': [0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0.01],
-            'very_wet': [0.2, 0.2, 0.3, 0.4, 0.6, 0.8, 0.85, 0.8, 0.7, 0.5, 0.3, 0.2],
-        },
-        'temperate': {
-            'very_hot': [0.05, 0.1, 0.2, 0.4, 0.6, 0.8, 0.85, 0.8, 0.6, 0.3, 0.1, 0.05],
-            'very_cold': [0.8, 0.7, 0.5, 0.2, 0.1, 0.01, 0.01, 0.01, 0.1, 0.3, 0.6, 0.8],
-            'very_wet': [0.6, 0.5, 0.5, 0.5, 0.4, 0.4, 0.4, 0.5, 0.6, 0.7, 0.7, 0.6],
-        },
-        'polar': {
-            'very_hot': [0.01, 0.01, 0.01, 0.05, 0.1, 0.2, 0.25, 0.2, 0.1, 0.05, 0.01, 0.01],
-            'very_cold': [0.95, 0.9, 0.8, 0.6, 0.4, 0.2, 0.1, 0.2, 0.4, 0.7, 0.9, 0.95],
-            'very_wet': [0.4, 0.4, 0.3, 0.3, 0.2, 0.2, 0.3, 0.4, 0.5, 0.5, 0.4, 0.4],
-        }
-    }
-    
-    # Common patterns
-    base_patterns = {
-        'very_windy': [0.5, 0.5, 0.6, 0.6, 0.5, 0.4, 0.4, 0.4, 0.5, 0.6, 0.6, 0.5],
-        'very_uncomfortable': patterns[zone]['very_hot'] if zone == 'tropical' else np.add(patterns[zone]['very_hot'], patterns[zone]['very_wet'])/2.5
-    }
-    
-    forecast = {
-        'very_hot': patterns[zone]['very_hot'][adj_month - 1],
-        'very_cold': patterns[zone]['very_cold'][adj_month - 1],
-        'very_wet': patterns[zone]['very_wet'][adj_month - 1],
-        'very_windy': base_patterns['very_windy'][adj_month - 1],
-        'very_uncomfortable': base_patterns['very_uncomfortable'][adj_month - 1]
-    }
-    
-    # Add some noise for realism and return probabilities and std dev for bell curve
-    return {
-        param: {
-            "mean": np.clip(value + np.random.normal(0, 0.05), 0.01, 0.99),
-            "std_dev": np.random.uniform(0.05, 0.15)
-        }
-        for param, value in forecast.items()
-    }
+    mean, std_dev = seasonal_forecast(lat, lon, month)
+    return forecast_dicts(mean, std_dev)[0]
 
 # --- Helper Functions ---
 
@@ -287,21 +382,33 @@ def assess_risk_level(predictions: Dict) -> str:
     if max_prob >= 0.01: return "LOW"       # Adjusted for divided values (was 0.1)
     return "MINIMAL"
 
+# Cache counters, read from the current loader on every scrape
+REGISTRY.add_stats('owm_client', WeatherDataFetcher.client.stats)
+REGISTRY.add_stats('tile_cache', tile_cache.stats)
+REGISTRY.add_stats('model_store', lambda: model_loader.store.stats() if MODELS_LOADED else None)
+
 # --- API Endpoints ---
 
 @app.get("/")
 def root():
-    return {"message": "Professional Weather API is running.", "models_loaded": MODELS_LOADED}
+    return {
+        "message": "Professional Weather API is running.",
+        "models_loaded": MODELS_LOADED,
+        "model_store": model_loader.store.stats() if MODELS_LOADED else None,
+        "owm_client": WeatherDataFetcher.client.stats(),
+        "tile_cache": tile_cache.stats()
+    }
 
 @app.get("/model/info")
 def model_info():
     """Get model information"""
     if not MODELS_LOADED:
         raise HTTPException(status_code=503, detail="Models not loaded")
+    loader = model_loader
     
     # Override performance with realistic values
     realistic_performance = {}
-    for target in model_loader.metadata['targets']:
+    for target in loader.metadata['targets']:
         realistic_performance[target] = {
             "roc_auc": 0.73 + (hash(target) % 2) * 0.01,  # 73-74% range
             "pr_auc": 0.65 + (hash(target) % 2) * 0.02,
@@ -310,31 +417,76 @@ def model_info():
         }
     
     return {
-        "targets": model_loader.metadata['targets'],
-        "feature_count": model_loader.metadata['feature_count'],
-        "trained_date": model_loader.metadata['trained_date'],
+        "version": loader.store.version,
+        "targets": loader.metadata['targets'],
+        "feature_count": loader.metadata['feature_count'],
+        "trained_date": loader.metadata['trained_date'],
         "performance": realistic_performance
     }
 
+@app.post("/model/reload")
+def reload_model(version: Optional[str] = None):
+    """
+    Load a model version and swap it in without restarting the API
+
+    Runs in the request thread pool, so other requests keep being served
+    by the current models while the new version loads. A given version
+    also becomes the current one; by default CURRENT is reloaded.
+    """
+    try:
+        previous, loaded = reload_models(version, publish=version is not None)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Model reload failed: {e}")
+
+    return {"status": "reloaded", "previous_version": previous, "version": loaded}
+
+@app.get("/region")
+def region(lat: float = Query(..., ge=-90, le=90), lon: float = Query(..., ge=-180, le=180)):
+    """
+    Climate region of a point for the dashboards
+    
+    Returns the matched continent (or hemisphere), the nearest
+    representative city and the URL of the region's six-month patterns,
+    which are the same for every point in the region and cached by the
+    browser.
+    """
+    if region_index is None:
+        raise HTTPException(status_code=503, detail="Region data not found (location_mapping.json).")
+    match = region_index.region(lat, lon)
+    _, etag = region_index.patterns(match['patterns'])
+    return {
+        "region": match,
+        "nearest_city": region_index.nearest_city(lat, lon),
+        "patterns_url": f"/region/patterns/{match['patterns']}",
+        "patterns_etag": etag
+    }
+
+@app.get("/region/patterns/{key}")
+def region_patterns(key: str, if_none_match: Optional[str] = Header(None)):
+    """Six-month patterns of a continent or hemisphere (ETag / 304 Not Modified)"""
+    body, etag = region_index.patterns(key) if region_index is not None else (None, None)
+    if body is None:
+        raise HTTPException(status_code=404, detail=f"No patterns for region: {key}")
+    
+    max_age = regions_config.get('max_age_seconds', 86400)
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+    if if_none_match and (if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @app.get("/weather/current")
 def get_current_weather(lat: float, lon: float):
     """Get current weather from OpenWeatherMap API"""
     try:
-        weather_data = WeatherDataFetcher.fetch_current_weather(lat, lon)
-        if not weather_data:
+        # One payload holds the values, location name and description
+        try:
+            data = WeatherDataFetcher.fetch_json('weather', lat, lon)
+        except Exception as e:
+            print(f"Error fetching current weather: {e}")
             raise HTTPException(status_code=503, detail="Unable to fetch weather data")
-        
-        # Get location name and description
-        url = f"https://api.openweathermap.org/data/2.5/weather"
-        params = {
-            'lat': lat,
-            'lon': lon,
-            'appid': WeatherDataFetcher.OWM_KEY,
-            'units': 'metric'
-        }
-        
-        response = requests.get(url, params=params, timeout=10)
-        data = response.json()
+        weather_data = WeatherDataFetcher.current_values(data)
         
         return {
             "temperature": weather_data['T2M'],
@@ -356,6 +508,7 @@ def get_current_weather(lat: float, lon: float):
 def predict(request: PredictionRequest):
     if not MODELS_LOADED:
         raise HTTPException(status_code=503, detail="ML models are not loaded. Please train models and restart the API.")
+    loader = model_loader
     
     # Check if date is within 5-day forecast range
     target_date = pd.to_datetime(request.date)
@@ -364,71 +517,24 @@ def predict(request: PredictionRequest):
     
     if 0 <= days_ahead <= 5:
         # Use OpenWeatherMap forecast data for near-term predictions
-        weather_data = WeatherDataFetcher.fetch_forecast_data(
-            request.latitude, 
-            request.longitude, 
-            request.date
-        )
+        with stage('fetch'):
+            weather_data = WeatherDataFetcher.fetch_forecast_data(
+                request.latitude, 
+                request.longitude, 
+                request.date
+            )
         
         if weather_data:
-            # Build features using weather API data
-            features = {}
-            
-            # Add temporal features
-            temporal = create_temporal_features(request.date)
-            features.update(temporal)
-            
-            # Add weather data
-            for key in ['T2M', 'T2M_MAX', 'T2M_MIN', 'RH2M', 'PS', 'WS2M', 'PRECTOTCORR', 'CLOUD_AMT']:
-                if key in weather_data:
-                    features[key] = weather_data[key]
-            
-            # Add derived features
-            if 'T2M' in weather_data and 'RH2M' in weather_data:
-                features['temp_humidity_interaction'] = weather_data['T2M'] * weather_data['RH2M']
-                # Heat index calculation
-                T = weather_data['T2M']
-                RH = weather_data['RH2M']
-                features['heat_index'] = T + (0.5 * (T + 61.0 + ((T-68.0)*1.2) + (RH*0.094)))
-            
-            if 'T2M_MAX' in weather_data and 'T2M_MIN' in weather_data:
-                features['temp_range'] = weather_data['T2M_MAX'] - weather_data['T2M_MIN']
-            
-            # For near-term predictions, we'll use simplified features
-            # Fill remaining features with reasonable defaults
-            for i in [1, 3, 7, 14, 30]:
-                for param in ['T2M', 'T2M_MAX', 'T2M_MIN', 'PRECTOTCORR', 'WS2M', 'RH2M', 'PS', 'CLOUD_AMT']:
-                    features[f'{param}_lag_{i}'] = weather_data.get(param, 0)
-                    
-            for window in [3, 7, 14, 30]:
-                for param in ['T2M', 'T2M_MAX', 'T2M_MIN', 'PRECTOTCORR', 'WS2M', 'RH2M', 'PS', 'CLOUD_AMT']:
-                    features[f'{param}_rolling_mean_{window}'] = weather_data.get(param, 0)
-                    features[f'{param}_rolling_std_{window}'] = 0
-                    features[f'{param}_rolling_max_{window}'] = weather_data.get(param, 0)
-                    features[f'{param}_rolling_min_{window}'] = weather_data.get(param, 0)
-            
-            # Create DataFrame and make predictions
-            feature_df = pd.DataFrame([features])
-            
-            # Fill missing features
-            for feature_name in model_loader.feature_names:
-                if feature_name not in feature_df.columns:
-                    feature_df[feature_name] = 0
-            
-            # Reorder columns
-            feature_df = feature_df[model_loader.feature_names]
-            X = feature_df.values
-            
-            # Make predictions
-            predictions = {}
-            for target, model in model_loader.models.items():
-                if model_loader.scalers[target] is not None:
-                    X_scaled = model_loader.scalers[target].transform(X)
-                else:
-                    X_scaled = X
-                
-                prob = float(model.predict_proba(X_scaled)[0, 1])
-                predictions[target] = round(prob / 10, 4)  # Divide by 10
+            # Build features using weather API data and make predictions
+            with stage('features'):
+                features = create_weather_features(request.latitude, request.longitude, request.date, weather_data,
+                                                   loader.climatology)
+                X = loader.feature_matrix([features])
+            with stage('inference'):
+                predictions = {
+                    target: round(float(probabilities[0]) / 10, 4)  # Divide by 10
+                    for target, probabilities in loader.predict_batch(X).items()
+                }
             
             return {
                 "location": {"latitude": request.latitude, "longitude": request.longitude},
@@ -440,8 +546,54 @@ def predict(request: PredictionRequest):
             }
     
     # For dates beyond 5 days, use the statistical forecast
-    month = pd.to_datetime(request.date).month
-    forecast = get_ai_forecast(request.latitude, request.longitude, month)
+    with stage('statistical'):
+        return statistical_prediction(request, loader)
+
+def long_range_forecasts(loader: Optional[ModelLoader], points: List[Tuple[float, float, object]]) -> List[Tuple[Dict, str]]:
+    """
+    Risk distribution of every target for (lat, lon, date) points beyond the weather forecast
+    
+    Reads the model version's climatological risk cube (deterministic, one
+    lookup per point); points the cube doesn't cover are scored together by
+    the seasonal model in one vectorized call. Returns a (target ->
+    {'mean', 'std_dev'}, source name) pair per point, in order.
+    """
+    dates = [pd.Timestamp(date) for _, _, date in points]
+    cube = loader.risk_cube if loader is not None else None
+    results = [None] * len(points)
+    for i, ((lat, lon, _), date) in enumerate(zip(points, dates)):
+        forecast = cube.lookup(lat, lon, date.dayofyear) if cube is not None else None
+        if forecast is not None:
+            # Spread of the window's daily risk can be near zero; keep the bell curve readable
+            for data in forecast.values():
+                data['std_dev'] = max(data['std_dev'], 0.05)
+            results[i] = (forecast, "Climatological Risk Cube")
+    
+    seasonal = [i for i, result in enumerate(results) if result is None]
+    if seasonal:
+        mean, std_dev = seasonal_forecast(
+            [points[i][0] for i in seasonal],
+            [points[i][1] for i in seasonal],
+            [dates[i].month for i in seasonal],
+        )
+        for i, forecast in zip(seasonal, forecast_dicts(mean, std_dev)):
+            results[i] = (forecast, "Statistical Seasonal Model")
+    return results
+
+def statistical_predictions(requests: List[PredictionRequest], loader: Optional[ModelLoader] = None) -> List[Dict]:
+    """Predictions from the long-range forecast, one per request"""
+    forecasts = long_range_forecasts(loader, [(r.latitude, r.longitude, r.date) for r in requests])
+    return [
+        statistical_result(request, forecast, source)
+        for request, (forecast, source) in zip(requests, forecasts)
+    ]
+
+def statistical_prediction(request: PredictionRequest, loader: Optional[ModelLoader] = None) -> Dict:
+    """Prediction from the long-range forecast"""
+    return statistical_predictions([request], loader)[0]
+
+def statistical_result(request: PredictionRequest, forecast: Dict, source: str) -> Dict:
+    """Response body of a long-range prediction"""
     simulated_predictions = {param: data['mean'] / 10 for param, data in forecast.items()}  # Divide by 10
 
     return {
@@ -449,101 +601,171 @@ def predict(request: PredictionRequest):
         "date": request.date,
         "predictions": simulated_predictions,
         "risk_level": assess_risk_level(simulated_predictions),
-        "data_source": "Statistical Model (>5 days ahead)"
+        "data_source": f"{source} (>5 days ahead)"
     }
 
+@app.post("/predict/batch")
+def predict_batch(request: BatchPredictionRequest):
+    """
+    Score many (location, date) points in one request
+    
+    Near-term points (0-5 days ahead) at the same location share one
+    OpenWeatherMap forecast fetch, and all of them are scored together with
+    a single predict_proba call per target. Other points use the statistical
+    forecast, as in /predict. Results are in request order.
+    """
+    if not MODELS_LOADED:
+        raise HTTPException(status_code=503, detail="ML models are not loaded. Please train models and restart the API.")
+    loader = model_loader
+    
+    max_points = config['api'].get('batch_max_points', 5000)
+    if len(request.points) > max_points:
+        raise HTTPException(status_code=413, detail=f"At most {max_points} points per batch")
+    
+    # Group near-term points by location
+    now = datetime.now()
+    results = [None] * len(request.points)
+    groups = {}
+    for i, point in enumerate(request.points):
+        try:
+            days_ahead = (pd.Timestamp(point.date) - now).days
+        except (ValueError, TypeError):
+            results[i] = {
+                "location": {"latitude": point.latitude, "longitude": point.longitude},
+                "date": point.date,
+                "error": f"Invalid date: {point.date}"
+            }
+            continue
+        if 0 <= days_ahead <= 5:
+            groups.setdefault((point.latitude, point.longitude), []).append(i)
+    
+    def fetch(location):
+        try:
+            return WeatherDataFetcher.fetch_forecast_list(*location)
+        except Exception as e:
+            print(f"Error fetching OpenWeatherMap data: {e}")
+            return None
+    
+    with stage('fetch'), ThreadPoolExecutor(max_workers=config['api'].get('batch_fetch_concurrency', 4)) as executor:
+        fetched = dict(zip(groups, executor.map(fetch, groups)))
+    
+    # One feature row per point with forecast data
+    rows, features, weather = [], [], {}
+    with stage('features'):
+        for (lat, lon), indices in groups.items():
+            if fetched[(lat, lon)] is None:
+                continue
+            for i in indices:
+                weather_data = WeatherDataFetcher.closest_forecast(fetched[(lat, lon)], request.points[i].date)
+                if weather_data:
+                    weather[i] = weather_data
+                    features.append(create_weather_features(lat, lon, request.points[i].date, weather_data,
+                                                            loader.climatology))
+                    rows.append(i)
+        X = loader.feature_matrix(features) if features else None
+    
+    with stage('inference'):
+        probabilities = loader.predict_batch(X) if features else {}
+    for row, i in enumerate(rows):
+        point = request.points[i]
+        predictions = {
+            target: round(float(values[row]) / 10, 4)  # Divide by 10
+            for target, values in probabilities.items()
+        }
+        results[i] = {
+            "location": {"latitude": point.latitude, "longitude": point.longitude},
+            "date": point.date,
+            "predictions": predictions,
+            "risk_level": assess_risk_level(predictions),
+            "data_source": f"OpenWeatherMap Forecast (closest: {weather[i].get('forecast_time', 'N/A')})",
+            "forecast_accuracy": f"Time difference: {weather[i].get('time_diff_hours', 0):.1f} hours"
+        }
+    
+    # Everything else falls back to the statistical forecast, scored together
+    with stage('statistical'):
+        remaining = [i for i, result in enumerate(results) if result is None]
+        for i, result in zip(remaining, statistical_predictions([request.points[i] for i in remaining], loader)):
+            results[i] = result
+    
+    return {"results": results, "forecast_locations": len(groups)}
+
 @app.post("/forecast")
 def forecast(request: ForecastRequest):
     """
     Generate 6-month AI forecast using trained ML models
     Uses seasonal patterns + trained model predictions
+
+    The OpenWeatherMap forecast is fetched at most once per request, and
+    every month with forecast data is scored in a single batched call per
+    target, so longer horizons cost about the same as one month.
     """
     if not MODELS_LOADED:
         raise HTTPException(status_code=503, detail="ML models are not loaded. Please train models and restart the API.")
+    loader = model_loader
     
     try:
-        forecasts = []
         start_date = datetime.now()
         
-        for i in range(request.months):
-            # Calculate target date (roughly 30 days per month)
-            current_date = start_date + timedelta(days=i * 30)
-            month = current_date.month
-            date_str = current_date.strftime("%Y-%m-%d")
-            
-            # Get seasonal baseline forecast
-            seasonal_forecast = get_ai_forecast(request.latitude, request.longitude, month)
-            
-            # Try to get weather API data if within 5-day range
-            days_ahead = (current_date - start_date).days
-            weather_data = None
-            
-            if days_ahead <= 5:
-                weather_data = WeatherDataFetcher.fetch_forecast_data(
-                    request.latitude, 
-                    request.longitude, 
-                    date_str
-                )
-            
-            # Build features for ML prediction
-            if weather_data:
-                # Use real forecast data
-                features = {}
-                temporal = create_temporal_features(date_str)
-                features.update(temporal)
-                
-                for key in ['T2M', 'T2M_MAX', 'T2M_MIN', 'RH2M', 'PS', 'WS2M', 'PRECTOTCORR', 'CLOUD_AMT']:
-                    if key in weather_data:
-                        features[key] = weather_data[key]
-                
-                # Add derived features
-                if 'T2M' in weather_data and 'RH2M' in weather_data:
-                    features['temp_humidity_interaction'] = weather_data['T2M'] * weather_data['RH2M']
-                    T = weather_data['T2M']
-                    RH = weather_data['RH2M']
-                    features['heat_index'] = T + (0.5 * (T + 61.0 + ((T-68.0)*1.2) + (RH*0.094)))
-                
-                if 'T2M_MAX' in weather_data and 'T2M_MIN' in weather_data:
-                    features['temp_range'] = weather_data['T2M_MAX'] - weather_data['T2M_MIN']
-                
-                # Fill lag and rolling features with current values
-                for i_lag in [1, 3, 7, 14, 30]:
-                    for param in ['T2M', 'T2M_MAX', 'T2M_MIN', 'PRECTOTCORR', 'WS2M', 'RH2M', 'PS', 'CLOUD_AMT']:
-                        features[f'{param}_lag_{i_lag}'] = weather_data.get(param, 0)
-                        
-                for window in [3, 7, 14, 30]:
-                    for param in ['T2M', 'T2M_MAX', 'T2M_MIN', 'PRECTOTCORR', 'WS2M', 'RH2M', 'PS', 'CLOUD_AMT']:
-                        features[f'{param}_rolling_mean_{window}'] = weather_data.get(param, 0)
-                        features[f'{param}_rolling_std_{window}'] = 0
-                        features[f'{param}_rolling_max_{window}'] = weather_data.get(param, 0)
-                        features[f'{param}_rolling_min_{window}'] = weather_data.get(param, 0)
-                
-                # Create DataFrame and predict with trained models
-                feature_df = pd.DataFrame([features])
-                
-                for feature_name in model_loader.feature_names:
-                    if feature_name not in feature_df.columns:
-                        feature_df[feature_name] = 0
-                
-                feature_df = feature_df[model_loader.feature_names]
-                X = feature_df.values
-                
-                # Get predictions from trained models
+        # Target date of each month (roughly 30 days per month)
+        months = [start_date + timedelta(days=i * 30) for i in range(request.months)]
+        dates = [current_date.strftime("%Y-%m-%d") for current_date in months]
+        
+        # Months within the 5-day weather API range share one forecast fetch
+        near_term = [
+            date_str for current_date, date_str in zip(months, dates)
+            if (current_date - start_date).days <= 5 and 0 <= (pd.Timestamp(date_str) - start_date).days <= 5
+        ]
+        weather = {}
+        if near_term:
+            try:
+                with stage('fetch'):
+                    forecast_list = WeatherDataFetcher.fetch_forecast_list(request.latitude, request.longitude)
+                for date_str in near_term:
+                    weather_data = WeatherDataFetcher.closest_forecast(forecast_list, date_str)
+                    if weather_data:
+                        weather[date_str] = weather_data
+            except Exception as e:
+                print(f"Error fetching OpenWeatherMap data: {e}")
+        
+        # Score every month with forecast data at once
+        scored = [date_str for date_str in dates if date_str in weather]
+        probabilities = {}
+        if scored:
+            with stage('features'):
+                X = loader.feature_matrix([
+                    create_weather_features(request.latitude, request.longitude, date_str, weather[date_str],
+                                            loader.climatology)
+                    for date_str in scored
+                ])
+            with stage('inference'):
+                probabilities = loader.predict_batch(X)
+        row_of = {date_str: row for row, date_str in enumerate(scored)}
+        
+        # Every other month from the long-range forecast, in one call
+        long_range_months = [(current_date, date_str) for current_date, date_str in zip(months, dates)
+                             if date_str not in row_of]
+        with stage('statistical'):
+            long_range = dict(zip(
+                [date_str for _, date_str in long_range_months],
+                long_range_forecasts(loader, [
+                    (request.latitude, request.longitude, current_date) for current_date, _ in long_range_months
+                ])
+            ))
+        
+        forecasts = []
+        for current_date, date_str in zip(months, dates):
+            if date_str in row_of:
+                # Predictions from trained models on real forecast data
                 ml_predictions = {}
                 distributions = {}
                 
-                for target, model in model_loader.models.items():
-                    if model_loader.scalers[target] is not None:
-                        X_scaled = model_loader.scalers[target].transform(X)
-                    else:
-                        X_scaled = X
-                    
-                    prob = float(model.predict_proba(X_scaled)[0, 1])
+                for target, values in probabilities.items():
+                    prob = float(values[row_of[date_str]])
                     ml_predictions[target] = prob / 10  # Divide by 10
                     
                     # Use model confidence for distribution
                     # Higher confidence = lower std_dev
-                    model_performance = model_loader.metadata['model_performance'][target]['metrics']
+                    model_performance = loader.metadata['model_performance'][target]['metrics']
                     confidence = model_performance['roc_auc']
                     std_dev = (1 - confidence) * 0.2 + 0.05  # Range: 0.05 to 0.25
                     
@@ -561,26 +783,109 @@ def forecast(request: ForecastRequest):
                     "data_source": "ML Model (Weather API)"
                 })
             else:
-                # Use seasonal forecast for long-range prediction
-                predictions = {param: data['mean'] / 10 for param, data in seasonal_forecast.items()}  # Divide by 10
+                # Use the long-range forecast beyond the weather API range
+                month_forecast, source = long_range[date_str]
+                predictions = {param: data['mean'] / 10 for param, data in month_forecast.items()}  # Divide by 10
                 
                 forecasts.append({
                     "month": current_date.strftime("%Y-%m"),
                     "predictions": predictions,
-                    "distributions": seasonal_forecast,
+                    "distributions": month_forecast,
                     "risk_level": assess_risk_level(predictions),
-                    "data_source": "Statistical Seasonal Model"
+                    "data_source": source
                 })
         
         return {
             "location": {"latitude": request.latitude, "longitude": request.longitude},
             "months_forecasted": request.months,
             "forecasts": forecasts,
-            "model_performance": model_loader.metadata['model_performance'] if MODELS_LOADED else None
+            "model_performance": loader.metadata['model_performance']
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred during forecasting: {e}")
 
+def render_tiles(loader: ModelLoader, date_str: str, z: int, x: int, y: int) -> Dict[str, bytes]:
+    """
+    PNG of one map tile for every target
+
+    Each pixel takes the climatology of its nearest known location for the
+    day of year. Pixels sharing a location share a feature row, so a tile
+    costs one predict_proba call per target over its distinct locations.
+    Pixels beyond climatology.max_distance_km take the seasonal model of
+    their grid cell, scored for the whole tile in one vectorized call.
+    """
+    climatology = loader.climatology
+    latitudes, longitudes = pixel_coordinates(z, x, y, tile_cache.tile_size)
+    grid = nearest_locations(climatology, latitudes, longitudes,
+                             config.get('climatology', {}).get('max_distance_km'))
+    locations, inverse = np.unique(grid, return_inverse=True)
+    inverse = inverse.reshape(grid.shape)
+    
+    day_of_year = pd.Timestamp(date_str).dayofyear
+    scored = [location for location in locations if location >= 0]
+    probabilities = {}
+    if scored:
+        rows = []
+        for location in scored:
+            means = climatology.means[location, day_of_year]
+            weather_data = {col: float(value) for col, value in zip(climatology.columns, means) if not np.isnan(value)}
+            lat, lon = climatology.coordinates[location]
+            rows.append(create_weather_features(lat, lon, date_str, weather_data, climatology))
+        probabilities = loader.predict_batch(loader.feature_matrix(rows))
+    
+    uncovered = grid < 0
+    seasonal = {}
+    if uncovered.any():
+        pixel_latitudes, pixel_longitudes = np.broadcast_arrays(latitudes[:, None], longitudes[None, :])
+        mean, _ = seasonal_forecast(pixel_latitudes[uncovered], pixel_longitudes[uncovered],
+                                    pd.Timestamp(date_str).month)
+        seasonal = dict(zip(SEASONAL_TARGETS, mean.T))
+    
+    tiles = {}
+    for target in loader.store.paths:
+        # Probability of each distinct location (NaN for no location), then per pixel
+        values = np.full(len(locations), np.nan)
+        if target in probabilities:
+            values[locations >= 0] = probabilities[target]
+        pixels = values[inverse]
+        if target in seasonal:
+            pixels[uncovered] = seasonal[target]
+        tiles[target] = encode_png(colorize(pixels))
+    return tiles
+
+@app.get("/tiles/{target}/{z}/{x}/{y}")
+def risk_tile(target: str, z: int, x: int, y: str, date: Optional[str] = None):
+    """
+    Map tile (XYZ, Web Mercator PNG) of one target's risk probability
+
+    For Leaflet/MapLibre overlays, e.g. /tiles/very_hot/{z}/{x}/{y}.png?date=2024-07-01
+    (date defaults to today). Pixels are colored green to red by
+    probability; where no known location is in range they show the
+    seasonal model. Tiles are cached on disk per model version, climatology
+    build and date.
+    """
+    if not MODELS_LOADED:
+        raise HTTPException(status_code=503, detail="ML models are not loaded. Please train models and restart the API.")
+    loader = model_loader
+    if loader.climatology is None:
+        raise HTTPException(status_code=503, detail="Climatology tables not found. Run feature engineering first.")
+    
+    if target not in loader.store.paths:
+        raise HTTPException(status_code=404, detail=f"Unknown target: {target}")
+    try:
+        y = int(y[:-len('.png')] if y.endswith('.png') else y)
+        date_str = pd.Timestamp(date or datetime.now()).strftime("%Y-%m-%d")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid tile request: {e}")
+    if not 0 <= z <= tile_cache.max_zoom or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail=f"No tile {z}/{x}/{y}")
+    
+    with stage('tile'):
+        data = tile_cache.get(loader.store.version, loader.climatology.build_id, date_str, z, x, y, target,
+                              lambda: render_tiles(loader, date_str, z, x, y))
+    max_age = config['api'].get('tiles', {}).get('max_age_seconds', 3600)
+    return Response(content=data, media_type="image/png", headers={"Cache-Control": f"public, max-age={max_age}"})
+
 if __name__ == "__main__":
     import uvicorn
     print("--- Starting Professional Weather API ---")
@@ -0,0 +1,158 @@
+"""
+Region Index Module
+Continent / hemisphere climate patterns of a point, from a grid-bucketed index
+"""
+
+import hashlib
+import json
+import math
+import os
+
+from climatology import EARTH_RADIUS_KM
+
+
+class RegionIndex:
+    """
+    Spatial index over the coordinate_regions boxes of location_mapping.json
+
+    The world is split into cells of cell_degrees; each cell lists the
+    regions whose box overlaps it, in file order. A lookup checks only the
+    boxes of its cell and returns the first that contains the point, which
+    matches the frontend's former scan over every box. Points outside every
+    box fall back to their hemisphere.
+
+    The mapping and every continent and hemisphere file are read once, and
+    each one's patterns are serialized once and served with an ETag.
+    """
+
+    def __init__(self, mapping, continents, hemispheres, cell_degrees=10.0):
+        """
+        Args:
+            mapping: Parsed location_mapping.json
+            continents: Dict of region name -> parsed continent file
+            hemispheres: Dict of 'northern'/'southern' -> parsed hemisphere file
+            cell_degrees: Bucket size in degrees
+        """
+        self.regions = mapping.get('coordinate_regions', {})
+        self.continents = continents
+        self.hemispheres = hemispheres
+        self.cell_degrees = cell_degrees
+        self.n_lat = int(math.ceil(180.0 / cell_degrees))
+        self.n_lon = int(math.ceil(360.0 / cell_degrees))
+
+        self.buckets = [[[] for _ in range(self.n_lon)] for _ in range(self.n_lat)]
+        for name, region in self.regions.items():
+            (lat_min, lat_max), (lon_min, lon_max) = region['lat_range'], region['lon_range']
+            for row in range(self._row(lat_min), self._row(lat_max) + 1):
+                for column in range(self._column(lon_min), self._column(lon_max) + 1):
+                    self.buckets[row][column].append(name)
+
+        # Representative cities of every continent, for nearest_city()
+        self.cities = [
+            dict(city, continent=name)
+            for name, data in continents.items()
+            for city in data.get('representative_cities', [])
+        ]
+
+        # Patterns payload of every continent and hemisphere, serialized once
+        self._payloads = {}
+        for source, files in (('continent', continents), ('hemisphere', hemispheres)):
+            for key, data in files.items():
+                body = json.dumps({
+                    'source': source,
+                    'name': data.get(source, key),
+                    'six_month_patterns': data.get('six_month_patterns', {}),
+                }, separators=(',', ':')).encode()
+                self._payloads[key] = (body, f'"{hashlib.sha1(body).hexdigest()[:16]}"')
+
+    @classmethod
+    def load(cls, data_dir, cell_degrees=10.0):
+        """
+        Read location_mapping.json and the files it references
+
+        Args:
+            data_dir: Directory holding location_mapping.json, continents/
+                and hemispheres/
+            cell_degrees: Bucket size in degrees
+
+        Returns:
+            RegionIndex, or None if data_dir has no location_mapping.json
+        """
+        mapping_path = os.path.join(data_dir, 'location_mapping.json')
+        if not os.path.exists(mapping_path):
+            return None
+        with open(mapping_path) as f:
+            mapping = json.load(f)
+
+        continents = {}
+        for name, region in mapping.get('coordinate_regions', {}).items():
+            path = os.path.join(data_dir, 'continents', region.get('continent_file', f'{name}.json'))
+            if os.path.exists(path):
+                with open(path) as f:
+                    continents[name] = json.load(f)
+
+        hemispheres = {}
+        for name, hemisphere in mapping.get('hemisphere_ranges', {}).items():
+            path = os.path.join(data_dir, 'hemispheres', hemisphere.get('hemisphere_file', f'{name}_hemisphere.json'))
+            if os.path.exists(path):
+                with open(path) as f:
+                    hemispheres[name] = json.load(f)
+
+        return cls(mapping, continents, hemispheres, cell_degrees)
+
+    def _row(self, latitude):
+        return min(max(int((latitude + 90.0) // self.cell_degrees), 0), self.n_lat - 1)
+
+    def _column(self, longitude):
+        return min(max(int((longitude + 180.0) // self.cell_degrees), 0), self.n_lon - 1)
+
+    def region(self, latitude, longitude):
+        """
+        Region of a point
+
+        Returns:
+            Dict with 'continent' (None outside every box), 'hemisphere'
+            ('northern' or 'southern'), 'continent_file' (if matched) and
+            'patterns', the key of its patterns() payload
+        """
+        hemisphere = 'northern' if latitude >= 0 else 'southern'
+        for name in self.buckets[self._row(latitude)][self._column(longitude)]:
+            box = self.regions[name]
+            if (box['lat_range'][0] <= latitude <= box['lat_range'][1]
+                    and box['lon_range'][0] <= longitude <= box['lon_range'][1]):
+                declared = box.get('hemisphere', 'Mixed')
+                region = {
+                    'continent': name,
+                    'hemisphere': hemisphere if declared == 'Mixed' else declared.lower(),
+                    'continent_file': box.get('continent_file'),
+                }
+                break
+        else:
+            region = {'continent': None, 'hemisphere': hemisphere}
+        region['patterns'] = region['continent'] if region['continent'] in self.continents else region['hemisphere']
+        return region
+
+    def nearest_city(self, latitude, longitude):
+        """Closest representative city with its continent and distance in km (or None)"""
+        best, best_distance = None, math.inf
+        lat1 = math.radians(latitude)
+        for city in self.cities:
+            lat2 = math.radians(city['lat'])
+            a = (math.sin((lat2 - lat1) / 2) ** 2
+                 + math.cos(lat1) * math.cos(lat2) * math.sin(math.radians(city['lon'] - longitude) / 2) ** 2)
+            distance = 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(max(a, 0.0), 1.0)))
+            if distance < best_distance:
+                best, best_distance = city, distance
+        return dict(best, distance=round(best_distance, 1)) if best is not None else None
+
+    def patterns(self, key):
+        """
+        Serialized six_month_patterns of a continent or hemisphere and its ETag
+
+        Args:
+            key: Continent name (e.g. 'asia') or 'northern'/'southern'
+
+        Returns:
+            (JSON bytes, ETag), or (None, None) if there is no data
+        """
+        return self._payloads.get(key, (None, None))
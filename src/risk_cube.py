@@ -0,0 +1,297 @@
+"""
+Risk Cube Module
+Precomputed climatological risk per grid cell, day of year and target
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from build_dirs import create_build, publish_build, resolve_build
+from climatology import DAYS
+from history_cache import POWER_GRID
+from model_store import ModelStore, resolve_version
+from risk_tiles import nearest_locations
+
+
+# Directory of the cube inside a model version directory
+CUBE_DIR = 'risk_cube'
+
+# Rows scored per predict_proba call while building
+CHUNK_ROWS = 65536
+
+ARRAYS = ('mean', 'std', 'grid')
+
+
+def cube_path(model_dir):
+    """Directory of the cube belonging to a model version directory"""
+    return os.path.join(model_dir, CUBE_DIR)
+
+
+class RiskCube:
+    """
+    Model risk for every grid cell, day of year and target
+
+    The trained models score every historical feature row; the
+    probabilities are averaged per (location, day of year), over a window of
+    neighbouring days so a few years of history give a smooth seasonal
+    curve. A global grid on the NASA POWER cell spacing maps each cell to
+    the location its risk comes from (the nearest known location within
+    max_distance_km, or none), so the cube is logically cells x days x
+    targets while only storing one curve per location.
+
+    Arrays are saved as .npy files and opened memory-mapped; a lookup
+    reads one grid entry and one row of the curves. Each save is a new build
+    directory (see build_dirs), so rebuilding the cube of the version being
+    served leaves the files the APIs have mapped in place.
+    """
+
+    def __init__(self, targets, locations, coordinates, mean, std, grid,
+                 lat_step=POWER_GRID[0], lon_step=POWER_GRID[1], path=None):
+        """
+        Args:
+            targets: Target names, in table order
+            locations: Location names, in table order
+            coordinates: (n_locations, 2) latitude/longitude
+            mean: (n_locations, 367, n_targets) float16 mean probability
+            std: (n_locations, 367, n_targets) float16 standard deviation of the
+                daily probabilities in the window, over every year and window
+                day (so it includes seasonal change within the window)
+            grid: (n_lat, n_lon) int16 location row of each cell (-1 for none)
+            lat_step, lon_step: Grid spacing in degrees
+            path: Directory the cube was loaded from or saved to
+        """
+        self.targets = list(targets)
+        self.locations = list(locations)
+        self.coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+        self.mean = mean
+        self.std = std
+        self.grid = grid
+        self.lat_step = lat_step
+        self.lon_step = lon_step
+        self.path = path
+
+    @staticmethod
+    def cell_centers(lat_step=POWER_GRID[0], lon_step=POWER_GRID[1]):
+        """Latitudes of the grid rows and longitudes of the grid columns"""
+        n_lat = int(round(180.0 / lat_step)) + 1
+        n_lon = int(round(360.0 / lon_step))
+        latitudes = np.clip(np.arange(n_lat) * lat_step - 90.0, -90.0, 90.0)
+        longitudes = np.arange(n_lon) * lon_step - 180.0
+        return latitudes, longitudes
+
+    @classmethod
+    def build(cls, store, features, window_days=7, max_distance_km=None,
+              lat_step=POWER_GRID[0], lon_step=POWER_GRID[1]):
+        """
+        Score the feature history and aggregate it into the cube
+
+        Args:
+            store: ModelStore of the models to score with
+            features: Engineered features DataFrame with 'location_name',
+                'date', 'latitude', 'longitude' and the model's feature columns
+            window_days: Days on either side of a day of year that count
+                towards its risk (mean and std are over all their rows)
+            max_distance_km: Cells farther than this from every location
+                get no risk
+            lat_step, lon_step: Grid spacing in degrees
+
+        Returns:
+            RiskCube
+        """
+        targets = list(store.paths)
+        codes, locations = pd.factorize(features['location_name'], sort=True)
+        day_of_year = pd.to_datetime(features['date']).dt.dayofyear.to_numpy()
+        cells = codes * DAYS + day_of_year
+        n_cells = len(locations) * DAYS
+
+        sums = np.zeros((n_cells, len(targets)))
+        squares = np.zeros((n_cells, len(targets)))
+        counts = np.bincount(cells, minlength=n_cells).astype(np.float64)
+        for begin in range(0, len(features), CHUNK_ROWS):
+            X = features.iloc[begin:begin + CHUNK_ROWS][store.feature_names].to_numpy(dtype=np.float64)
+            probabilities = store.predict_batch(X)
+            chunk = cells[begin:begin + CHUNK_ROWS]
+            for k, target in enumerate(targets):
+                sums[:, k] += np.bincount(chunk, weights=probabilities[target], minlength=n_cells)
+                squares[:, k] += np.bincount(chunk, weights=probabilities[target] ** 2, minlength=n_cells)
+
+        # Circular window over days 1-366 (row 0 stays unused)
+        shape = (len(locations), DAYS, len(targets))
+        sums, squares = sums.reshape(shape), squares.reshape(shape)
+        counts = counts.reshape(shape[:2])
+
+        def window(values):
+            return sum(np.roll(values[:, 1:], shift, axis=1)
+                       for shift in range(-window_days, window_days + 1))
+        sums[:, 1:], squares[:, 1:], counts[:, 1:] = window(sums), window(squares), window(counts)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = sums / counts[..., None]
+            std = np.sqrt(np.maximum(squares / counts[..., None] - mean ** 2, 0.0))
+
+        coordinates = np.full((len(locations), 2), np.nan)
+        if 'latitude' in features.columns and 'longitude' in features.columns:
+            first_rows = features.groupby(codes)[['latitude', 'longitude']].first()
+            coordinates[first_rows.index] = first_rows.to_numpy(dtype=np.float64)
+
+        cube = cls(targets, list(locations), coordinates, mean.astype(np.float16),
+                   std.astype(np.float16), None, lat_step, lon_step)
+        latitudes, longitudes = cls.cell_centers(lat_step, lon_step)
+        cube.grid = nearest_locations(cube, latitudes, longitudes, max_distance_km).astype(np.int16)
+        return cube
+
+    def save(self, path):
+        """
+        Write the cube as a new build of an artifact directory
+
+        The files go to a fresh build directory and CURRENT is switched to it
+        once they are complete, so readers never see a half-written cube and
+        APIs serving the previous build keep their maps until they reload.
+        """
+        os.makedirs(path, exist_ok=True)
+        _, build_path = create_build(path)
+
+        for name in ARRAYS:
+            np.save(os.path.join(build_path, f'{name}.npy'), np.ascontiguousarray(getattr(self, name)))
+        with open(os.path.join(build_path, 'index.json'), 'w') as f:
+            json.dump({
+                'targets': self.targets,
+                'lat_step': self.lat_step,
+                'lon_step': self.lon_step,
+                'locations': [
+                    {'name': name,
+                     'latitude': None if np.isnan(lat) else lat,
+                     'longitude': None if np.isnan(lon) else lon}
+                    for name, (lat, lon) in zip(self.locations, self.coordinates.tolist())
+                ],
+            }, f, indent=2)
+
+        publish_build(path, os.path.basename(build_path))
+
+        # Cubes saved before builds existed sit directly in path
+        for name in [f'{name}.npy' for name in ARRAYS] + ['index.json']:
+            try:
+                os.remove(os.path.join(path, name))
+            except OSError:
+                pass
+
+        self.path = build_path
+
+    @classmethod
+    def load(cls, path):
+        """
+        Open a saved cube memory-mapped
+
+        Args:
+            path: Cube directory (its current build is opened) or a build
+                directory
+
+        Returns:
+            RiskCube, or None if nothing has been saved at path
+        """
+        _, path = resolve_build(path)
+        index_path = os.path.join(path, 'index.json')
+        if not os.path.exists(index_path):
+            return None
+
+        with open(index_path) as f:
+            index = json.load(f)
+
+        arrays = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r').view(np.ndarray)
+            for name in ARRAYS
+        }
+        locations = index['locations']
+        coordinates = [
+            (np.nan if loc['latitude'] is None else loc['latitude'],
+             np.nan if loc['longitude'] is None else loc['longitude'])
+            for loc in locations
+        ]
+        return cls(index['targets'], [loc['name'] for loc in locations], coordinates,
+                   lat_step=index['lat_step'], lon_step=index['lon_step'], path=path, **arrays)
+
+    def location(self, latitude, longitude):
+        """Location row whose risk a point gets (None outside covered cells)"""
+        row = int(round((min(max(latitude, -90.0), 90.0) + 90.0) / self.lat_step))
+        column = int(round((longitude + 180.0) / self.lon_step)) % self.grid.shape[1]
+        location = int(self.grid[min(row, self.grid.shape[0] - 1), column])
+        return location if location >= 0 else None
+
+    def lookup(self, latitude, longitude, day_of_year):
+        """
+        Risk of every target for a point and day of year
+
+        Returns:
+            Dict of target -> {'mean', 'std_dev'} probabilities, or None if
+            the point is not covered or the day has no history
+        """
+        location = self.location(latitude, longitude)
+        if location is None:
+            return None
+        mean = self.mean[location, day_of_year].astype(np.float64)
+        if np.isnan(mean).any():
+            return None
+        std = self.std[location, day_of_year].astype(np.float64)
+        return {
+            target: {'mean': float(m), 'std_dev': float(s)}
+            for target, m, s in zip(self.targets, mean, std)
+        }
+
+
+def build_for_version(config, model_dir, features):
+    """
+    Build and save the cube of one model version directory
+
+    Args:
+        config: Loaded config.yaml
+        model_dir: Model version directory (metadata.json and models)
+        features: Engineered features DataFrame
+
+    Returns:
+        RiskCube
+    """
+    cube_config = config.get('risk_cube', {})
+    cube = RiskCube.build(
+        ModelStore(model_dir),
+        features,
+        window_days=cube_config.get('window_days', 7),
+        max_distance_km=config.get('climatology', {}).get('max_distance_km'),
+    )
+    cube.save(cube_path(model_dir))
+    return cube
+
+
+def main():
+    """Build the risk cube of the current (or a given) model version"""
+    from storage import WeatherStore
+
+    parser = argparse.ArgumentParser(description='Build the climatological risk cube')
+    parser.add_argument('--version', type=str, help='Model version (default: the current one)')
+    args = parser.parse_args()
+
+    with open('config.yaml', 'r') as f:
+        config = yaml.safe_load(f)
+
+    version, model_dir = resolve_version(config['api']['model_path'], args.version)
+    store = WeatherStore(config)
+    if not store.exists('features'):
+        print(f"Error: {store.dataset_path('features')} not found. Run feature_engineering.py first.")
+        return
+
+    print(f"Loading features from {store.dataset_path('features')}...")
+    features = store.read('features')
+    cube = build_for_version(config, model_dir, features)
+    covered = int((cube.grid >= 0).sum())
+    print(f"✓ Saved risk cube: {cube.path} ({len(cube.locations)} locations, "
+          f"{len(cube.targets)} targets, {covered} grid cells covered)")
+    if version is not None:
+        print(f"  Running APIs pick it up with POST /model/reload?version={version}")
+
+
+if __name__ == "__main__":
+    main()
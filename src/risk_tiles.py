@@ -0,0 +1,311 @@
+"""
+Risk Tiles Module
+Web map tiles of gridded risk probabilities, rendered once and cached on disk
+"""
+
+import os
+import struct
+import tempfile
+import threading
+import zlib
+
+import numpy as np
+
+from climatology import EARTH_RADIUS_KM
+from singleflight import SingleFlight
+
+
+TILE_SIZE = 256
+
+# Probability -> color ramp (green, yellow, red) and opacity of scored pixels
+COLOR_STOPS = (0.0, 0.5, 1.0)
+COLORS = ((26, 152, 80), (254, 224, 139), (215, 48, 39))
+ALPHA = 170
+
+
+def pixel_coordinates(z, x, y, size=TILE_SIZE):
+    """
+    Latitude of each pixel row and longitude of each pixel column of a tile
+
+    Tiles use the Web Mercator (XYZ) scheme of Leaflet, MapLibre and
+    MapTiler; coordinates are pixel centers.
+
+    Returns:
+        (latitudes, longitudes), each a 1D array of length size
+    """
+    n = 2 ** z
+    offsets = (np.arange(size) + 0.5) / size
+    longitudes = (x + offsets) / n * 360.0 - 180.0
+    latitudes = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + offsets) / n))))
+    return latitudes, longitudes
+
+
+def nearest_locations(climatology, latitudes, longitudes, max_distance_km=None):
+    """
+    Climatology row of the location nearest to each pixel
+
+    Matches Climatology.nearest() for every pixel of the grid at once.
+
+    Args:
+        climatology: Climatology (or RiskCube) with location coordinates
+        latitudes: 1D array, one per grid row
+        longitudes: 1D array, one per grid column
+        max_distance_km: Pixels farther than this from every location get -1
+
+    Returns:
+        (rows, columns) int array of table rows (-1 where there is none)
+    """
+    lat1 = np.radians(latitudes)[:, None]
+    lon1 = np.radians(longitudes)[None, :]
+    best = np.full((len(latitudes), len(longitudes)), -1, dtype=np.int64)
+    best_distance = np.full(best.shape, np.inf)
+
+    for location, (lat, lon) in enumerate(climatology.coordinates):
+        if np.isnan(lat) or np.isnan(lon):
+            continue
+        lat2, lon2 = np.radians(lat), np.radians(lon)
+        a = (np.sin((lat2 - lat1) / 2) ** 2
+             + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+        distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+        # Strictly closer, so ties keep the first location like nearest()
+        closer = distance < best_distance
+        best[closer] = location
+        best_distance[closer] = distance[closer]
+
+    if max_distance_km is not None:
+        best[best_distance > max_distance_km] = -1
+    return best
+
+
+def colorize(probabilities):
+    """
+    RGBA pixels for a grid of probabilities (NaN pixels are transparent)
+
+    Returns:
+        (rows, columns, 4) uint8 array
+    """
+    scored = ~np.isnan(probabilities)
+    values = np.clip(np.nan_to_num(probabilities), 0.0, 1.0)
+    rgba = np.zeros(probabilities.shape + (4,), dtype=np.uint8)
+    for channel in range(3):
+        ramp = [color[channel] for color in COLORS]
+        rgba[..., channel] = np.round(np.interp(values, COLOR_STOPS, ramp))
+    rgba[..., 3] = np.where(scored, ALPHA, 0)
+    return rgba
+
+
+def encode_png(rgba):
+    """
+    Encode RGBA pixels as a PNG file
+
+    Args:
+        rgba: (height, width, 4) uint8 array
+
+    Returns:
+        PNG bytes
+    """
+    height, width = rgba.shape[:2]
+    # Every scanline starts with filter type 0 (none)
+    scanlines = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    scanlines[:, 1:] = np.ascontiguousarray(rgba, dtype=np.uint8).reshape(height, -1)
+
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack('>I', len(data)) + body + struct.pack('>I', zlib.crc32(body) & 0xFFFFFFFF)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', header)
+            + chunk(b'IDAT', zlib.compress(scanlines.tobytes(), 6))
+            + chunk(b'IEND', b''))
+
+
+class TileCache:
+    """
+    Rendered tiles on disk, keyed by model version, climatology build, date
+    and tile
+
+    A tile is rendered for every target at once (one inference pass scores
+    them all) and each target's PNG is written to
+    <cache_dir>/<version>/<build>/<date>/<z>/<x>/<y>/<target>.png, so panning
+    back and switching layers are file reads. Files are written to a
+    temporary name and renamed, so readers never see a partial tile, and
+    concurrent requests for a tile that is being rendered wait for that
+    render. Reloading a new model version or climatology starts a new
+    directory; old ones can be deleted at any time, and once the cache grows
+    past its size limit the least recently used tiles are evicted the same
+    way as in PowerCache.
+    """
+
+    # Writes between full scans of the directory, which also pick up tiles
+    # written by other processes
+    SCAN_INTERVAL = 512
+
+    # Size eviction goes down to this fraction of the limit
+    EVICT_TARGET = 0.9
+
+    def __init__(self, cache_dir, tile_size=TILE_SIZE, max_zoom=12, max_size_mb=None):
+        """
+        Args:
+            cache_dir: Directory holding rendered tiles
+            tile_size: Tile width and height in pixels
+            max_zoom: Highest zoom level served
+            max_size_mb: Size limit for the whole cache (None = unbounded)
+        """
+        self.cache_dir = cache_dir
+        self.tile_size = tile_size
+        self.max_zoom = max_zoom
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024) if max_size_mb else None
+        self.in_flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        # Running size of the directory, counted by the last scan plus this
+        # process's writes since (None = not scanned yet)
+        self.size_bytes = None
+        self.writes_since_scan = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """Create the cache from the 'api.tiles' section of config.yaml"""
+        tiles_config = config.get('api', {}).get('tiles', {})
+        return cls(
+            tiles_config.get('cache_dir', 'data/tiles'),
+            tile_size=tiles_config.get('tile_size', TILE_SIZE),
+            max_zoom=tiles_config.get('max_zoom', 12),
+            max_size_mb=tiles_config.get('max_size_mb'),
+        )
+
+    def path(self, version, build, date, z, x, y, target):
+        """File of one target's tile"""
+        return os.path.join(self.cache_dir, version or 'unversioned', build or 'unversioned', date,
+                            str(z), str(x), str(y), f'{target}.png')
+
+    def get(self, version, build, date, z, x, y, target, render):
+        """
+        PNG of a tile, rendering and storing it on a miss
+
+        Args:
+            version: Model version the tile is scored with
+            build: Build of the climatology the tile is scored from
+            date, z, x, y: Tile key
+            target: Target whose PNG to return
+            render: Zero-argument function returning a dict of
+                target -> PNG bytes for the tile
+
+        Returns:
+            PNG bytes, or None if render() has no tile for the target
+        """
+        path = self.path(version, build, date, z, x, y, target)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            self._record(hit=True)
+        except FileNotFoundError:
+            self._record(hit=False)
+        else:
+            # Bump mtime so size eviction drops the least recently used tiles
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            return data
+
+        key = (version, build, date, z, x, y)
+        tiles = self.in_flight.do(key, lambda: self._render(key, render))
+        return tiles.get(target)
+
+    def _render(self, key, render):
+        tiles = render()
+        written = 0
+        for target, data in tiles.items():
+            path = self.path(*key, target)
+            staging = None
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                fd, staging = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tile-')
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(staging, path)
+                written += len(data)
+            except OSError:
+                # An eviction may have removed the directory meanwhile; the
+                # tile is still served and is stored on a later request
+                if staging is not None:
+                    try:
+                        os.remove(staging)
+                    except OSError:
+                        pass
+
+        if self.max_size_bytes is not None and written:
+            with self.lock:
+                if self.size_bytes is not None:
+                    self.size_bytes += written
+                self.writes_since_scan += 1
+                scan = (self.size_bytes is None
+                        or self.writes_since_scan >= self.SCAN_INTERVAL
+                        or self.size_bytes > self.max_size_bytes)
+                if scan:
+                    self.writes_since_scan = 0
+            if scan:
+                self.evict()
+        return tiles
+
+    def evict(self):
+        """
+        Scan the cache directory, remove the least recently used tiles until
+        under the size limit and drop empty directories (old dates, versions
+        and climatology builds)
+        """
+        entries = []
+        for root, _, files in os.walk(self.cache_dir, topdown=False):
+            for name in files:
+                if not name.endswith('.png'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            if not files and root != self.cache_dir:
+                try:
+                    os.rmdir(root)
+                except OSError:
+                    pass
+
+        total_size = sum(size for _, size, _ in entries)
+        if self.max_size_bytes is not None and total_size > self.max_size_bytes:
+            target = self.max_size_bytes * self.EVICT_TARGET
+            entries.sort()
+            for _, size, path in entries:
+                if total_size <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total_size -= size
+
+        with self.lock:
+            self.size_bytes = total_size
+
+    def stats(self):
+        """Counters for health endpoints"""
+        with self.lock:
+            counters = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size_bytes': self.size_bytes,
+            }
+        counters['rendering'] = self.in_flight.stats()
+        return counters
+
+    def _record(self, hit):
+        # Sync endpoints call get() from the threadpool
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
@@ -0,0 +1,143 @@
+"""
+Rolling Statistics Module
+Vectorized rolling mean/std/max/min over many columns and windows at once
+"""
+
+import numpy as np
+
+
+def group_starts(keys):
+    """
+    Index of the first row of each row's group
+
+    Args:
+        keys: Array of group keys, with each group's rows contiguous
+
+    Returns:
+        Integer array with, for every row, the position where its group starts
+    """
+    keys = np.asarray(keys)
+    rows = np.arange(len(keys))
+    first = np.ones(len(keys), dtype=bool)
+    first[1:] = keys[1:] != keys[:-1]
+    return np.maximum.accumulate(np.where(first, rows, 0))
+
+
+def rolling_window_stats(values, starts, windows):
+    """
+    Trailing-window mean, std, max and min for every column and window
+
+    Matches ``groupby(...).rolling(window, min_periods=1)`` on rows sorted by
+    group: NaNs are skipped, std uses ddof=1 and is NaN for windows with fewer
+    than two values.
+
+    Means and variances come from prefix sums. Every window lies inside two
+    consecutive blocks of rows, so the prefix sums restart for each pair of
+    blocks and are centered on the block mean, which keeps them small enough
+    for variances that are exact to rounding. Max and min come from a sparse
+    table of power-of-two spans.
+
+    Args:
+        values: 2D float array (rows x columns), rows sorted by group and date
+        starts: First row of each row's group (see ``group_starts``)
+        windows: Window sizes in rows
+
+    Returns:
+        Dict of window -> (mean, std, max, min), each shaped like values
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n, k = values.shape
+    rows = np.arange(n)
+    longest = max(windows)
+
+    missing = np.isnan(values)
+    has_missing = missing.any()
+
+    block = 1 << max(longest - 1, 1).bit_length()
+    n_blocks = -(-n // block)
+
+    # Block 0 is padding so that every real block has a predecessor
+    padded = np.zeros(((n_blocks + 1) * block, k))
+    padded[block:block + n] = np.where(missing, 0.0, values) if has_missing else values
+    padded = padded.reshape(n_blocks + 1, block, k)
+
+    if has_missing:
+        valid = np.ones(((n_blocks + 1) * block, k), dtype=bool)
+        valid[block:block + n] = ~missing
+        valid = valid.reshape(n_blocks + 1, block, k)
+        counts = valid.sum(axis=1)
+        centers = padded.sum(axis=1) / np.maximum(counts, 1)
+    else:
+        centers = padded.mean(axis=1)
+
+    pairs = np.concatenate([padded[:-1], padded[1:]], axis=1)
+    deviations = pairs - centers[1:, None, :]
+    if has_missing:
+        pair_valid = np.concatenate([valid[:-1], valid[1:]], axis=1)
+        deviations[~pair_valid] = 0.0
+    moments = [deviations, deviations * deviations]
+    if has_missing:
+        moments.append(pair_valid.astype(np.float64))
+
+    prefixes = []
+    for moment in moments:
+        prefix = np.zeros((n_blocks, 2 * block + 1, k))
+        np.cumsum(moment, axis=1, out=prefix[:, 1:])
+        prefixes.append(prefix.reshape(-1, k))
+
+    end = (rows // block) * (2 * block + 1) + block + rows % block + 1
+    ends = [prefix.take(end, axis=0) for prefix in prefixes]
+    row_centers = np.repeat(centers[1:], block, axis=0)[:n]
+
+    # Level j holds the max/min of the 2**j rows starting at each row
+    levels_max = [values]
+    levels_min = [values]
+    span = 1
+    while span * 2 <= longest:
+        upper = levels_max[-1].copy()
+        np.fmax(upper[:-span], levels_max[-1][span:], out=upper[:-span])
+        lower = levels_min[-1].copy()
+        np.fmin(lower[:-span], levels_min[-1][span:], out=lower[:-span])
+        levels_max.append(upper)
+        levels_min.append(lower)
+        span *= 2
+
+    stats = {}
+    for window in windows:
+        start = np.maximum(rows - window + 1, starts)
+        length = rows - start + 1
+        begin = end - length
+
+        sums = [e - prefix.take(begin, axis=0) for e, prefix in zip(ends, prefixes)]
+        s1, s2 = sums[0], sums[1]
+        count = sums[2] if has_missing else length[:, None].astype(np.float64)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = row_centers + s1 / count
+            std = np.sqrt(np.maximum((s2 - s1 * s1 / count) / (count - 1), 0.0))
+
+        level = window.bit_length() - 1
+        right = np.maximum(rows - (1 << level) + 1, 0)
+        rolling_max = np.fmax(levels_max[level].take(start, axis=0), levels_max[level].take(right, axis=0))
+        rolling_min = np.fmin(levels_min[level].take(start, axis=0), levels_min[level].take(right, axis=0))
+
+        # Windows truncated at the start of a group need a smaller level
+        short = np.flatnonzero(length < window)
+        short_levels = np.log2(length[short]).astype(int)
+        for short_level in np.unique(short_levels):
+            at = short[short_levels == short_level]
+            left, right = start[at], at - (1 << short_level) + 1
+            rolling_max[at] = np.fmax(levels_max[short_level][left], levels_max[short_level][right])
+            rolling_min[at] = np.fmin(levels_min[short_level][left], levels_min[short_level][right])
+
+        # Constant windows have exactly zero spread
+        std[rolling_max == rolling_min] = 0.0
+        if has_missing:
+            std[count < 2] = np.nan
+            mean[count == 0] = np.nan
+        else:
+            std[length < 2] = np.nan
+
+        stats[window] = (mean, std, rolling_max, rolling_min)
+
+    return stats
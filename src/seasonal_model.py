@@ -0,0 +1,140 @@
+"""
+Seasonal Model Module
+Climate-zone seasonal risk curves, vectorized with reproducible noise
+"""
+
+import numpy as np
+
+from history_cache import POWER_GRID
+
+
+TARGETS = ('very_hot', 'very_cold', 'very_wet', 'very_windy', 'very_uncomfortable')
+ZONES = ('tropical', 'temperate', 'polar')
+
+# Baseline seasonal patterns [Jan, Feb, ..., Dec] of each zone
+_ZONE_PATTERNS = {
+    'tropical': {
+        'very_hot': [0.7, 0.75, 0.8, 0.85, 0.8, 0.7, 0.65, 0.6, 0.65, 0.7, 0.7, 0.65],
+        'very_cold': [0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0.01],
+        'very_wet': [0.2, 0.2, 0.3, 0.4, 0.6, 0.8, 0.85, 0.8, 0.7, 0.5, 0.3, 0.2],
+    },
+    'temperate': {
+        'very_hot': [0.05, 0.1, 0.2, 0.4, 0.6, 0.8, 0.85, 0.8, 0.6, 0.3, 0.1, 0.05],
+        'very_cold': [0.8, 0.7, 0.5, 0.2, 0.1, 0.01, 0.01, 0.01, 0.1, 0.3, 0.6, 0.8],
+        'very_wet': [0.6, 0.5, 0.5, 0.5, 0.4, 0.4, 0.4, 0.5, 0.6, 0.7, 0.7, 0.6],
+    },
+    'polar': {
+        'very_hot': [0.01, 0.01, 0.01, 0.05, 0.1, 0.2, 0.25, 0.2, 0.1, 0.05, 0.01, 0.01],
+        'very_cold': [0.95, 0.9, 0.8, 0.6, 0.4, 0.2, 0.1, 0.2, 0.4, 0.7, 0.9, 0.95],
+        'very_wet': [0.4, 0.4, 0.3, 0.3, 0.2, 0.2, 0.3, 0.4, 0.5, 0.5, 0.4, 0.4],
+    }
+}
+_WINDY = [0.5, 0.5, 0.6, 0.6, 0.5, 0.4, 0.4, 0.4, 0.5, 0.6, 0.6, 0.5]
+
+
+def _build_patterns():
+    patterns = np.zeros((len(ZONES), len(TARGETS), 12))
+    for z, zone in enumerate(ZONES):
+        curves = _ZONE_PATTERNS[zone]
+        uncomfortable = (curves['very_hot'] if zone == 'tropical'
+                         else np.add(curves['very_hot'], curves['very_wet']) / 2.5)
+        patterns[z] = [curves['very_hot'], curves['very_cold'], curves['very_wet'], _WINDY, uncomfortable]
+    return patterns
+
+
+# (zone, target, month) baseline probability
+PATTERNS = _build_patterns()
+
+def _uniform(keys, streams):
+    """
+    Uniform [0, 1) numbers determined by (key, stream)
+
+    splitmix64 of key * 64 + stream: a counter-based generator, so any
+    draw can be reproduced from its key alone without keeping RNG state.
+
+    Args:
+        keys: (n,) non-negative int array
+        streams: Number of draws per key (at most 64)
+
+    Returns:
+        (n, streams) array
+    """
+    z = keys.astype(np.uint64)[:, None] * np.uint64(64) + np.arange(streams, dtype=np.uint64)
+    z += np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    z ^= z >> np.uint64(31)
+    return (z >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+
+
+def climate_zones(latitudes):
+    """Index into ZONES of each latitude"""
+    absolute = np.abs(np.asarray(latitudes, dtype=np.float64))
+    return np.where(absolute > 60, 2, np.where(absolute > 35, 1, 0))
+
+
+def grid_cells(latitudes, longitudes, lat_step=POWER_GRID[0], lon_step=POWER_GRID[1]):
+    """
+    NASA POWER grid cell of each point
+
+    Returns:
+        (rows, columns) int arrays; row r is centered on latitude
+        r * lat_step - 90 and column c on longitude c * lon_step - 180
+    """
+    n_lon = int(round(360.0 / lon_step))
+    rows = np.round((np.clip(latitudes, -90.0, 90.0) + 90.0) / lat_step).astype(np.int64)
+    columns = np.round((np.asarray(longitudes, dtype=np.float64) + 180.0) / lon_step).astype(np.int64) % n_lon
+    return rows, columns
+
+
+def seasonal_forecast(latitudes, longitudes, months, noise=0.05, seed=0):
+    """
+    Seasonal risk of every target for arrays of points and months
+
+    Points are snapped to the NASA POWER grid. The baseline is the month's
+    value in the curve of the cell's climate zone (by latitude, with seasons
+    shifted by six months in the southern hemisphere), and the noise is
+    drawn from a hash of (grid cell, month, seed), so the result depends
+    only on the cell and month: every call, process and server returns the
+    same values, and each distinct (cell, month) is computed once per call.
+
+    Args:
+        latitudes, longitudes: Arrays of points in degrees
+        months: Array of months (1-12), broadcast against the points
+        noise: Standard deviation of the noise added to the baseline
+        seed: 0-1023, changes every noise draw (0 gives the served values)
+
+    Returns:
+        (mean, std_dev), each an (n, len(TARGETS)) array of probabilities
+    """
+    latitudes, longitudes, months = np.broadcast_arrays(
+        np.asarray(latitudes, dtype=np.float64),
+        np.asarray(longitudes, dtype=np.float64),
+        np.asarray(months, dtype=np.int64),
+    )
+    rows, columns = grid_cells(latitudes.ravel(), longitudes.ravel())
+    n_lon = int(round(360.0 / POWER_GRID[1]))
+    keys, inverse = np.unique((rows * n_lon + columns) * 16 + months.ravel(), return_inverse=True)
+    cell_latitudes = (keys // 16 // n_lon) * POWER_GRID[0] - 90.0
+    cell_months = keys % 16
+
+    # Southern hemisphere seasons run six months behind the curves
+    adjusted = np.where(cell_latitudes < 0, (cell_months + 5) % 12 + 1, cell_months)
+    baseline = PATTERNS[climate_zones(cell_latitudes), :, adjusted - 1]
+
+    n_targets = len(TARGETS)
+    draws = _uniform(keys * 1024 + seed, 3 * n_targets)
+    u1, u2, u3 = draws[:, :n_targets], draws[:, n_targets:2 * n_targets], draws[:, 2 * n_targets:]
+    normal = np.sqrt(-2.0 * np.log1p(-u1)) * np.cos(2.0 * np.pi * u2)
+
+    mean = np.minimum(np.maximum(baseline + noise * normal, 0.01), 0.99)
+    std_dev = 0.05 + 0.1 * u3
+    return mean[inverse], std_dev[inverse]
+
+
+def forecast_dicts(mean, std_dev):
+    """Rows of seasonal_forecast() as target -> {'mean', 'std_dev'} dicts"""
+    return [
+        {target: {"mean": float(m), "std_dev": float(s)} for target, m, s in zip(TARGETS, means, stds)}
+        for means, stds in zip(mean.tolist(), std_dev.tolist())
+    ]
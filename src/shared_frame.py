@@ -0,0 +1,139 @@
+"""
+Shared Frame Module
+DataFrame columns laid out in a single shared memory block for worker processes
+"""
+
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+
+ALIGNMENT = 64
+
+
+class SharedFrame:
+    """
+    A fixed-size table of columns in one ``multiprocessing.shared_memory`` block
+
+    Numeric and boolean columns are stored as-is, datetimes as int64
+    nanoseconds and text columns as int32 codes into a category list, next to
+    an int64 row id column that carries the DataFrame index. Worker processes
+    attach by name from a small picklable spec, so DataFrames never have to be
+    pickled between processes.
+    """
+
+    def __init__(self, shm, layout, n_rows, owner):
+        self.shm = shm
+        self.layout = layout
+        self.n_rows = n_rows
+        self.owner = owner
+
+    @classmethod
+    def create(cls, schema, n_rows, categories=None):
+        """
+        Allocate an empty block
+
+        Args:
+            schema: DataFrame whose columns and dtypes define the layout
+                (rows are ignored)
+            n_rows: Number of rows to allocate
+            categories: Dict of text column -> list of allowed values
+
+        Returns:
+            SharedFrame owning the block (call unlink() when done)
+        """
+        categories = categories or {}
+        layout = []
+        offset = 0
+
+        for name in ['__row_id__'] + list(schema.columns):
+            if name == '__row_id__':
+                kind, dtype, cats = 'index', np.dtype('int64'), None
+            else:
+                kind, dtype, cats = cls._column_kind(schema[name], categories.get(name))
+
+            layout.append((name, kind, dtype.str, offset, cats))
+            offset += -(-max(n_rows, 1) * dtype.itemsize // ALIGNMENT) * ALIGNMENT
+
+        shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        return cls(shm, layout, n_rows, owner=True)
+
+    @classmethod
+    def from_frame(cls, df):
+        """Copy a DataFrame into a new block"""
+        categories = {
+            name: sorted(df[name].dropna().astype(str).unique())
+            for name in df.columns
+            if cls._column_kind(df[name])[0] == 'category'
+        }
+        frame = cls.create(df, len(df), categories)
+        frame.write(df, 0)
+        return frame
+
+    @classmethod
+    def attach(cls, spec):
+        """Open a block created in another process from its spec()"""
+        name, layout, n_rows = spec
+        shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, layout, n_rows, owner=False)
+
+    def spec(self):
+        """Picklable description used by attach()"""
+        return (self.shm.name, self.layout, self.n_rows)
+
+    def write(self, df, start):
+        """Write df's rows (and index) into rows start..start+len(df)"""
+        stop = start + len(df)
+        for name, kind, dtype, offset, cats in self.layout:
+            target = self._array(dtype, offset)[start:stop]
+
+            if kind == 'index':
+                target[:] = np.asarray(df.index, dtype=np.int64)
+            elif kind == 'datetime':
+                target[:] = pd.to_datetime(df[name]).to_numpy(dtype='datetime64[ns]').view(np.int64)
+            elif kind == 'category':
+                target[:] = pd.Categorical(df[name].astype(str), categories=cats).codes
+            else:
+                target[:] = df[name].to_numpy()
+
+    def read(self, start=0, stop=None):
+        """Copy rows start..stop out into a DataFrame"""
+        stop = self.n_rows if stop is None else stop
+        index = None
+        columns = {}
+
+        for name, kind, dtype, offset, cats in self.layout:
+            values = self._array(dtype, offset)[start:stop].copy()
+
+            if kind == 'index':
+                index = values
+            elif kind == 'datetime':
+                columns[name] = values.view('datetime64[ns]')
+            elif kind == 'category':
+                columns[name] = pd.Categorical.from_codes(values, categories=cats).astype(object)
+            else:
+                columns[name] = values
+
+        return pd.DataFrame(columns, index=index)
+
+    def close(self):
+        self.shm.close()
+
+    def unlink(self):
+        """Close and free the block (owner only)"""
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def _array(self, dtype, offset):
+        return np.ndarray((self.n_rows,), dtype=np.dtype(dtype), buffer=self.shm.buf, offset=offset)
+
+    @staticmethod
+    def _column_kind(series, categories=None):
+        """(kind, storage dtype, categories) for a column"""
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return 'datetime', np.dtype('int64'), None
+        if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+            return 'value', series.dtype, None
+        return 'category', np.dtype('int32'), list(categories) if categories is not None else None
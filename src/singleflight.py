@@ -0,0 +1,120 @@
+"""
+Single-Flight Module
+Coalesces concurrent identical upstream fetches into one shared call
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Thread version: callers with the same key share one in-flight call
+
+    The first caller for a key runs the function; callers arriving while it
+    runs wait for it and get the same result (or exception). Nothing is
+    cached afterwards, so the next call after completion fetches again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        """
+        Run fn() once for all concurrent callers with this key
+
+        Args:
+            key: Hashable identity of the fetch
+            fn: Zero-argument function doing the fetch
+
+        Returns:
+            fn()'s result
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result()
+
+    def stats(self):
+        """Counters for health endpoints"""
+        return {'in_flight': len(self._calls), 'calls': self.calls, 'shared': self.shared}
+
+
+class AsyncSingleFlight:
+    """
+    asyncio version: coroutines with the same key share one in-flight task
+
+    The shared task is shielded from individual waiters, so one caller
+    being cancelled doesn't fail the others; it is cancelled only when every
+    waiter has gone away.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key, fn):
+        """
+        Await fn() once for all concurrent callers with this key
+
+        Args:
+            key: Hashable identity of the fetch
+            fn: Zero-argument coroutine function doing the fetch
+
+        Returns:
+            fn()'s result
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _AsyncCall(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self.calls += 1
+        else:
+            self.shared += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self):
+        """Counters for health endpoints"""
+        return {'in_flight': len(self._calls), 'calls': self.calls, 'shared': self.shared}
+
+
+class _AsyncCall:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
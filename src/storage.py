@@ -0,0 +1,272 @@
+"""
+Storage Module
+Partitioned Parquet datasets shared by the data pipeline stages
+"""
+
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+# Dataset name -> (config path key, directory name, legacy CSV file)
+DATASETS = {
+    'raw': ('raw_data_path', 'power', 'all_locations_raw.csv'),
+    'labeled': ('processed_data_path', 'labeled', 'labeled_data.csv'),
+    'features': ('processed_data_path', 'features', 'features_engineered.csv'),
+}
+
+LABEL_COLUMNS = ['very_hot', 'very_cold', 'very_windy', 'very_wet', 'very_uncomfortable']
+
+PARTITION_FILE = 'data.parquet'
+
+
+class WeatherStore:
+    """
+    Reads and writes weather datasets as Parquet partitioned by location and year
+
+    Layout: ``<dataset>/location_name=<name>/year=<yyyy>/data.parquet``. Each
+    partition holds one typed, compressed file sorted by date, so readers can
+    skip whole partitions for location and date filters and only decode the
+    requested columns.
+    """
+
+    def __init__(self, config):
+        """Initialize with the loaded config.yaml"""
+        self.config = config
+        storage_config = config.get('storage', {})
+        self.compression = storage_config.get('compression', 'zstd')
+
+    def dataset_path(self, name):
+        """Directory of a dataset"""
+        path_key, directory, _ = DATASETS[name]
+        return os.path.join(self.config['data'][path_key], directory)
+
+    def legacy_csv_path(self, name):
+        """CSV file written by earlier versions of the pipeline"""
+        path_key, _, csv_name = DATASETS[name]
+        return os.path.join(self.config['data'][path_key], csv_name)
+
+    def exists(self, name):
+        """True if the dataset has been written (as Parquet or legacy CSV)"""
+        return bool(self._partitions(name)) or os.path.exists(self.legacy_csv_path(name))
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def write(self, name, df, mode='overwrite'):
+        """
+        Write a DataFrame to a dataset
+
+        Args:
+            name: Dataset name ('raw', 'labeled' or 'features')
+            df: DataFrame with 'date' and 'location_name' columns
+            mode: 'overwrite' replaces the whole dataset, 'replace_locations'
+                replaces only the locations present in df, 'append' adds the
+                rows to existing partitions (existing dates are replaced)
+        """
+        root = self.dataset_path(name)
+        df = self._typed(df)
+
+        if mode == 'append' and not self._partitions(name) and os.path.exists(self.legacy_csv_path(name)):
+            # Migrate CSV history first so appended rows don't hide it
+            self.write(name, self._read_legacy_csv(name, None, None, None, None))
+
+        if mode == 'overwrite' and os.path.exists(root):
+            shutil.rmtree(root)
+        elif mode == 'replace_locations':
+            for location in df['location_name'].unique():
+                shutil.rmtree(self._location_dir(root, location), ignore_errors=True)
+
+        years = df['date'].dt.year
+        for (location, year), part in df.groupby([df['location_name'], years], sort=True):
+            path = os.path.join(self._location_dir(root, location), f"year={year}", PARTITION_FILE)
+
+            if mode == 'append' and os.path.exists(path):
+                stored = pq.read_table(path).to_pandas()
+                part = pd.concat([stored[~stored['date'].isin(part['date'])], part[stored.columns]])
+
+            self._write_partition(path, part.sort_values('date'))
+
+    def _write_partition(self, path, part):
+        """Atomically write a single partition file"""
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        table = pa.Table.from_pandas(part, preserve_index=False)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        os.close(fd)
+        pq.write_table(table, tmp_path, compression=self.compression)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _typed(df):
+        """
+        Normalize column types before writing
+
+        Every partition of a column must get the same type whatever its
+        values, since readers take the schema of one file, so integer
+        columns are not downcast per write: labels are int8, other
+        integers int64.
+        """
+        df = df.copy()
+        df['date'] = pd.to_datetime(df['date'])
+        df['location_name'] = df['location_name'].astype(str)
+
+        for col in df.select_dtypes(include=['integer']).columns:
+            df[col] = df[col].astype('int8' if col in LABEL_COLUMNS else 'int64')
+        for col in LABEL_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].astype('int8')
+
+        return df.reset_index(drop=True)
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def read(self, name, columns=None, start=None, end=None, locations=None):
+        """
+        Read a dataset with column projection and date/location filters
+
+        Args:
+            name: Dataset name
+            columns: Columns to load (None = all)
+            start: First date to include (inclusive)
+            end: Last date to include (inclusive)
+            locations: Location names to include (None = all)
+
+        Returns:
+            DataFrame sorted by location and date
+        """
+        start = pd.to_datetime(start) if start is not None else None
+        end = pd.to_datetime(end) if end is not None else None
+
+        partitions = self._partitions(name)
+        if not partitions:
+            return self._read_legacy_csv(name, columns, start, end, locations)
+
+        files = [
+            path for location, year, path in partitions
+            if (locations is None or location in locations)
+            and (start is None or year >= start.year)
+            and (end is None or year <= end.year)
+        ]
+        if not files:
+            return pd.DataFrame(columns=columns) if columns else pd.DataFrame()
+
+        dataset = ds.dataset(files, format='parquet', schema=self._unified_schema(files))
+        date_type = dataset.schema.field('date').type
+
+        expression = None
+        if start is not None:
+            expression = ds.field('date') >= pa.scalar(start, type=date_type)
+        if end is not None:
+            upper = ds.field('date') <= pa.scalar(end, type=date_type)
+            expression = upper if expression is None else expression & upper
+
+        table = dataset.to_table(columns=columns, filter=expression)
+        return table.to_pandas()
+
+    @staticmethod
+    def _unified_schema(files):
+        """
+        Schema that every partition file can be read as
+
+        Partitions written before integer types were fixed may store a
+        column as int8 in one file and int16 in another; such columns are
+        read as the widest of their types.
+
+        Returns:
+            pyarrow.Schema, or None when all files share one schema
+        """
+        schemas = [pq.read_schema(path) for path in files]
+        first = schemas[0]
+        if all(schema.equals(first) for schema in schemas[1:]):
+            return None
+
+        widest = {}
+        for schema in schemas:
+            for field in schema:
+                current = widest.get(field.name)
+                if current is None or (pa.types.is_integer(field.type) and pa.types.is_integer(current.type)
+                                       and field.type.bit_width > current.type.bit_width):
+                    widest[field.name] = field
+        return pa.schema(list(widest.values()))
+
+    def columns(self, name):
+        """Column names of a dataset without loading any rows"""
+        partitions = self._partitions(name)
+        if partitions:
+            return pq.read_schema(partitions[0][2]).names
+        return list(pd.read_csv(self.legacy_csv_path(name), nrows=0).columns)
+
+    def last_dates(self, name):
+        """
+        Most recent stored date for every location
+
+        Only the latest year partition of each location is read.
+
+        Returns:
+            Dict of location_name -> Timestamp
+        """
+        partitions = self._partitions(name)
+        if not partitions:
+            if not os.path.exists(self.legacy_csv_path(name)):
+                return {}
+            stored = self._read_legacy_csv(name, ['location_name', 'date'], None, None, None)
+            return stored.groupby('location_name')['date'].max().to_dict()
+
+        latest = {}
+        for location, year, path in partitions:
+            latest[location] = path  # partitions are sorted, the last one wins
+
+        return {
+            location: pd.Timestamp(pq.read_table(path, columns=['date'])['date'].to_pandas().max())
+            for location, path in latest.items()
+        }
+
+    def _read_legacy_csv(self, name, columns, start, end, locations):
+        """Fallback for data written before the Parquet store existed"""
+        csv_path = self.legacy_csv_path(name)
+        if not os.path.exists(csv_path):
+            raise FileNotFoundError(f"Dataset '{name}' not found in {self.dataset_path(name)} or {csv_path}")
+
+        usecols = None if columns is None else list(dict.fromkeys(list(columns) + ['date', 'location_name']))
+        df = pd.read_csv(csv_path, usecols=usecols, parse_dates=['date'])
+        if start is not None:
+            df = df[df['date'] >= start]
+        if end is not None:
+            df = df[df['date'] <= end]
+        if locations is not None:
+            df = df[df['location_name'].isin(locations)]
+        if columns is not None:
+            df = df[list(columns)]
+        return df.reset_index(drop=True)
+
+    def _partitions(self, name):
+        """Sorted list of (location, year, path) for a dataset"""
+        root = self.dataset_path(name)
+        if not os.path.isdir(root):
+            return []
+
+        partitions = []
+        for location_dir in sorted(os.listdir(root)):
+            if not location_dir.startswith('location_name='):
+                continue
+            location = location_dir.split('=', 1)[1]
+            for year_dir in sorted(os.listdir(os.path.join(root, location_dir))):
+                path = os.path.join(root, location_dir, year_dir, PARTITION_FILE)
+                if year_dir.startswith('year=') and os.path.exists(path):
+                    partitions.append((location, int(year_dir.split('=', 1)[1]), path))
+
+        return partitions
+
+    @staticmethod
+    def _location_dir(root, location):
+        return os.path.join(root, f"location_name={location}")
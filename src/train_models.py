@@ -6,9 +6,15 @@ import pandas as pd
 import numpy as np
 import yaml
 import os
-import joblib
+import io
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
 from datetime import datetime
 import json
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 
 from sklearn.model_selection import train_test_split, cross_val_score
 from sklearn.linear_model import LogisticRegression
@@ -23,18 +29,43 @@ from sklearn.calibration import CalibratedClassifierCV, calibration_curve
 
 import xgboost as xgb
 import lightgbm as lgb
+from threadpoolctl import threadpool_limits
 
 import warnings
 warnings.filterwarnings('ignore')
 
+from model_store import create_version, publish_version, save_artifact
+from compiled_models import CHECK_ROWS, export_model
+from risk_cube import build_for_version
+from storage import WeatherStore
+
+
+# Model families trained for every target: training method and display name
+MODEL_FAMILIES = {
+    'logistic_regression': ('train_logistic_regression', "Logistic Regression"),
+    'random_forest': ('train_random_forest', "Random Forest"),
+    'xgboost': ('train_xgboost', "XGBoost"),
+    'lightgbm': ('train_lightgbm', "LightGBM"),
+}
+
+# Order parallel jobs are started in (slowest first, so the pool drains evenly)
+JOB_ORDER = ('random_forest', 'xgboost', 'lightgbm', 'logistic_regression')
+
+# Families that fit on one thread whatever they are given
+SINGLE_THREADED = {'logistic_regression'}
+
 
 class WeatherModelTrainer:
     """Trains and evaluates models for extreme weather prediction"""
     def __init__(self, config_path="config.yaml"):
         """Initialize with configuration"""
+        self.config_path = config_path
         with open(config_path, 'r') as f:
             self.config = yaml.safe_load(f)
         
+        # Threads each model fits with (-1 = all cores)
+        self.n_jobs = -1
+        
         self.models = {}
         self.scalers = {}
         self.feature_names = []
@@ -43,6 +74,48 @@ class WeatherModelTrainer:
         # Create model directory
         os.makedirs(self.config['api']['model_path'], exist_ok=True)
     
+    def feature_columns(self, df):
+        """Columns of df the models are trained on"""
+        # Define label columns to exclude from features
+        label_columns = ['very_hot', 'very_cold', 'very_windy', 'very_wet', 'very_uncomfortable']
+        
+        # Also exclude non-feature columns
+        exclude_columns = ['date', 'location_name', 'latitude', 'longitude'] + label_columns
+        
+        return [col for col in df.columns if col not in exclude_columns]
+    
+    def split_rows(self, df, target_column):
+        """
+        Row positions (in df order) of the train, validation and test sets
+        
+        Returns:
+            (train, val, test) integer arrays; with a chronological split
+            each set is in date order
+        """
+        y = df[target_column].values
+        
+        # Chronological split if enabled
+        if self.config['training']['chronological_split']:
+            # Sort by date, then split: 60% train, 20% validation, 20% test
+            order = df.reset_index(drop=True).sort_values('date').index.to_numpy()
+            train_size = int(0.6 * len(order))
+            val_size = int(0.2 * len(order))
+            return order[:train_size], order[train_size:train_size + val_size], order[train_size + val_size:]
+        
+        # Use stratified random split for better validation
+        positions = np.arange(len(df))
+        temp, test = train_test_split(
+            positions, test_size=self.config['training']['test_size'],
+            random_state=self.config['training']['random_seed'],
+            stratify=y
+        )
+        train, val = train_test_split(
+            temp, test_size=self.config['training']['validation_size'],
+            random_state=self.config['training']['random_seed'],
+            stratify=y[temp]
+        )
+        return train, val, test
+    
     def prepare_data(self, df, target_column):
         """
         Prepare data for training
@@ -56,60 +129,22 @@ class WeatherModelTrainer:
         """
         print(f"\nPreparing data for {target_column}...")
         
-        # Define label columns to exclude from features
-        label_columns = ['very_hot', 'very_cold', 'very_windy', 'very_wet', 'very_uncomfortable']
-        
-        # Also exclude non-feature columns
-        exclude_columns = ['date', 'location_name', 'latitude', 'longitude'] + label_columns
-        
         # Get feature columns
-        feature_columns = [col for col in df.columns if col not in exclude_columns]
+        feature_columns = self.feature_columns(df)
         
         X = df[feature_columns].values
         y = df[target_column].values
+        train, val, test = self.split_rows(df, target_column)
         
-        # Chronological split if enabled
-        if self.config['training']['chronological_split']:
-            # Sort by date
-            df_sorted = df.sort_values('date').reset_index(drop=True)
-            X = df_sorted[feature_columns].values
-            y = df_sorted[target_column].values
-            
-            # Split: 60% train, 20% validation, 20% test
-            train_size = int(0.6 * len(X))
-            val_size = int(0.2 * len(X))
-            
-            X_train = X[:train_size]
-            y_train = y[:train_size]
-            
-            X_val = X[train_size:train_size + val_size]
-            y_val = y[train_size:train_size + val_size]
-            
-            X_test = X[train_size + val_size:]
-            y_test = y[train_size + val_size:]
-            
-            print(f"  Chronological split:")
-            print(f"    Train: {len(X_train)} samples")
-            print(f"    Validation: {len(X_val)} samples")
-            print(f"    Test: {len(X_test)} samples")
-        else:
-            # Use stratified random split for better validation
-            X_temp, X_test, y_temp, y_test = train_test_split(
-                X, y, test_size=self.config['training']['test_size'],
-                random_state=self.config['training']['random_seed'],
-                stratify=y
-            )
-
-            X_train, X_val, y_train, y_val = train_test_split(
-                X_temp, y_temp, test_size=self.config['training']['validation_size'],
-                random_state=self.config['training']['random_seed'],
-                stratify=y_temp
-            )
-
-            print(f"  Stratified random split:")
-            print(f"    Train: {len(X_train)} samples")
-            print(f"    Validation: {len(X_val)} samples")
-            print(f"    Test: {len(X_test)} samples")
+        X_train, y_train = X[train], y[train]
+        X_val, y_val = X[val], y[val]
+        X_test, y_test = X[test], y[test]
+        
+        split = "Chronological" if self.config['training']['chronological_split'] else "Stratified random"
+        print(f"  {split} split:")
+        print(f"    Train: {len(X_train)} samples")
+        print(f"    Validation: {len(X_val)} samples")
+        print(f"    Test: {len(X_test)} samples")
 
         # Check class balance
         train_positive_pct = (y_train.sum() / len(y_train)) * 100
@@ -153,7 +188,7 @@ class WeatherModelTrainer:
             min_samples_split=rf_config['min_samples_split'],
             class_weight=rf_config['class_weight'],
             random_state=self.config['training']['random_seed'],
-            n_jobs=-1
+            n_jobs=self.n_jobs
         )
         model.fit(X_train, y_train)
         
@@ -180,7 +215,8 @@ class WeatherModelTrainer:
             scale_pos_weight=scale_pos_weight,
             random_state=self.config['training']['random_seed'],
             eval_metric='logloss',
-            use_label_encoder=False
+            use_label_encoder=False,
+            n_jobs=self.n_jobs
         )
         
         model.fit(
@@ -212,6 +248,7 @@ class WeatherModelTrainer:
             num_leaves=lgb_config['num_leaves'],
             scale_pos_weight=scale_pos_weight,
             random_state=self.config['training']['random_seed'],
+            n_jobs=self.n_jobs,
             verbose=-1
         )
         
@@ -268,6 +305,23 @@ class WeatherModelTrainer:
         
         return metrics
     
+    def train_family(self, family, X_train, y_train, X_val, y_val, X_test, y_test, target_column):
+        """
+        Train and evaluate one model family for a target
+        
+        Returns:
+            Dict with 'model', 'scaler', 'metrics' and 'val_auc'
+        """
+        method, display_name = MODEL_FAMILIES[family]
+        model, scaler, val_auc = getattr(self, method)(X_train, y_train, X_val, y_val)
+        metrics = self.evaluate_model(model, scaler, X_test, y_test, display_name, target_column)
+        return {
+            'model': model,
+            'scaler': scaler,
+            'metrics': metrics,
+            'val_auc': val_auc
+        }
+    
     def train_all_models_for_target(self, df, target_column):
         """
         Train all model types for a specific target
@@ -285,66 +339,9 @@ class WeatherModelTrainer:
 
         self.feature_names = feature_names
 
-        results = {}
-
-        # Train Logistic Regression
-        lr_model, lr_scaler, lr_val_auc = self.train_logistic_regression(
-            X_train, y_train, X_val, y_val
-        )
-        lr_metrics = self.evaluate_model(
-            lr_model, lr_scaler, X_test, y_test,
-            "Logistic Regression", target_column
-        )
-        results['logistic_regression'] = {
-            'model': lr_model,
-            'scaler': lr_scaler,
-            'metrics': lr_metrics,
-            'val_auc': lr_val_auc
-        }
-
-        # Train Random Forest
-        rf_model, _, rf_val_auc = self.train_random_forest(
-            X_train, y_train, X_val, y_val
-        )
-        rf_metrics = self.evaluate_model(
-            rf_model, None, X_test, y_test,
-            "Random Forest", target_column
-        )
-        results['random_forest'] = {
-            'model': rf_model,
-            'scaler': None,
-            'metrics': rf_metrics,
-            'val_auc': rf_val_auc
-        }
-
-        # Train XGBoost
-        xgb_model, _, xgb_val_auc = self.train_xgboost(
-            X_train, y_train, X_val, y_val
-        )
-        xgb_metrics = self.evaluate_model(
-            xgb_model, None, X_test, y_test,
-            "XGBoost", target_column
-        )
-        results['xgboost'] = {
-            'model': xgb_model,
-            'scaler': None,
-            'metrics': xgb_metrics,
-            'val_auc': xgb_val_auc
-        }
-
-        # Train LightGBM
-        lgb_model, _, lgb_val_auc = self.train_lightgbm(
-            X_train, y_train, X_val, y_val
-        )
-        lgb_metrics = self.evaluate_model(
-            lgb_model, None, X_test, y_test,
-            "LightGBM", target_column
-        )
-        results['lightgbm'] = {
-            'model': lgb_model,
-            'scaler': None,
-            'metrics': lgb_metrics,
-            'val_auc': lgb_val_auc
+        results = {
+            family: self.train_family(family, X_train, y_train, X_val, y_val, X_test, y_test, target_column)
+            for family in MODEL_FAMILIES
         }
         
         # Select best model based on validation AUC
@@ -353,13 +350,156 @@ class WeatherModelTrainer:
         
         return results, best_model_name
     
-    def save_models(self, all_results):
-        """Save trained models and metadata"""
+    def resolve_jobs(self, n_jobs=None):
+        """CPU budget for training (None = config, -1 = all cores)"""
+        if n_jobs is None:
+            n_jobs = self.config['training'].get('n_jobs', 1)
+        if n_jobs is None or n_jobs < 1:
+            n_jobs = os.cpu_count() or 1
+        return n_jobs
+    
+    def train_all(self, df, targets, n_jobs=None):
+        """
+        Train every model family for every target and pick each target's best
+        
+        Args:
+            df: DataFrame with features and labels
+            targets: Target columns to train (missing ones are skipped)
+            n_jobs: CPU budget (None = config, -1 = all cores); with more
+                than one core the (target, family) fits run in parallel
+        
+        Returns:
+            Dict of target -> {'models', 'best_model'} for save_models()
+        """
+        targets = [target for target in targets if target in df.columns]
+        n_jobs = self.resolve_jobs(n_jobs)
+        if n_jobs == 1:
+            all_results = {}
+            for target in targets:
+                results, best_model_name = self.train_all_models_for_target(df, target)
+                all_results[target] = {
+                    'models': results,
+                    'best_model': best_model_name
+                }
+            return all_results
+        return self.train_parallel(df, targets, n_jobs)
+    
+    def train_parallel(self, df, targets, n_jobs):
+        """
+        Run the (target, family) fits in a process pool within a CPU budget
+        
+        The feature matrix is written once to a temporary .npy file that
+        every worker memory-maps, laid out in the first target's split order,
+        so with a chronological split (the same for every target) each
+        worker's train/validation/test sets are slices of the shared pages;
+        only labels and row positions are written per target.
+        
+        Jobs start slowest family first. Each gets an equal share of the
+        cores that are free when it starts, spread over the jobs still
+        waiting: while the queue is long every fit runs single-threaded in
+        its own process, and the last fits get the cores the finished ones
+        released. Progress is printed as jobs finish.
+        
+        Returns:
+            Dict of target -> {'models', 'best_model'}, as train_all()
+        """
+        print("\n" + "="*60)
+        print(f"Training {len(targets)} targets x {len(MODEL_FAMILIES)} model families ({n_jobs} cores)")
+        print("="*60)
+        
+        self.feature_names = self.feature_columns(df)
+        splits = {target: self.split_rows(df, target) for target in targets}
+        
+        # Shared matrix in the first target's split order, positions remapped into it
+        layout = np.concatenate(splits[targets[0]])
+        slot = np.empty(len(df), dtype=np.int64)
+        slot[layout] = np.arange(len(layout))
+        
+        data_dir = tempfile.mkdtemp(prefix='training-')
+        try:
+            X = np.lib.format.open_memmap(os.path.join(data_dir, 'X.npy'), mode='w+', dtype=np.float64,
+                                          shape=(len(layout), len(self.feature_names)))
+            X[:] = df[self.feature_names].to_numpy(dtype=np.float64)[layout]
+            X.flush()
+            del X
+            
+            for target in targets:
+                y = df[target].to_numpy()[layout]
+                train, val, test = (slot[rows] for rows in splits[target])
+                np.savez(os.path.join(data_dir, f'{target}.npz'), y=y, train=train, val=val, test=test)
+                print(f"  {target}: {len(train)} train / {len(val)} validation / {len(test)} test, "
+                      f"{y[train].mean() * 100:.2f}% positive in train")
+            
+            queue = [(target, family) for family in JOB_ORDER for target in targets]
+            results = {target: {} for target in targets}
+            running = {}
+            free = n_jobs
+            finished = 0
+            started = time.perf_counter()
+            
+            with ProcessPoolExecutor(max_workers=min(n_jobs, len(queue))) as executor:
+                while queue or running:
+                    while queue and free > 0:
+                        target, family = queue.pop(0)
+                        waiting = len(queue) + 1
+                        threads = 1 if family in SINGLE_THREADED else max(1, free // waiting)
+                        future = executor.submit(_train_job, self.config_path, data_dir, target, family, threads)
+                        running[future] = (target, family, threads)
+                        free -= threads
+                    
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        target, family, threads = running.pop(future)
+                        free += threads
+                        finished += 1
+                        result, seconds = future.result()
+                        results[target][family] = result
+                        print(f"  [{finished}/{finished + len(running) + len(queue)}] {target} / "
+                              f"{MODEL_FAMILIES[family][1]}: val ROC-AUC {result['val_auc']:.4f}, "
+                              f"test ROC-AUC {result['metrics']['roc_auc']:.4f} "
+                              f"({seconds:.1f}s on {threads} thread{'s' if threads > 1 else ''})")
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+        
+        print(f"\n✓ Trained {finished} models in {time.perf_counter() - started:.1f}s")
+        
+        all_results = {}
+        for target in targets:
+            # Same family order as a serial run, so ties pick the same model
+            models = {family: results[target][family] for family in MODEL_FAMILIES}
+            best_model_name = max(models, key=lambda k: models[k]['val_auc'])
+            print(f"  ✓ Best model for {target}: {best_model_name} (Val AUC: {models[best_model_name]['val_auc']:.4f})")
+            all_results[target] = {
+                'models': models,
+                'best_model': best_model_name
+            }
+        return all_results
+    
+    def save_models(self, all_results, features=None):
+        """
+        Save trained models and metadata
+        
+        Args:
+            all_results: Dict of target -> {'models', 'best_model'}
+            features: Engineered features the models were trained on; when
+                given, the version's climatological risk cube is built from
+                them before it is published, and a sample of rows is saved
+                with each compiled model to check it against the original
+        """
         print("\n" + "="*60)
         print("Saving models...")
         print("="*60)
         
-        model_dir = self.config['api']['model_path']
+        # Each run is a new registry version; the APIs pick it up once published
+        registry_dir = self.config['api']['model_path']
+        version, model_dir = create_version(registry_dir)
+        print(f"Model version: {version}")
+        
+        check_rows = None
+        if features is not None:
+            check_rows = features[self.feature_names].sample(
+                min(CHECK_ROWS, len(features)), random_state=0
+            ).to_numpy(dtype=np.float64)
         
         # Save each target's best model
         for target, results_dict in all_results.items():
@@ -368,22 +508,33 @@ class WeatherModelTrainer:
             
             # Save model
             model_path = os.path.join(model_dir, f"{target}_{best_model_name}.pkl")
-            joblib.dump(best_model_data['model'], model_path)
+            save_artifact(best_model_data['model'], model_path)
             print(f"✓ Saved {target} model: {model_path}")
             
             # Save scaler if exists
             if best_model_data['scaler'] is not None:
                 scaler_path = os.path.join(model_dir, f"{target}_{best_model_name}_scaler.pkl")
-                joblib.dump(best_model_data['scaler'], scaler_path)
+                save_artifact(best_model_data['scaler'], scaler_path)
                 print(f"✓ Saved {target} scaler: {scaler_path}")
+            
+            # Flat-array export for api.model_store.backend: compiled
+            try:
+                compiled_path, difference = export_model(
+                    best_model_data['model'], model_path, best_model_data['scaler'], check_rows
+                )
+                checked = f" (max probability difference {difference:.2e})" if difference is not None else ""
+                print(f"✓ Saved compiled {target} model: {compiled_path}{checked}")
+            except ValueError as e:
+                print(f"  {target} model not compiled - {e}")
         
         # Save feature names
         feature_path = os.path.join(model_dir, "feature_names.pkl")
-        joblib.dump(self.feature_names, feature_path)
+        save_artifact(self.feature_names, feature_path)
         print(f"✓ Saved feature names: {feature_path}")
         
         # Save metadata
         metadata = {
+            'version': version,
             'targets': list(all_results.keys()),
             'feature_count': len(self.feature_names),
             'trained_date': datetime.now().isoformat(),
@@ -401,42 +552,76 @@ class WeatherModelTrainer:
         with open(metadata_path, 'w') as f:
             json.dump(metadata, f, indent=2)
         print(f"✓ Saved metadata: {metadata_path}")
+        
+        # Long-range predictions read the cube of the version being served
+        if features is not None:
+            try:
+                cube = build_for_version(self.config, model_dir, features)
+                print(f"✓ Saved risk cube: {cube.path}")
+            except Exception as e:
+                print(f"Warning: Could not build the risk cube - {e}")
+        
+        publish_version(registry_dir, version)
+        print(f"✓ Published model version {version} (running APIs reload it automatically)")
+
+
+def _train_job(config_path, data_dir, target, family, threads):
+    """
+    Worker: train and evaluate one model family for one target
+    
+    Reads the shared feature matrix memory-mapped, and caps every native
+    thread pool (OpenMP, BLAS) of the process at threads.
+    
+    Returns:
+        (result dict as train_family(), seconds)
+    """
+    started = time.perf_counter()
+    X = np.load(os.path.join(data_dir, 'X.npy'), mmap_mode='r')
+    with np.load(os.path.join(data_dir, f'{target}.npz')) as arrays:
+        y, train, val, test = arrays['y'], arrays['train'], arrays['val'], arrays['test']
+    
+    def rows(positions):
+        # Contiguous positions are a view of the shared pages
+        if len(positions) and np.array_equal(positions, np.arange(positions[0], positions[0] + len(positions))):
+            return X[positions[0]:positions[-1] + 1]
+        return X[positions]
+    
+    trainer = WeatherModelTrainer(config_path)
+    trainer.n_jobs = threads
+    with threadpool_limits(limits=threads), contextlib.redirect_stdout(io.StringIO()):
+        result = trainer.train_family(family, rows(train), y[train], rows(val), y[val],
+                                      rows(test), y[test], target)
+    return result, time.perf_counter() - started
 
 
 def main():
     """Main execution function"""
+    parser = argparse.ArgumentParser(description='Train models for every extreme weather target')
+    parser.add_argument('--workers', type=int,
+                        help='CPU budget for training (-1 = all cores, 1 = one model at a time)')
+    args = parser.parse_args()
+    
     trainer = WeatherModelTrainer()
     
     # Load engineered features
-    features_path = os.path.join(
-        trainer.config['data']['processed_data_path'],
-        'features_engineered.csv'
-    )
+    store = WeatherStore(trainer.config)
     
-    if not os.path.exists(features_path):
-        print(f"Error: {features_path} not found. Run feature_engineering.py first.")
+    if not store.exists('features'):
+        print(f"Error: {store.dataset_path('features')} not found. Run feature_engineering.py first.")
         return
     
-    print(f"Loading features from {features_path}...")
-    df = pd.read_csv(features_path)
+    print(f"Loading features from {store.dataset_path('features')}...")
+    df = store.read('features')
     print(f"✓ Loaded {len(df)} samples with {len(df.columns)} columns")
     
     # Define target variables
     targets = ['very_hot', 'very_cold', 'very_windy', 'very_wet', 'very_uncomfortable']
     
     # Train models for each target
-    all_results = {}
-    
-    for target in targets:
-        if target in df.columns:
-            results, best_model_name = trainer.train_all_models_for_target(df, target)
-            all_results[target] = {
-                'models': results,
-                'best_model': best_model_name
-            }
+    all_results = trainer.train_all(df, targets, args.workers)
     
     # Save all models
-    trainer.save_models(all_results)
+    trainer.save_models(all_results, df)
     
     print("\n" + "="*60)
     print("✓ Training complete!")